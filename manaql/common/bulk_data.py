@@ -1,4 +1,5 @@
-from dataclasses import dataclass
+from dataclasses import asdict, dataclass, fields
+from typing import Dict, Optional
 
 
 @dataclass
@@ -15,3 +16,16 @@ class BulkData:
     download_uri: str
     content_type: str
     content_encoding: str
+
+    # HTTP validators returned alongside the downloaded file, if any
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+
+    @staticmethod
+    def from_scryfall_bulk_data(bulk_data: Dict) -> "BulkData":
+        """Build a BulkData from a Scryfall bulk-data item, ignoring unknown keys."""
+        known_fields = {f.name for f in fields(BulkData)}
+        return BulkData(**{k: v for k, v in bulk_data.items() if k in known_fields})
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
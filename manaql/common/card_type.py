@@ -28,6 +28,19 @@ class CardType(str, Enum):
         return [(item.value, item.name) for item in cls]
 
 
+# checked in order against the type line, the first one found is the main type
+MAIN_TYPE_PRECEDENCE = (
+    CardType.Planeswalker,
+    CardType.Battle,
+    CardType.Land,
+    CardType.Creature,
+    CardType.Artifact,
+    CardType.Enchantment,
+    CardType.Sorcery,
+    CardType.Instant,
+)
+
+
 def get_main_type(type_line: str | None) -> CardType:
     """Map Scryfall card type to our enum values."""
     if not type_line:
@@ -43,20 +56,7 @@ def get_main_type(type_line: str | None) -> CardType:
         "Enchant "
     ):  # Old cards have "Enchant" instead of "Enchantment", i.e. "Enchant Creature"
         return CardType.Enchantment
-    if CardType.Planeswalker.value in card_type:
-        return CardType.Planeswalker
-    if CardType.Battle.value in card_type:
-        return CardType.Battle
-    if CardType.Land.value in card_type:
-        return CardType.Land
-    if CardType.Creature.value in card_type:
-        return CardType.Creature
-    if CardType.Artifact.value in card_type:
-        return CardType.Artifact
-    if CardType.Enchantment.value in card_type:
-        return CardType.Enchantment
-    if CardType.Sorcery.value in card_type:
-        return CardType.Sorcery
-    if CardType.Instant.value in card_type:
-        return CardType.Instant
+    for main_type in MAIN_TYPE_PRECEDENCE:
+        if main_type.value in card_type:
+            return main_type
     return CardType.Unknown
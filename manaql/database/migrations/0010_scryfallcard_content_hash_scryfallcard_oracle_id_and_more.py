@@ -0,0 +1,32 @@
+# Generated by Django 5.1.4 on 2026-10-17 13:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("database", "0009_add_card_embedding"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="scryfallcard",
+            name="content_hash",
+            field=models.CharField(max_length=32, null=True),
+        ),
+        migrations.AddField(
+            model_name="scryfallcard",
+            name="oracle_id",
+            field=models.UUIDField(db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="scryfallcard",
+            name="scryfall_id",
+            field=models.UUIDField(null=True, unique=True),
+        ),
+        migrations.AlterField(
+            model_name="runlog",
+            name="message",
+            field=models.TextField(),
+        ),
+    ]
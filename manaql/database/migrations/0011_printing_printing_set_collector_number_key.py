@@ -0,0 +1,26 @@
+# Generated by Django 5.1.4 on 2026-10-17 13:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("database", "0010_scryfallcard_content_hash_scryfallcard_oracle_id_and_more"),
+    ]
+
+    operations = [
+        # printings were recreated on every run, so keep only the first of any
+        # duplicates left behind before adding the constraint
+        migrations.RunSQL(
+            'DELETE FROM printing a USING printing b WHERE a."set" = b."set" '
+            "AND a.collector_number = b.collector_number AND a.id > b.id",
+            migrations.RunSQL.noop,
+        ),
+        migrations.AddConstraint(
+            model_name="printing",
+            constraint=models.UniqueConstraint(
+                fields=("set_code", "collector_number"),
+                name="printing_set_collector_number_key",
+            ),
+        ),
+    ]
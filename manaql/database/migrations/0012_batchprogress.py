@@ -0,0 +1,34 @@
+# Generated by Django 5.1.4 on 2026-10-17 13:32
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("database", "0011_printing_printing_set_collector_number_key"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BatchProgress",
+            fields=[
+                ("id", models.AutoField(primary_key=True, serialize=False)),
+                ("run_id", models.CharField(max_length=36)),
+                ("stage", models.CharField(max_length=31)),
+                ("first_key", models.CharField(max_length=255)),
+                ("last_key", models.CharField(max_length=255)),
+                ("result", models.JSONField(default=dict)),
+                ("created_at", models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                "db_table": "batch_progress",
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("run_id", "stage", "first_key"),
+                        name="batch_progress_run_stage_first_key",
+                    )
+                ],
+            },
+        ),
+    ]
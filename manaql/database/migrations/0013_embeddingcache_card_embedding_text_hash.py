@@ -0,0 +1,34 @@
+# Generated by Django 5.1.4 on 2026-10-17 13:50
+
+import django.utils.timezone
+import pgvector.django
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("database", "0012_batchprogress"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="EmbeddingCache",
+            fields=[
+                (
+                    "text_hash",
+                    models.CharField(max_length=32, primary_key=True, serialize=False),
+                ),
+                ("model", models.CharField(max_length=63)),
+                ("embedding", pgvector.django.VectorField(dimensions=1536)),
+                ("created_at", models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                "db_table": "embedding_cache",
+            },
+        ),
+        migrations.AddField(
+            model_name="card",
+            name="embedding_text_hash",
+            field=models.CharField(blank=True, max_length=32, null=True),
+        ),
+    ]
@@ -1,6 +1,15 @@
+from .batch_progress import BatchProgress
 from .card import Card
+from .embedding_cache import EmbeddingCache
 from .printing import Printing
 from .run_log import RunLog
 from .scryfall_card import ScryfallCard
 
-__all__ = ["Card", "Printing", "RunLog", "ScryfallCard"]
+__all__ = [
+    "BatchProgress",
+    "Card",
+    "EmbeddingCache",
+    "Printing",
+    "RunLog",
+    "ScryfallCard",
+]
@@ -0,0 +1,23 @@
+from django.db import models
+from django.utils.timezone import now
+
+
+class BatchProgress(models.Model):
+    """A batch of a stage completed by a run, see services.checkpoint."""
+
+    id = models.AutoField(primary_key=True)
+    run_id = models.CharField(max_length=36, null=False)
+    stage = models.CharField(max_length=31, null=False)
+    first_key = models.CharField(max_length=255, null=False)
+    last_key = models.CharField(max_length=255, null=False)
+    result = models.JSONField(default=dict)
+    created_at = models.DateTimeField(default=now)
+
+    class Meta:
+        db_table = "batch_progress"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["run_id", "stage", "first_key"],
+                name="batch_progress_run_stage_first_key",
+            )
+        ]
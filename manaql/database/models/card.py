@@ -38,6 +38,8 @@ class Card(models.Model):
     game_changer = models.BooleanField(default=False)
 
     embedding = VectorField(dimensions=1536, null=True, blank=True)
+    # hash of the model and text the embedding was generated from
+    embedding_text_hash = models.CharField(max_length=32, null=True, blank=True)
 
     @staticmethod
     def from_scryfall_card(scryfall_card):
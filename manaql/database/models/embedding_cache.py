@@ -0,0 +1,16 @@
+from django.db import models
+from django.utils.timezone import now
+from pgvector.django import VectorField
+
+
+class EmbeddingCache(models.Model):
+    """An embedding generated by a model for a text, keyed by the hash of
+    both, see services.embedding_service.text_hash."""
+
+    text_hash = models.CharField(max_length=32, primary_key=True)
+    model = models.CharField(max_length=63, null=False)
+    embedding = VectorField(dimensions=1536, null=False)
+    created_at = models.DateTimeField(default=now)
+
+    class Meta:
+        db_table = "embedding_cache"
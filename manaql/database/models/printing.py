@@ -81,3 +81,9 @@ class Printing(models.Model):
 
     class Meta:
         db_table = "printing"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["set_code", "collector_number"],
+                name="printing_set_collector_number_key",
+            )
+        ]
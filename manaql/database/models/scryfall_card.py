@@ -1,3 +1,5 @@
+import hashlib
+import json
 from typing import Dict
 
 from django.contrib.postgres.fields import ArrayField
@@ -5,6 +7,12 @@ from django.db import models
 
 
 class ScryfallCard(models.Model):
+    scryfall_id = models.UUIDField(unique=True, null=True)
+    oracle_id = models.UUIDField(null=True, db_index=True)
+    # of the normalized field values other than prices, which change daily and
+    # are compared separately, to tell which cards changed between snapshots
+    content_hash = models.CharField(max_length=32, null=True)
+
     name = models.CharField(max_length=255, null=True)
     lang = models.CharField(max_length=5, null=True)
     set_code = models.CharField(max_length=7, null=True)
@@ -32,8 +40,11 @@ class ScryfallCard(models.Model):
     card_faces = models.JSONField(null=True)
 
     @staticmethod
-    def from_scryfall_card(scryfall_card: Dict):
-        return ScryfallCard(
+    def values_from_scryfall_card(scryfall_card: Dict) -> Dict:
+        """Map a Scryfall card object to this model's field values."""
+        values = dict(
+            scryfall_id=scryfall_card.get("id", None),
+            oracle_id=scryfall_card.get("oracle_id", None),
             name=scryfall_card.get("name", None),
             lang=scryfall_card.get("lang", None),
             set_code=scryfall_card.get("set", None),
@@ -58,6 +69,20 @@ class ScryfallCard(models.Model):
             image_uris=scryfall_card.get("image_uris", None),
             card_faces=scryfall_card.get("card_faces", None),
         )
+        values["content_hash"] = ScryfallCard.content_hash_of(
+            {key: value for key, value in values.items() if key != "prices"}
+        )
+        return values
+
+    @staticmethod
+    def content_hash_of(values: Dict) -> str:
+        """Hash field values, independently of key order."""
+        data = json.dumps(values, sort_keys=True, separators=(",", ":"), default=str)
+        return hashlib.blake2b(data.encode(), digest_size=16).hexdigest()
+
+    @staticmethod
+    def from_scryfall_card(scryfall_card: Dict):
+        return ScryfallCard(**ScryfallCard.values_from_scryfall_card(scryfall_card))
 
     class Meta:
         db_table = "scryfall_card"
@@ -1,35 +1,132 @@
+import os
 from datetime import datetime
 
+from common.utils import get_artifact_file_path
 from database.models.run_log import Command as MQLCommand
 from database.models.run_log import RunLog
 from database.models.card import Card
 from django.core.management.base import BaseCommand
 from services.card_processor import CardProcessor
+from services.price_updater import PriceUpdater
 from services.scryfall import ScryfallService
-from services.scryfall_exporter import ScryfallExporter
+from services.scryfall_exporter import QUARANTINE_FILE, ScryfallExporter
+from services.embedding_job import EmbeddingJob
 from services.embedding_service import EmbeddingService
+from services.fused_pipeline import FusedPipeline
 
 
 class Command(BaseCommand):
     help = "Do all the things."
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Ingest and process the bulk data even if this snapshot was already ingested, "
+            "without first checking whether only prices changed",
+        )
+        parser.add_argument(
+            "--stream",
+            action="store_true",
+            help="Parse cards while the bulk data is downloading instead of after",
+        )
+        parser.add_argument(
+            "--file-path",
+            type=str,
+            help="Ingest a previously downloaded file or artifact instead of downloading",
+        )
+        parser.add_argument(
+            "--fused",
+            action="store_true",
+            help="Build cards and printings straight from the bulk data in one pass, without the scryfall_card staging table",
+        )
+        parser.add_argument(
+            "--keep-staging",
+            action="store_true",
+            help="With --fused, still load the scryfall_card staging table, which price-only updates diff against. "
+            "Prices are then checked first, so a snapshot with content changes is read twice",
+        )
+        parser.add_argument(
+            "--run-id",
+            type=str,
+            help="Resume the failed embedding generation of the run with this id, after its last completed batch",
+        )
+
     def handle(self, *args, **options):
         start_time = datetime.now()
 
         RunLog.objects.create(command=MQLCommand.All, message="Starting command...")
         client = ScryfallService("manaql-ingest", "0.1.0")
-        with client.stream_all_cards() as cards_iterator:
-            RunLog.objects.create(
-                command=MQLCommand.Download, message="Download in progress..."
-            )
-            exporter = ScryfallExporter()
-            result = exporter.process_cards(cards_iterator)
-            RunLog.objects.create(
-                command=MQLCommand.Ingest, message=f"Ingestion complete.\n{result}"
-            )
-
-        processor = CardProcessor()
-        result = processor.process_cards()
+        file_path = (
+            get_artifact_file_path(options["file_path"])
+            if options["file_path"]
+            else None
+        )
+
+        if file_path is None and client.is_ingested() and not options["force"]:
+            bulk_data = client.get_bulk_data()
+            result = f"Skipped, bulk data from {bulk_data.updated_at} already ingested"
+            self.stdout.write(result)
+            RunLog.objects.create(command=MQLCommand.Ingest, message=result)
+        else:
+            price_result = None
+            if options["fused"]:
+                # without the staging table there is no snapshot to diff against
+                check_prices = options["keep_staging"]
+            else:
+                # an incremental ingest reprices in the same pass as its delta
+                check_prices = os.getenv("INCREMENTAL_INGEST_ENABLED") != "true"
+            if check_prices and not options["force"]:
+                # most snapshots only change prices, which don't need a rebuild.
+                # They are checked in a pass of their own, so a snapshot with
+                # content changes is read a second time
+                with client.stream_all_cards(
+                    streaming=options["stream"] or None, file_path=file_path
+                ) as cards_iterator:
+                    price_result = PriceUpdater(check_content=True).update(
+                        cards_iterator
+                    )
+
+            if price_result is not None and price_result.applied:
+                result = price_result
+                RunLog.objects.create(
+                    command=MQLCommand.Ingest,
+                    message=f"Only prices changed, skipped ingestion.\n{result}",
+                )
+            else:
+                with client.stream_all_cards(
+                    streaming=options["stream"] or None, file_path=file_path
+                ) as cards_iterator:
+                    RunLog.objects.create(
+                        command=MQLCommand.Download, message="Download in progress..."
+                    )
+                    if options["fused"]:
+                        pipeline = FusedPipeline()
+                        pipeline.with_staging(options["keep_staging"])
+                        result = pipeline.process_cards(cards_iterator)
+                    else:
+                        exporter = ScryfallExporter()
+                        exporter.with_quarantine(
+                            get_artifact_file_path(QUARANTINE_FILE)
+                        )
+                        result = exporter.process_cards(cards_iterator)
+                    RunLog.objects.create(
+                        command=MQLCommand.Ingest,
+                        message=f"Ingestion complete.\n{result}",
+                    )
+
+                if not options["fused"] and result.changed_names == set():
+                    RunLog.objects.create(
+                        command=MQLCommand.Process,
+                        message="No cards changed beyond their prices, skipped processing.",
+                    )
+                elif not options["fused"]:
+                    processor = CardProcessor()
+                    # after an incremental ingest, only the changed cards are rebuilt
+                    result = processor.process_cards(changed_names=result.changed_names)
+
+            if file_path is None:
+                client.mark_ingested()
 
         RunLog.objects.create(
             command=MQLCommand.Process, message="Starting embedding generation..."
@@ -40,32 +137,10 @@ class Command(BaseCommand):
 
         if total_cards > 0:
             self.stdout.write(f"Generating embeddings for {total_cards} cards...")
-            processed_cards = 0
-            failed_cards = 0
-
-            batch_size = 50
-            for i in range(0, total_cards, batch_size):
-                batch = cards_without_embeddings[i : i + batch_size]
-                for card in batch:
-                    try:
-                        embedding_service.update_card_embedding(card)
-                        processed_cards += 1
-                    except Exception as e:
-                        failed_cards += 1
-                        self.stdout.write(
-                            f"Failed to generate embedding for {card.name}: {str(e)}"
-                        )
-
-                self.stdout.write(
-                    f"Processed {min(i + batch_size, total_cards)}/{total_cards} cards"
-                )
-
-                if i + batch_size < total_cards:
-                    import time
-
-                    time.sleep(1)
-
-            embedding_result = f"Embedding generation complete. Processed: {processed_cards}, Failed: {failed_cards}"
+            job = EmbeddingJob(embedding_service, run_id=options["run_id"])
+            self.stdout.write(f"Run id: {job.checkpoint.run_id}")
+            job_result = job.run(cards_without_embeddings)
+            embedding_result = f"Embedding generation complete.\n{job_result}\n{embedding_service.stats}"
         else:
             embedding_result = "No cards need embedding generation"
 
@@ -0,0 +1,193 @@
+import time
+import tracemalloc
+from typing import Callable, Dict, Iterator
+
+import ijson
+from common.utils import get_artifact_file_path
+from database.models.card import Card
+from database.models.printing import Printing
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from services.artifact_writer import open_artifact
+from services.card_parser import CardParser
+from services.embedding_service import EMBEDDING_BACKENDS, EmbeddingService
+from services.shadow_table import ShadowLoad
+from services import card_processor
+from services.scryfall_exporter import (
+    CopyStrategy,
+    ProcessingStrategy,
+    SequentialStrategy,
+    filterCard,
+)
+
+
+class Command(BaseCommand):
+    help = "Benchmarks stages of the ingest pipeline"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "target",
+            choices=["parser", "loader", "processor", "embeddings"],
+            help="Which stage to benchmark",
+        )
+        parser.add_argument(
+            "--file-path",
+            type=str,
+            help="Path to a Scryfall bulk data file (relative paths are under artifacts/)",
+        )
+        parser.add_argument(
+            "--sample",
+            type=int,
+            default=5000,
+            help="Number of cards to retain when measuring memory per card (default: 5000)",
+        )
+        parser.add_argument(
+            "--limit",
+            type=int,
+            default=20000,
+            help="Number of cards to load when benchmarking loaders (default: 20000)",
+        )
+        parser.add_argument(
+            "--workers",
+            type=str,
+            default="1,2,4,8",
+            help="Comma separated worker process counts to benchmark the parallel "
+            "processor with (default: 1,2,4,8)",
+        )
+        parser.add_argument(
+            "--backends",
+            type=str,
+            default="hashing",
+            help="Comma separated embedding backends to benchmark, of "
+            f"{', '.join(EMBEDDING_BACKENDS)} (default: hashing, as openai is billed)",
+        )
+
+    def handle(self, *args, **options):
+        getattr(self, f"benchmark_{options['target']}")(options)
+
+    def _report(self, name: str, count: int, duration: float, extra: str = "") -> None:
+        rate = count / duration if duration else 0.0
+        self.stdout.write(
+            f"{name:<12} {count:>8} cards  {duration:>8.2f}s  {rate:>10.0f} cards/s{extra}"
+        )
+
+    def benchmark_parser(self, options) -> None:
+        """Compare the default ijson parser against the projected CardParser."""
+        file_path = get_artifact_file_path(options["file_path"])
+        sample = options["sample"]
+
+        def baseline(file_obj) -> Iterator[Dict]:
+            for card in ijson.items(file_obj, "item"):
+                if not filterCard(card):
+                    yield card
+
+        def projected(file_obj) -> Iterator[Dict]:
+            return CardParser().parse(file_obj)
+
+        parsers: Dict[str, Callable] = {"baseline": baseline, "projected": projected}
+        self.stdout.write(f"ijson default backend: {ijson.backend}")
+
+        for name, parse in parsers.items():
+            with open_artifact(file_path) as f:
+                start = time.perf_counter()
+                count = sum(1 for _ in parse(f))
+                duration = time.perf_counter() - start
+
+            # the most memory allocated at once while streaming every card
+            with open_artifact(file_path) as f:
+                tracemalloc.start()
+                for _ in parse(f):
+                    pass
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+
+            # retain a sample of cards to measure how much memory each one holds
+            with open_artifact(file_path) as f:
+                tracemalloc.start()
+                retained = []
+                for card in parse(f):
+                    retained.append(card)
+                    if len(retained) >= sample:
+                        break
+                current, _ = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                per_card = current / len(retained) if retained else 0
+                del retained
+
+            self._report(
+                name,
+                count,
+                duration,
+                f"  {per_card:>8.0f} B/card retained  {peak / 1024:>8.0f} KiB peak",
+            )
+
+    def benchmark_loader(self, options) -> None:
+        """Compare bulk_create against COPY for loading the scryfall_card table.
+
+        Each loader runs in a transaction that is rolled back afterwards, so the
+        table is left untouched.
+        """
+        with open_artifact(get_artifact_file_path(options["file_path"])) as f:
+            cards = []
+            for card in CardParser().parse_file(f):
+                cards.append(card)
+                if len(cards) >= options["limit"]:
+                    break
+
+        strategies: Dict[str, ProcessingStrategy] = {
+            "bulk_create": SequentialStrategy(),
+            "copy_text": CopyStrategy(copy_format="text"),
+            "copy_binary": CopyStrategy(copy_format="binary"),
+        }
+        for name, strategy in strategies.items():
+            with transaction.atomic():
+                start = time.perf_counter()
+                result = strategy.process(cards)
+                duration = time.perf_counter() - start
+                transaction.set_rollback(True)
+            self._report(name, result.success_count, duration)
+
+    def benchmark_processor(self, options) -> None:
+        """Compare the sequential processor against the parallel one, with each
+        number of worker processes, on the ingested scryfall_card table.
+
+        Worker processes commit their own transactions, which can't be rolled
+        back, so each strategy loads shadow copies of the card and printing
+        tables that are dropped afterwards, leaving the live tables untouched.
+        """
+        strategies = {"sequential": card_processor.SequentialStrategy()}
+        for workers in map(int, options["workers"].split(",")):
+            strategies[f"parallel_{workers}"] = card_processor.ParallelStrategy(
+                max_workers=workers
+            )
+
+        processor = card_processor.CardProcessor()
+        processor.with_shadow_load(False)
+        for name, strategy in strategies.items():
+            processor.strategy = strategy
+            # clears the empty shadow tables, never the live ones
+            card_processor.CardProcessor._db_cleared = False
+            with ShadowLoad([Card, Printing], keep=False):
+                start = time.perf_counter()
+                result = processor.process_cards()
+                duration = time.perf_counter() - start
+            self._report(name, result.printings_created, duration)
+
+    def benchmark_embeddings(self, options) -> None:
+        """Compare the throughput of embedding backends on the texts of up to
+        --limit processed cards. Embeddings are neither cached nor saved."""
+        service = EmbeddingService(backend="hashing")
+        texts = [
+            service.generate_card_text(card)
+            for card in Card.objects.defer("embedding").order_by("id")[
+                : options["limit"]
+            ]
+        ]
+
+        for name in options["backends"].split(","):
+            service = EmbeddingService(backend=name)
+            start = time.perf_counter()
+            for i in range(0, len(texts), service.page_size):
+                service.generate_embeddings(texts[i : i + service.page_size])
+            duration = time.perf_counter() - start
+            self._report(name, len(texts), duration)
@@ -1,11 +1,17 @@
 from datetime import datetime
 
-from django.core.management.base import BaseCommand
+from common.utils import get_artifact_file_path
+from django.core.management.base import BaseCommand, CommandError
+from services.artifact_writer import (
+    COMPRESSION_SUFFIXES,
+    ArtifactWriter,
+    with_compression_suffix,
+)
 from services.scryfall import ScryfallService
 
 
 class Command(BaseCommand):
-    help = "Downloads Scryfall bulk data to a JSON file"
+    help = "Downloads Scryfall bulk data to a compressed JSON artifact"
 
     def add_arguments(self, parser):
         parser.add_argument(
@@ -15,25 +21,50 @@ class Command(BaseCommand):
             default="scryfall_data.json",
         )
 
+        parser.add_argument(
+            "--compression",
+            type=str,
+            choices=list(COMPRESSION_SUFFIXES),
+            default="gzip",
+            help="How to compress the artifact, zstd requires the zstandard package (default: gzip)",
+        )
+
         parser.add_argument(
             "--dry-run",
-            type=bool,
+            action="store_true",
             help="Whether to run the command in dry-run mode (no data will be saved)",
-            default=False,
         )
 
     def handle(self, *args, **options):
         start_time = datetime.now()
+        compression = options["compression"]
+        file_name = with_compression_suffix(options["file_name"], compression)
+        file_path = None if options["dry_run"] else get_artifact_file_path(file_name)
 
         client = ScryfallService("manaql-ingest", "0.1.0")
-        client.download_all_cards()
+        bulk_data = client.get_bulk_data()
+
+        try:
+            with ArtifactWriter(
+                file_path, compression, source_updated_at=bulk_data.updated_at
+            ) as writer:
+                for chunk in client.iter_bulk_data_bytes():
+                    writer.write(chunk)
+        except ImportError as e:
+            raise CommandError(str(e))
 
-        end_time = datetime.now()
-        duration = end_time - start_time
+        manifest = writer.manifest
+        duration = datetime.now() - start_time
+        seconds = duration.total_seconds() or 1
+        destination = "discarded (dry run)" if options["dry_run"] else str(file_path)
 
         self.stdout.write(
             self.style.SUCCESS(
-                f"Successfully downloaded Scryfall data\n"
+                f"Successfully downloaded Scryfall data to {destination}\n"
+                f"Raw size: {manifest.raw_size / 1024 / 1024:.1f} MiB, "
+                f"{compression} size: {manifest.size / 1024 / 1024:.1f} MiB\n"
+                f"SHA-256: {manifest.sha256}\n"
+                f"Throughput: {manifest.raw_size / 1024 / 1024 / seconds:.2f} MiB/s\n"
                 f"Download completed in {duration}"
             )
         )
@@ -1,6 +1,6 @@
 from datetime import datetime
-import time
 from django.core.management.base import BaseCommand
+from services.embedding_job import EmbeddingJob
 from services.embedding_service import EmbeddingService
 from database.models.card import Card
 from database.models.run_log import Command as MQLCommand
@@ -14,8 +14,7 @@ class Command(BaseCommand):
         parser.add_argument(
             "--batch-size",
             type=int,
-            default=50,
-            help="Number of cards to process in each batch (default: 50)",
+            help="Number of cards to process in each batch (default: enough to keep every concurrent request busy)",
         )
         parser.add_argument(
             "--dry-run",
@@ -25,7 +24,17 @@ class Command(BaseCommand):
         parser.add_argument(
             "--force",
             action="store_true",
-            help="Regenerate embeddings for cards that already have them",
+            help="Regenerate the embeddings of every card, including cached ones, and overwrite the cache",
+        )
+        parser.add_argument(
+            "--stale",
+            action="store_true",
+            help="Also regenerate the embeddings of cards whose text changed since they were generated",
+        )
+        parser.add_argument(
+            "--run-id",
+            type=str,
+            help="Resume the failed run with this id, after its last completed batch",
         )
         parser.add_argument(
             "--limit",
@@ -41,75 +50,55 @@ class Command(BaseCommand):
         limit = options["limit"]
 
         self.stdout.write("Starting embedding generation...")
+        embedding_service = EmbeddingService()
 
         if force:
+            embedding_service.with_cache(False)
             cards_to_process = Card.objects.all()
             self.stdout.write(
                 f"Force mode: will process all {cards_to_process.count()} cards"
             )
+        elif options["stale"]:
+            stale_ids = [card.id for card in embedding_service.stale_cards()]
+            cards_to_process = Card.objects.filter(id__in=stale_ids)
+            self.stdout.write(
+                f"Found {len(stale_ids)} cards without embeddings or with changed text"
+            )
         else:
             cards_to_process = Card.objects.filter(embedding__isnull=True)
             self.stdout.write(
                 f"Found {cards_to_process.count()} cards without embeddings"
             )
 
+        total_cards = cards_to_process.count()
         if limit:
-            cards_to_process = cards_to_process[:limit]
+            total_cards = min(total_cards, limit)
             self.stdout.write(f"Limited to {limit} cards for processing")
 
         if dry_run:
-            self.stdout.write(
-                f"DRY RUN: Would process {cards_to_process.count()} cards"
-            )
+            self.stdout.write(f"DRY RUN: Would process {total_cards} cards")
             return
 
-        if not cards_to_process.exists():
+        job = EmbeddingJob(embedding_service, batch_size, run_id=options["run_id"])
+        self.stdout.write(f"Run id: {job.checkpoint.run_id}")
+        if not total_cards and not job.checkpoint.started():
             self.stdout.write(self.style.SUCCESS("No cards need embedding generation!"))
             return
 
         RunLog.objects.create(
             command=MQLCommand.Process,
-            message=f"Starting embedding generation for {cards_to_process.count()} cards",
+            message=f"Starting embedding generation for {total_cards} cards",
         )
 
-        embedding_service = EmbeddingService()
-        total_cards = cards_to_process.count()
-        processed_cards = 0
-        failed_cards = 0
-
-        for i in range(0, total_cards, batch_size):
-            batch_start_time = time.time()
-            batch = cards_to_process[i : i + batch_size]
-
-            self.stdout.write(
-                f"Processing batch {i//batch_size + 1}/{(total_cards + batch_size - 1)//batch_size} "
-                f"({i+1}-{min(i+batch_size, total_cards)} of {total_cards})"
-            )
-
-            for card in batch:
-                try:
-                    if not dry_run:
-                        embedding_service.update_card_embedding(card)
-                    processed_cards += 1
-                except Exception as e:
-                    failed_cards += 1
-                    self.stdout.write(
-                        self.style.ERROR(
-                            f"Failed to generate embedding for {card.name}: {str(e)}"
-                        )
-                    )
-
-            batch_duration = time.time() - batch_start_time
-            self.stdout.write(f"  Batch completed in {batch_duration:.2f}s")
+        result = job.run(cards_to_process, limit=limit)
 
         end_time = datetime.now()
         duration = end_time - start_time
 
         summary = (
             f"Embedding generation completed in {duration}\n"
-            f"Total cards: {total_cards}\n"
-            f"Successfully processed: {processed_cards}\n"
-            f"Failed: {failed_cards}"
+            f"{result}\n"
+            f"{embedding_service.stats}"
         )
 
         self.stdout.write(self.style.SUCCESS(summary))
@@ -1,10 +1,9 @@
-import json
 from datetime import datetime
 
 from common.utils import get_artifact_file_path
 from django.core.management.base import BaseCommand
 from services.scryfall import ScryfallService
-from services.scryfall_exporter import ScryfallExporter
+from services.scryfall_exporter import QUARANTINE_FILE, ScryfallExporter
 
 
 class Command(BaseCommand):
@@ -14,27 +13,27 @@ class Command(BaseCommand):
         parser.add_argument(
             "--file-path",
             type=str,
-            help="Path to JSON file containing Scryfall data (if not provided, will download fresh data)",
+            help="Path to a JSON file or artifact (.gz/.zst) containing Scryfall data (if not provided, will download fresh data)",
         )
 
     def handle(self, *args, **options):
         start_time = datetime.now()
         print("Starting card data ingest...")
 
+        client = ScryfallService("manaql-ingest", "0.1.0")
         if options["file_path"]:
             file_path = get_artifact_file_path(options["file_path"])
             print(f"Loading data from {file_path}...")
-            with open(file_path, "r", encoding="utf-8") as f:
-                cards_data = json.load(f)
         else:
+            file_path = None
             print("Downloading fresh data from Scryfall...")
-            client = ScryfallService("manaql-ingest", "0.1.0")
-            cards_data = client.download_all_cards()
 
         print("Processing card data...")
 
-        exporter = ScryfallExporter()
-        result = exporter.process_cards(cards_data)
+        with client.stream_all_cards(file_path=file_path) as cards_iterator:
+            exporter = ScryfallExporter()
+            exporter.with_quarantine(get_artifact_file_path(QUARANTINE_FILE))
+            result = exporter.process_cards(cards_iterator)
         print(result)
 
         end_time = datetime.now()
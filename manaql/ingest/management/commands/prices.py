@@ -0,0 +1,38 @@
+from datetime import datetime
+
+from common.utils import get_artifact_file_path
+from django.core.management.base import BaseCommand
+from services.price_updater import PRICE_CARD_FIELDS, PriceUpdater
+from services.scryfall import ScryfallService
+
+
+class Command(BaseCommand):
+    help = "Updates printing prices from Scryfall data, without rebuilding cards"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--file-path",
+            type=str,
+            help="Path to a JSON file or artifact (.gz/.zst) containing Scryfall data (if not provided, will download fresh data)",
+        )
+
+    def handle(self, *args, **options):
+        start_time = datetime.now()
+        print("Starting price update...")
+
+        client = ScryfallService("manaql-ingest", "0.1.0")
+        file_path = (
+            get_artifact_file_path(options["file_path"])
+            if options["file_path"]
+            else None
+        )
+
+        with client.stream_all_cards(
+            file_path=file_path, fields=PRICE_CARD_FIELDS
+        ) as cards_iterator:
+            PriceUpdater().update(cards_iterator)
+
+        end_time = datetime.now()
+        duration = end_time - start_time
+
+        self.stdout.write(self.style.SUCCESS(f"\nPrice update completed in {duration}"))
@@ -7,11 +7,19 @@ from services.card_processor import CardProcessor
 class Command(BaseCommand):
     help = "Processes Scryfall card data into our format"
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--run-id",
+            type=str,
+            help="Resume the failed run with this id, skipping its completed batches",
+        )
+
     def handle(self, *args, **options):
         start_time = datetime.now()
         print("Starting card data processing...")
 
-        processor = CardProcessor()
+        processor = CardProcessor(run_id=options["run_id"])
+        print(f"Run id: {processor.checkpoint.run_id}")
         result = processor.process_cards()
         print(result)
 
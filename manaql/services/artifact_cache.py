@@ -0,0 +1,99 @@
+import json
+import os
+from pathlib import Path
+from typing import Dict, Optional
+
+from common.bulk_data import BulkData
+from common.utils import get_artifact_file_path
+
+
+class ArtifactCache:
+    """Persistent cache of a Scryfall bulk data file and its metadata under artifacts/.
+
+    The metadata file records the BulkData of the cached file, along with the
+    HTTP validators (ETag / Last-Modified) of the download and the updated_at of
+    the last snapshot that was fully ingested.
+    """
+
+    def __init__(self, bulk_type: str = "default_cards"):
+        self.bulk_type = bulk_type
+        self.metadata_path = Path(get_artifact_file_path(f"{bulk_type}.meta.json"))
+
+    def _read_metadata(self) -> Dict:
+        if not self.metadata_path.exists():
+            return {}
+        try:
+            with open(self.metadata_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable artifact metadata {self.metadata_path}: {e}")
+            return {}
+
+    def _write_metadata(self, metadata: Dict) -> None:
+        # write to a temporary file first so a crash never leaves half a manifest
+        tmp_path = self.metadata_path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(metadata, f, indent=2)
+        os.replace(tmp_path, self.metadata_path)
+
+    def get_bulk_data(self) -> Optional[BulkData]:
+        """Return the BulkData of the cached file, if there is one."""
+        bulk_data = self._read_metadata().get("bulk_data")
+        if not bulk_data:
+            return None
+        return BulkData.from_scryfall_bulk_data(bulk_data)
+
+    def get_file_path(self) -> Optional[Path]:
+        """Return the path of the cached file, if it exists on disk."""
+        file_name = self._read_metadata().get("file_name")
+        if not file_name:
+            return None
+        file_path = Path(get_artifact_file_path(file_name))
+        return file_path if file_path.exists() else None
+
+    def path_for(self, file_name: str) -> Path:
+        return Path(get_artifact_file_path(file_name))
+
+    def is_current(self, bulk_data: BulkData) -> bool:
+        """Whether the cached file matches the given snapshot."""
+        cached = self.get_bulk_data()
+        return (
+            cached is not None
+            and cached.updated_at == bulk_data.updated_at
+            and self.get_file_path() is not None
+        )
+
+    def conditional_headers(self) -> Dict[str, str]:
+        """HTTP validators to revalidate the cached file with the server."""
+        cached = self.get_bulk_data()
+        if cached is None or self.get_file_path() is None:
+            return {}
+
+        headers = {}
+        if cached.etag:
+            headers["If-None-Match"] = cached.etag
+        if cached.last_modified:
+            headers["If-Modified-Since"] = cached.last_modified
+        return headers
+
+    def store(self, bulk_data: BulkData, file_name: str) -> None:
+        """Record a freshly downloaded file, removing the previous one if it differs."""
+        metadata = self._read_metadata()
+        previous_file_name = metadata.get("file_name")
+        if previous_file_name and previous_file_name != file_name:
+            previous_path = Path(get_artifact_file_path(previous_file_name))
+            if previous_path.exists():
+                previous_path.unlink()
+
+        metadata["bulk_data"] = bulk_data.to_dict()
+        metadata["file_name"] = file_name
+        self._write_metadata(metadata)
+
+    def is_ingested(self, bulk_data: BulkData) -> bool:
+        """Whether the given snapshot has already been fully ingested."""
+        return self._read_metadata().get("ingested_updated_at") == bulk_data.updated_at
+
+    def mark_ingested(self, bulk_data: BulkData) -> None:
+        metadata = self._read_metadata()
+        metadata["ingested_updated_at"] = bulk_data.updated_at
+        self._write_metadata(metadata)
@@ -0,0 +1,206 @@
+import gzip
+import hashlib
+import json
+import os
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import BinaryIO, Optional
+
+try:
+    import zstandard
+except ImportError:  # zstd artifacts are optional
+    zstandard = None
+
+COMPRESSION_SUFFIXES = {
+    "gzip": ".gz",
+    "zstd": ".zst",
+    "none": "",
+}
+
+HASH_READ_SIZE = 1024 * 1024  # 1 MiB
+
+
+def get_compression(file_path: Path | str) -> str:
+    """Infer an artifact's compression from its file name."""
+    name = str(file_path)
+    for compression, suffix in COMPRESSION_SUFFIXES.items():
+        if suffix and name.endswith(suffix):
+            return compression
+    return "none"
+
+
+def with_compression_suffix(file_name: str, compression: str) -> str:
+    suffix = COMPRESSION_SUFFIXES[compression]
+    if suffix and not file_name.endswith(suffix):
+        return f"{file_name}{suffix}"
+    return file_name
+
+
+def _require_zstandard() -> None:
+    if zstandard is None:
+        raise ImportError("zstd artifacts require the zstandard package")
+
+
+def open_artifact(file_path: Path | str) -> BinaryIO:
+    """Open an artifact for reading, decompressing it on the fly."""
+    compression = get_compression(file_path)
+    if compression == "gzip":
+        return gzip.open(file_path, "rb")
+    if compression == "zstd":
+        _require_zstandard()
+        return zstandard.ZstdDecompressor().stream_reader(
+            open(file_path, "rb"), closefd=True
+        )
+    return open(file_path, "rb")
+
+
+def sha256_file(file_path: Path | str) -> str:
+    sha256 = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        while chunk := f.read(HASH_READ_SIZE):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+@dataclass
+class ArtifactManifest:
+    """Checksum manifest written next to an artifact as <file>.manifest.json."""
+
+    file_name: str
+    compression: str
+    size: int  # bytes on disk
+    raw_size: int  # uncompressed bytes
+    sha256: str  # of the bytes on disk
+    created_at: str
+    source_updated_at: Optional[str] = None
+
+    @staticmethod
+    def path_for(file_path: Path | str) -> Path:
+        file_path = Path(file_path)
+        return file_path.with_name(f"{file_path.name}.manifest.json")
+
+    @staticmethod
+    def load(file_path: Path | str) -> Optional["ArtifactManifest"]:
+        manifest_path = ArtifactManifest.path_for(file_path)
+        if not manifest_path.exists():
+            return None
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            return ArtifactManifest(**json.load(f))
+
+    def save(self, file_path: Path | str) -> None:
+        with open(ArtifactManifest.path_for(file_path), "w", encoding="utf-8") as f:
+            json.dump(asdict(self), f, indent=2)
+
+    def verify(self, file_path: Path | str) -> bool:
+        """Whether the file on disk matches this manifest."""
+        file_path = Path(file_path)
+        return (
+            file_path.exists()
+            and file_path.stat().st_size == self.size
+            and sha256_file(file_path) == self.sha256
+        )
+
+
+class _HashingFile:
+    """Write-only file wrapper that hashes and counts the bytes written through it."""
+
+    def __init__(self, file_obj: BinaryIO):
+        self.file_obj = file_obj
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+
+    def write(self, data) -> int:
+        self.sha256.update(data)
+        self.size += len(data)
+        return self.file_obj.write(data)
+
+    def flush(self) -> None:
+        self.file_obj.flush()
+
+    def close(self) -> None:
+        self.file_obj.close()
+
+
+class ArtifactWriter:
+    """Writes a (compressed) artifact and builds its checksum manifest.
+
+    Bytes are written to a partial file that only replaces file_path once the
+    writer is closed without error. With no file_path (dry run), the bytes are
+    compressed and hashed but discarded.
+    """
+
+    def __init__(
+        self,
+        file_path: Optional[Path | str],
+        compression: str = "gzip",
+        source_updated_at: Optional[str] = None,
+    ):
+        if compression not in COMPRESSION_SUFFIXES:
+            raise ValueError(f"Unknown compression {compression}")
+        if compression == "zstd":
+            _require_zstandard()
+
+        self.file_path = Path(file_path) if file_path else None
+        self.compression = compression
+        self.source_updated_at = source_updated_at
+        self.raw_size = 0
+        self.manifest: Optional[ArtifactManifest] = None
+
+        if self.file_path:
+            self._partial_path = self.file_path.with_name(f"{self.file_path.name}.part")
+            raw_file = open(self._partial_path, "wb")
+        else:
+            self._partial_path = None
+            raw_file = open(os.devnull, "wb")
+
+        self._file = _HashingFile(raw_file)
+        if compression == "gzip":
+            self._stream = gzip.GzipFile(fileobj=self._file, mode="wb", compresslevel=6)
+        elif compression == "zstd":
+            self._stream = zstandard.ZstdCompressor(level=3).stream_writer(
+                self._file, closefd=False
+            )
+        else:
+            self._stream = self._file
+
+    def write(self, data: bytes) -> None:
+        self.raw_size += len(data)
+        self._stream.write(data)
+
+    def close(self) -> ArtifactManifest:
+        if self._stream is not self._file:
+            self._stream.close()
+        self._file.close()
+
+        self.manifest = ArtifactManifest(
+            file_name=self.file_path.name if self.file_path else "",
+            compression=self.compression,
+            size=self._file.size,
+            raw_size=self.raw_size,
+            sha256=self._file.sha256.hexdigest(),
+            created_at=datetime.now(timezone.utc).isoformat(),
+            source_updated_at=self.source_updated_at,
+        )
+        if self.file_path:
+            os.replace(self._partial_path, self.file_path)
+            self.manifest.save(self.file_path)
+        return self.manifest
+
+    def abort(self) -> None:
+        try:
+            if self._stream is not self._file:
+                self._stream.close()
+            self._file.close()
+        finally:
+            if self._partial_path:
+                self._partial_path.unlink(missing_ok=True)
+
+    def __enter__(self) -> "ArtifactWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
@@ -1,18 +1,25 @@
 import multiprocessing as mp
 import os
 from abc import ABC, abstractmethod
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from dataclasses import dataclass, field
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import nullcontext
+from dataclasses import asdict, dataclass, field, fields
 from datetime import datetime
-from typing import List, Optional, Set
+from itertools import groupby
+from typing import Dict, Iterable, List, Optional, Set
 
 from database.models.card import Card
 from database.models.printing import Printing
 from database.models.scryfall_card import ScryfallCard
-from django.db import transaction
+from django.db import OperationalError, connection, connections, transaction
+from django.db.models import Exists, OuterRef, QuerySet
 from tqdm import tqdm
 
+from .card_sql import card_sql, printing_sql
+from .checkpoint import Checkpoint
 from .db_retry import with_retry
+from .merger import CardMerger, Merger, PrintingMerger
+from .shadow_table import ShadowLoad
 
 CHUNK_SIZE = 1000
 PROCESSING_BATCH_SIZE = 500
@@ -23,7 +30,11 @@ class ProcessingResult:
     """Holds the results of card and printing processing."""
 
     cards_created: int = 0
+    cards_updated: int = 0
+    cards_deleted: int = 0
     printings_created: int = 0
+    printings_updated: int = 0
+    printings_deleted: int = 0
     failed_cards: List[str] = field(default_factory=list)
     failed_printings: List[str] = field(default_factory=list)
     processing_time: float = 0.0
@@ -32,248 +43,417 @@ class ProcessingResult:
         return (
             f"Processing Results:\n"
             f"Cards created: {self.cards_created}\n"
+            f"Cards updated: {self.cards_updated}\n"
+            f"Cards deleted: {self.cards_deleted}\n"
             f"Printings created: {self.printings_created}\n"
+            f"Printings updated: {self.printings_updated}\n"
+            f"Printings deleted: {self.printings_deleted}\n"
             f"Failed cards: {len(self.failed_cards)}\n"
             f"Failed printings: {len(self.failed_printings)}\n"
             f"Processing time: {self.processing_time:.2f} seconds"
         )
 
+    def add(self, other: "ProcessingResult") -> None:
+        """Add the counts and failures of another result, e.g. of a batch."""
+        for f in fields(self):
+            if f.name != "processing_time":
+                setattr(self, f.name, getattr(self, f.name) + getattr(other, f.name))
+
 
 class ProcessingStrategy(ABC):
     """Abstract base class for card processing strategies."""
 
-    @abstractmethod
-    def process(self) -> ProcessingResult:
-        """Process the cards using the specific strategy."""
-        pass
+    # upsert cards and printings instead of inserting them, see merger
+    merge = False
+    # records completed batches, so that a retry skips them
+    checkpoint: Optional[Checkpoint] = None
 
+    def _resume(self) -> tuple[ProcessingResult, list]:
+        """The combined result of the batches the checkpoint recorded as
+        completed, and those batches."""
+        result = ProcessingResult()
+        completed = self.checkpoint.completed() if self.checkpoint else []
+        for batch in completed:
+            result.add(ProcessingResult(**batch.result))
+        if completed:
+            print(f"Resuming after {len(completed)} completed batches...")
+        return result, completed
 
-class SequentialStrategy(ProcessingStrategy):
-    """Process cards sequentially."""
+    def _record(self, first_key, last_key, batch: ProcessingResult) -> None:
+        """Record a completed batch, in the transaction of its writes."""
+        if self.checkpoint:
+            self.checkpoint.record(first_key, last_key, asdict(batch))
 
-    def _process_unique_cards(self, scryfall_cards) -> tuple[list, set, list]:
-        """Process unique cards from ScryfallCard objects.
+    def _save_cards(self, cards: List[Card], batch_size: int) -> tuple[int, int]:
+        """Insert or, when merging, upsert the cards.
 
         Returns:
-            tuple: (cards_list, processed_names_set, failed_cards_list)
+            tuple: (cards_created, cards_updated)
         """
-        cards = []
-        processed_names = set()
-        failed_cards = []
-        card_count = 0
-
-        print("Processing unique cards...")
-        for scryfall_card in scryfall_cards:
-            if scryfall_card.name not in processed_names:
-                try:
-                    cards.append(Card.from_scryfall_card(scryfall_card))
-                    processed_names.add(scryfall_card.name)
-                    card_count += 1
-                except Exception as e:
-                    print(f"Error creating card {scryfall_card.name}: {e}")
-                    failed_cards.append(scryfall_card.name)
-                    continue
-
-        print(f"Created {len(cards)} unique cards")
-        return cards, processed_names, failed_cards
-
-    def _create_cards_in_database(self, cards: list) -> None:
-        """Bulk create cards in the database."""
-        if not cards:
-            print("No cards to create")
-            return
-
-        print(f"Creating {len(cards)} cards in database...")
-        with transaction.atomic():
-            Card.objects.bulk_create(cards, batch_size=PROCESSING_BATCH_SIZE)
-        print("Cards created successfully")
-
-    def _get_cards_by_name(self) -> dict:
-        """Fetch all cards from database and create name mapping."""
-        print("Fetching cards for printing creation...")
-        cards_by_name = {card.name: card for card in Card.objects.all()}
-        print(f"Retrieved {len(cards_by_name)} cards from database")
-        return cards_by_name
+        if self.merge:
+            return CardMerger(batch_size=batch_size).merge(cards)
+        Card.objects.bulk_create(cards, batch_size=batch_size)
+        return len(cards), 0
 
-    def _process_printings(
-        self, scryfall_cards, cards_by_name: dict
-    ) -> tuple[list, list]:
-        """Process printings from ScryfallCard objects.
+    def _save_printings(
+        self, printings: List[Printing], batch_size: int
+    ) -> tuple[int, int]:
+        """Insert or, when merging, upsert the printings.
 
         Returns:
-            tuple: (printings_list, failed_printings_list)
+            tuple: (printings_created, printings_updated)
         """
-        printings = []
-        failed_printings = []
-        printing_count = 0
-
-        print("Processing printings...")
-        for scryfall_card in scryfall_cards:
-            card = cards_by_name.get(scryfall_card.name)
-            if not card:
-                failed_printings.append(scryfall_card.name)
-                continue
+        if self.merge:
+            return PrintingMerger(batch_size=batch_size).merge(printings)
+        Printing.objects.bulk_create(printings, batch_size=batch_size)
+        return len(printings), 0
 
-            printings.append(Printing.from_scryfall_card(card.id, scryfall_card))
-            printing_count += 1
+    @abstractmethod
+    def process(self, scryfall_cards: Optional[QuerySet] = None) -> ProcessingResult:
+        """Process the cards using the specific strategy.
 
-        print(f"Created {len(printings)} printings")
-        return printings, failed_printings
+        Args:
+            scryfall_cards: The ScryfallCard rows to process, all of them by default
+        """
+        pass
+
+
+class SequentialStrategy(ProcessingStrategy):
+    """Process cards sequentially, streaming ScryfallCards in name order.
+
+    ScryfallCards are read through a server-side cursor ordered by name, so
+    that all the printings of a card are adjacent. Each name's card is created
+    from its first ScryfallCard, and cards and their printings are saved in
+    batches of about batch_size printings, so only one batch is held in memory.
 
-    def _create_printings_in_database(self, printings: list) -> None:
-        """Bulk create printings in the database."""
-        if not printings:
-            print("No printings to create")
-            return
+    With a checkpoint, each batch is committed and recorded with the range of
+    names it covers, and a retry resumes after the last recorded name.
+    Otherwise the whole pass runs in one transaction.
+    """
 
-        print(f"Creating {len(printings)} printings in database...")
+    def __init__(self, batch_size: int = PROCESSING_BATCH_SIZE):
+        self.batch_size = batch_size
+
+    def _save_batch(
+        self,
+        cards: List[Card],
+        printings_data: List[tuple[Card, ScryfallCard]],
+        names: List[str],
+        batch: ProcessingResult,
+    ) -> None:
+        """Save the batch's cards, then the printings of its (card,
+        scryfall_card) pairs, and record the batch of names as completed."""
         with transaction.atomic():
-            Printing.objects.bulk_create(printings, batch_size=PROCESSING_BATCH_SIZE)
-        print("Printings created successfully")
+            if cards:
+                batch.cards_created, batch.cards_updated = self._save_cards(
+                    cards, self.batch_size
+                )
+                if self.merge:
+                    # bulk_create reads ids back with RETURNING, but an upsert
+                    # returns nothing for unchanged cards
+                    card_ids = dict(
+                        Card.objects.filter(
+                            name__in=[c.name for c in cards]
+                        ).values_list("name", "id")
+                    )
+                    for card in cards:
+                        card.id = card_ids[card.name]
+
+            printings = [
+                Printing.from_scryfall_card(card.id, scryfall_card)
+                for card, scryfall_card in printings_data
+            ]
+            if printings:
+                batch.printings_created, batch.printings_updated = self._save_printings(
+                    printings, self.batch_size
+                )
+
+            if names:
+                self._record(names[0], names[-1], batch)
 
     @with_retry(max_retries=3)
-    def process(self) -> ProcessingResult:
-        """Process cards and printings in a truly single pass through ScryfallCard data."""
+    def process(self, scryfall_cards: Optional[QuerySet] = None) -> ProcessingResult:
+        """Process cards and printings in a single streaming pass."""
         start_time = datetime.now()
-        result = ProcessingResult()
-        processed_names = set()
-        cards = []
-        printings_data = []
-        card_count = 0
+        result, completed = self._resume()
 
         print("Processing cards and printings...")
 
-        scryfall_cards = ScryfallCard.objects.iterator(chunk_size=CHUNK_SIZE)
-
-        for scryfall_card in scryfall_cards:
-            if scryfall_card.name not in processed_names:
-                try:
-                    cards.append(Card.from_scryfall_card(scryfall_card))
-                    processed_names.add(scryfall_card.name)
-                    card_count += 1
-                except Exception as e:
-                    print(f"Error creating card {scryfall_card.name}: {e}")
-                    result.failed_cards.append(scryfall_card.name)
-                    continue
-            printings_data.append((scryfall_card.name, scryfall_card))
-
-        if cards:
-            print(f"Creating {len(cards)} cards...")
-            with transaction.atomic():
-                Card.objects.bulk_create(cards, batch_size=PROCESSING_BATCH_SIZE)
-            result.cards_created = len(cards)
+        if scryfall_cards is None:
+            scryfall_cards = ScryfallCard.objects.all()
+        scryfall_cards = scryfall_cards.order_by("name", "id")
+        if completed:
+            scryfall_cards = scryfall_cards.filter(name__gt=completed[-1].last_key)
+
+        cards: List[Card] = []
+        printings_data: List[tuple[Card, ScryfallCard]] = []
+        names: List[str] = []
+        batch = ProcessingResult()
+
+        with transaction.atomic() if self.checkpoint is None else nullcontext():
+            for name, group in groupby(
+                scryfall_cards.iterator(chunk_size=CHUNK_SIZE),
+                key=lambda scryfall_card: scryfall_card.name,
+            ):
+                if len(printings_data) >= self.batch_size:
+                    self._save_batch(cards, printings_data, names, batch)
+                    result.add(batch)
+                    cards, printings_data, names = [], [], []
+                    batch = ProcessingResult()
+
+                if name is not None:
+                    names.append(name)
+                card = None
+                for scryfall_card in group:
+                    if card is None:
+                        try:
+                            card = Card.from_scryfall_card(scryfall_card)
+                        except Exception as e:
+                            print(f"Error creating card {name}: {e}")
+                            batch.failed_cards.append(name)
+                            continue
+                        cards.append(card)
+                    printings_data.append((card, scryfall_card))
+
+            self._save_batch(cards, printings_data, names, batch)
+            result.add(batch)
+
+        print(
+            f"Created {result.cards_created} cards "
+            f"and {result.printings_created} printings"
+        )
+        result.processing_time = (datetime.now() - start_time).total_seconds()
+        return result
 
-        print("Fetching cards for printing creation...")
-        cards_by_name = {card.name: card for card in Card.objects.all()}
 
-        print("Processing printings from stored data...")
-        printings = []
-        printing_count = 0
+# name to card id map of a ParallelStrategy worker process, set by _init_worker
+_card_ids: Dict[str, int] = {}
 
-        for card_name, scryfall_card in printings_data:
-            card = cards_by_name.get(card_name)
-            if not card:
-                result.failed_printings.append(card_name)
-                continue
 
-            printings.append(Printing.from_scryfall_card(card.id, scryfall_card))
-            printing_count += 1
+def _init_worker(card_ids: Dict[str, int]) -> None:
+    global _card_ids
+    _card_ids = card_ids
 
-        if printings:
-            print(f"Creating {len(printings)} printings...")
-            with transaction.atomic():
-                Printing.objects.bulk_create(
-                    printings, batch_size=PROCESSING_BATCH_SIZE
-                )
-            result.printings_created = len(printings)
 
-        result.processing_time = (datetime.now() - start_time).total_seconds()
-        return result
+class ParallelStrategy(ProcessingStrategy):
+    """Process printings in parallel worker processes.
 
+    Cards are created first, from the first ScryfallCard of each name, and
+    their name to id map is sent once to each worker. The ScryfallCards are
+    then split into ranges of batch_size consecutive primary keys, and each
+    range's printings are converted and saved by a worker process over its own
+    database connection, so that the conversion uses every core instead of
+    contending for a single GIL.
 
-class ParallelStrategy(ProcessingStrategy):
-    """Process cards in parallel using thread pools."""
+    Workers are forked, so they inherit the django settings, and the database
+    connections are closed beforehand: this must not run inside a transaction.
+
+    With a checkpoint, the cards and each range of printings are recorded as
+    completed in the transaction that saved them, and a retry skips them.
+    Ranges that failed with a database error are raised once all the others
+    are done, for the caller to retry.
+    """
+
+    # the checkpoint key of the batch of all cards
+    CARDS_KEY = "cards"
 
     def __init__(self, batch_size: int = 500, max_workers: Optional[int] = None):
         self.batch_size = batch_size
-        self.max_workers = max_workers or min(
-            mp.cpu_count() * 2, 8
-        )  # Limit max workers
+        self.max_workers = max_workers or min(mp.cpu_count(), 8)
 
     @with_retry(max_retries=3)
-    def _create_cards(self, scryfall_cards: List[ScryfallCard]) -> Set[str]:
-        """Create all unique cards and return set of processed names."""
-        processed_names = set()
-
+    def _create_cards(self, scryfall_cards: QuerySet) -> ProcessingResult:
+        """Create all unique cards."""
+        result = ProcessingResult()
         cards = []
-        for scryfall_card in scryfall_cards:
-            if scryfall_card.name not in processed_names:
+        for scryfall_card in (
+            scryfall_cards.order_by("name", "id")
+            .distinct("name")
+            .iterator(chunk_size=CHUNK_SIZE)
+        ):
+            try:
                 cards.append(Card.from_scryfall_card(scryfall_card))
-                processed_names.add(scryfall_card.name)
-
-        # Use smaller batch size for bulk create
-        Card.objects.bulk_create(cards, batch_size=100)
-        return processed_names
-
-    @with_retry(max_retries=3)
-    def _process_printing_batch(
-        self, scryfall_cards: List[ScryfallCard]
-    ) -> tuple[List[str], int]:
-        """Process a batch of printings."""
-        failed_printings = []
+            except Exception as e:
+                print(f"Error creating card {scryfall_card.name}: {e}")
+                result.failed_cards.append(scryfall_card.name)
 
         with transaction.atomic():
-            card_names = {sc.name for sc in scryfall_cards}
-            cards_by_name = {
-                card.name: card for card in Card.objects.filter(name__in=card_names)
-            }
-
-            printings = []
-            for scryfall_card in scryfall_cards:
-                card = cards_by_name.get(scryfall_card.name)
-                if not card:
-                    failed_printings.append(scryfall_card.name)
-                    continue
-
-                printings.append(Printing.from_scryfall_card(card.id, scryfall_card))
+            result.cards_created, result.cards_updated = self._save_cards(
+                cards, self.batch_size
+            )
+            self._record(self.CARDS_KEY, self.CARDS_KEY, result)
+        return result
 
-            # Use smaller batch size for bulk create
-            Printing.objects.bulk_create(printings, batch_size=100)
-            return failed_printings, len(printings)
+    def _key_ranges(self, scryfall_cards: QuerySet) -> List[tuple[int, int]]:
+        """Split the ScryfallCards into ranges of batch_size consecutive ids."""
+        ids = list(scryfall_cards.order_by("id").values_list("id", flat=True))
+        return [
+            (ids[i], ids[min(i + self.batch_size, len(ids)) - 1])
+            for i in range(0, len(ids), self.batch_size)
+        ]
 
-    def process(self) -> ProcessingResult:
-        start_time = datetime.now()
+    @with_retry(max_retries=3)
+    def _process_printing_range(
+        self, query, first_id: int, last_id: int
+    ) -> ProcessingResult:
+        """Process the printings of the ScryfallCards of a query with ids from
+        first_id to last_id, in a worker process."""
+        scryfall_cards = ScryfallCard.objects.all()
+        scryfall_cards.query = query
         result = ProcessingResult()
 
-        print("Creating all unique cards...")
-        scryfall_cards = list(ScryfallCard.objects.all())
+        printings = []
+        for scryfall_card in scryfall_cards.filter(
+            id__range=(first_id, last_id)
+        ).iterator(chunk_size=CHUNK_SIZE):
+            card_id = _card_ids.get(scryfall_card.name)
+            if card_id is None:
+                result.failed_printings.append(scryfall_card.name)
+                continue
+
+            printings.append(Printing.from_scryfall_card(card_id, scryfall_card))
 
         with transaction.atomic():
-            processed_names = self._create_cards(scryfall_cards)
-            result.cards_created = len(processed_names)
+            result.printings_created, result.printings_updated = self._save_printings(
+                printings, self.batch_size
+            )
+            self._record(first_id, last_id, result)
+        return result
 
-        print("Processing printings in parallel...")
-        batches = [
-            scryfall_cards[i : i + self.batch_size]
-            for i in range(0, len(scryfall_cards), self.batch_size)
+    def process(self, scryfall_cards: Optional[QuerySet] = None) -> ProcessingResult:
+        start_time = datetime.now()
+        result, completed = self._resume()
+        completed_keys = {(batch.first_key, batch.last_key) for batch in completed}
+
+        if scryfall_cards is None:
+            scryfall_cards = ScryfallCard.objects.all()
+        if (self.CARDS_KEY, self.CARDS_KEY) not in completed_keys:
+            print("Creating all unique cards...")
+            result.add(self._create_cards(scryfall_cards))
+        card_ids = dict(
+            Card.objects.filter(name__in=scryfall_cards.values("name")).values_list(
+                "name", "id"
+            )
+        )
+        key_ranges = [
+            (first, last)
+            for first, last in self._key_ranges(scryfall_cards)
+            if (str(first), str(last)) not in completed_keys
         ]
+        errors = []
+
+        print(f"Processing printings in {self.max_workers} processes...")
+        # forked workers must open their own connections, not share this one
+        connections.close_all()
+        with ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=mp.get_context("fork"),
+            initializer=_init_worker,
+            initargs=(card_ids,),
+        ) as executor:
+            futures = [
+                executor.submit(
+                    self._process_printing_range, scryfall_cards.query, first, last
+                )
+                for first, last in key_ranges
+            ]
 
-        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-            future_to_batch = {
-                executor.submit(self._process_printing_batch, batch): batch
-                for batch in batches
-            }
-
-            with tqdm(total=len(batches), desc="Processing batches") as pbar:
-                for future in as_completed(future_to_batch):
+            with tqdm(total=len(futures), desc="Processing batches") as pbar:
+                for future in as_completed(futures):
                     try:
-                        failed_printings, printings_created = future.result()
-                        result.printings_created += printings_created
-                        result.failed_printings.extend(failed_printings)
+                        result.add(future.result())
+                    except OperationalError as e:
+                        print(f"Batch processing failed with error: {e}")
+                        errors.append(e)
                     except Exception as e:
                         print(f"Batch processing failed with error: {e}")
                     pbar.update(1)
 
+        if errors:
+            # the completed ranges are recorded, so a retry only redoes these
+            raise errors[0]
+
+        result.processing_time = (datetime.now() - start_time).total_seconds()
+        return result
+
+
+class SqlStrategy(ProcessingStrategy):
+    """Derive cards and printings inside postgres with INSERT ... SELECT.
+
+    Cards come from the first ScryfallCard of each name, picked with DISTINCT
+    ON, and printings from every ScryfallCard joined to its card on name. Both
+    use the SQL equivalents of Card.from_scryfall_card and
+    Printing.from_scryfall_card in card_sql, so no row is read into python.
+    """
+
+    def _scope(self, scryfall_cards: Optional[QuerySet]) -> tuple[str, list]:
+        """A condition on the ScryfallCard alias s selecting scryfall_cards."""
+        if scryfall_cards is None:
+            return "TRUE", []
+        sql, params = scryfall_cards.values("id").query.sql_with_params()
+        return f"s.id IN ({sql})", list(params)
+
+    def _insert(
+        self, cursor, merger: Merger, expressions: dict, from_sql: str, params: list
+    ) -> tuple[int, int]:
+        """Insert or, when merging, upsert the rows selected by from_sql.
+
+        Returns:
+            tuple: (rows_created, rows_updated)
+        """
+        select = ", ".join(expressions[f.name] for f in merger.fields)
+        conflict = merger.conflict_sql() if self.merge else ""
+        cursor.execute(
+            f"WITH saved AS ({merger.insert_sql()} SELECT {select} {from_sql} "
+            f"{conflict} RETURNING (t.xmax = 0) AS inserted) "
+            f"SELECT count(*) FILTER (WHERE inserted), "
+            f"count(*) FILTER (WHERE NOT inserted) FROM saved",
+            params,
+        )
+        return cursor.fetchone()
+
+    @with_retry(max_retries=3)
+    def process(self, scryfall_cards: Optional[QuerySet] = None) -> ProcessingResult:
+        start_time = datetime.now()
+        result = ProcessingResult()
+        quote_name = connection.ops.quote_name
+        scryfall_card = quote_name(ScryfallCard._meta.db_table)
+        card = quote_name(Card._meta.db_table)
+        scope, params = self._scope(scryfall_cards)
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            print("Deriving cards...")
+            result.cards_created, result.cards_updated = self._insert(
+                cursor,
+                CardMerger(),
+                card_sql("s"),
+                f"FROM (SELECT DISTINCT ON (s.name) * FROM {scryfall_card} s "
+                f"WHERE coalesce(s.name, '') <> '' AND {scope} "
+                f"ORDER BY s.name, s.id) s",
+                params,
+            )
+
+            print("Deriving printings...")
+            result.printings_created, result.printings_updated = self._insert(
+                cursor,
+                PrintingMerger(),
+                printing_sql("s", "c"),
+                f"FROM {scryfall_card} s JOIN {card} c ON c.name = s.name "
+                f"WHERE {scope}",
+                params,
+            )
+
+            cursor.execute(
+                f"SELECT s.name FROM {scryfall_card} s WHERE {scope} "
+                f"AND NOT EXISTS (SELECT 1 FROM {card} c WHERE c.name = s.name)",
+                params,
+            )
+            for (name,) in cursor.fetchall():
+                if name:
+                    result.failed_printings.append(name)
+                else:
+                    result.failed_cards.append(name)
+
         result.processing_time = (datetime.now() - start_time).total_seconds()
         return result
 
@@ -284,17 +464,118 @@ class CardProcessor:
     _db_cleared = False
     strategy: ProcessingStrategy
 
-    def __init__(self):
-        if os.getenv("PARALLEL_PROCESSING_ENABLED") == "true":
+    def __init__(self, run_id: Optional[str] = None):
+        if os.getenv("SQL_PROCESSING_ENABLED") == "true":
+            self.with_sql_strategy()
+        elif os.getenv("PARALLEL_PROCESSING_ENABLED") == "true":
             self.with_parallel_strategy()
         else:
             self.with_sequential_strategy()
+        self.shadow_load = os.getenv("SHADOW_LOAD_ENABLED") == "true"
+        self.merge = os.getenv("CARD_MERGE_ENABLED") == "true"
+        self.checkpoint = Checkpoint("process", run_id)
 
     @with_retry(max_retries=3)
-    def process_cards(self) -> ProcessingResult:
-        """Process cards using the specified strategy."""
-        self._clear_database_once()
-        return self.strategy.process()
+    def process_cards(
+        self, changed_names: Optional[Iterable[str]] = None
+    ) -> ProcessingResult:
+        """Process cards using the specified strategy.
+
+        With shadow loading, cards and printings are loaded into shadow tables
+        that replace card and printing once loaded, instead of clearing them first.
+
+        When merging, cards are upserted on their name and printings on their
+        set and collector number instead, which keeps the ids of existing rows
+        and the embeddings of unchanged cards. Only the rows that vanished from
+        ScryfallCard are deleted.
+
+        Batches completed by the strategy are checkpointed under the run id, so
+        that a retry, or a later processor with the same run id, resumes where
+        the run stopped instead of starting over; the tables are not cleared
+        again then. Shadow loads start over, as their shadow tables are
+        dropped on failure.
+
+        Args:
+            changed_names: Only rebuild the cards with these names, and their
+                printings, e.g. the names changed by an incremental ingest
+        """
+        self.strategy.merge = self.merge
+        self.strategy.checkpoint = None if self.shadow_load else self.checkpoint
+        resuming = self.strategy.checkpoint is not None and self.checkpoint.started()
+        if resuming:
+            print(f"Resuming run {self.checkpoint.run_id}...")
+
+        if changed_names is not None:
+            result = self._process_changes(set(changed_names), resuming)
+        elif self.merge:
+            result = self._merge_cards()
+        elif self.shadow_load:
+            with ShadowLoad([Card, Printing]):
+                result = self.strategy.process()
+        else:
+            if not resuming:
+                self._clear_database_once()
+            result = self.strategy.process()
+
+        self.checkpoint.clear()
+        return result
+
+    def _process_changes(self, names: Set[str], resuming: bool) -> ProcessingResult:
+        """Rebuild the cards with the given names from their ScryfallCards."""
+        print(f"Rebuilding {len(names)} changed cards...")
+        if self.merge:
+            return self._merge_cards(names)
+
+        if not resuming:
+            with transaction.atomic():
+                Printing.objects.filter(card__name__in=names).delete()
+                Card.objects.filter(name__in=names).delete()
+        return self.strategy.process(ScryfallCard.objects.filter(name__in=names))
+
+    def _merge_cards(self, names: Optional[Set[str]] = None) -> ProcessingResult:
+        """Upsert the cards and printings, among names if given, and delete
+        the ones that vanished from ScryfallCard."""
+        print("Merging cards...")
+        with transaction.atomic():
+            printings_deleted = self._delete_vanished_printings(names)
+            cards_deleted = self._delete_vanished_cards(names)
+
+        scryfall_cards = None
+        if names is not None:
+            scryfall_cards = ScryfallCard.objects.filter(name__in=names)
+        result = self.strategy.process(scryfall_cards)
+        result.cards_deleted = cards_deleted
+        result.printings_deleted = printings_deleted
+        return result
+
+    @staticmethod
+    def _delete_vanished_printings(names: Optional[Set[str]] = None) -> int:
+        """Delete the printings, of the cards among names if given, without a
+        ScryfallCard of the same card, set and collector number."""
+        printings = Printing.objects.filter(
+            ~Exists(
+                ScryfallCard.objects.filter(
+                    name=OuterRef("card__name"),
+                    set_code=OuterRef("set_code"),
+                    collector_number=OuterRef("collector_number"),
+                )
+            )
+        )
+        if names is not None:
+            printings = printings.filter(card__name__in=names)
+        deleted, _ = printings.delete()
+        return deleted
+
+    @staticmethod
+    def _delete_vanished_cards(names: Optional[Set[str]] = None) -> int:
+        """Delete the cards, among names if given, without a ScryfallCard."""
+        cards = Card.objects.filter(
+            ~Exists(ScryfallCard.objects.filter(name=OuterRef("name")))
+        )
+        if names is not None:
+            cards = cards.filter(name__in=names)
+        _, deleted = cards.delete()
+        return deleted.get(Card._meta.label, 0)
 
     def with_sequential_strategy(self) -> None:
         self.strategy = SequentialStrategy()
@@ -302,6 +583,15 @@ class CardProcessor:
     def with_parallel_strategy(self) -> None:
         self.strategy = ParallelStrategy()
 
+    def with_sql_strategy(self) -> None:
+        self.strategy = SqlStrategy()
+
+    def with_shadow_load(self, enabled: bool = True) -> None:
+        self.shadow_load = enabled
+
+    def with_merge(self, enabled: bool = True) -> None:
+        self.merge = enabled
+
     @classmethod
     @with_retry(max_retries=3)
     def _clear_database_once(cls) -> None:
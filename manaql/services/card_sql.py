@@ -0,0 +1,157 @@
+from typing import Dict, Iterable
+
+from common.card_type import MAIN_TYPE_PRECEDENCE, CardType
+from common.color import Color
+from common.finish import Finish
+from common.format import FormatLegalities
+from common.game import Game
+from common.keyword import Keyword
+
+from .printing_prices import price_sql
+
+# SQL equivalents of Card.from_scryfall_card and Printing.from_scryfall_card,
+# and of the common/ helpers they use. They are generated from the same enums
+# so that they cannot drift apart, and inlined into a single INSERT ... SELECT.
+
+
+def _literal(value: str) -> str:
+    return "'" + value.replace("'", "''") + "'"
+
+
+def _in_list(values: Iterable[str]) -> str:
+    return "(" + ", ".join(_literal(value) for value in values) + ")"
+
+
+def _array_sql(column: str, element: str, where: str = "TRUE") -> str:
+    """Map the elements e of an array column in order, keeping those matching
+    where; a NULL array gives an empty one."""
+    return (
+        f"ARRAY(SELECT {element} FROM unnest({column}) WITH ORDINALITY AS u(e, i) "
+        f"WHERE {where} ORDER BY i)"
+    )
+
+
+def main_type_sql(type_line: str) -> str:
+    """SQL equivalent of get_main_type."""
+    front = f"split_part({type_line}, '//', 1)"
+    cases = [f"WHEN left({front}, 8) = 'Enchant ' THEN 'Enchantment'"]
+    for main_type in MAIN_TYPE_PRECEDENCE:
+        value = _literal(main_type.value)
+        cases.append(f"WHEN strpos({front}, {value}) > 0 THEN {value}")
+    unknown = _literal(CardType.Unknown.value)
+    return (
+        f"CASE WHEN coalesce({type_line}, '') = '' THEN {unknown} "
+        f"{' '.join(cases)} ELSE {unknown} END"
+    )
+
+
+def colors_sql(column: str) -> str:
+    """SQL equivalent of get_colors, which maps unknown colors to white."""
+    values = [color.value for color in Color]
+    return _array_sql(
+        column,
+        f"CASE WHEN e IN {_in_list(values)} THEN e "
+        f"ELSE {_literal(Color.White.value)} END",
+    )
+
+
+def games_sql(column: str) -> str:
+    """SQL equivalent of get_games, which maps unknown games to paper."""
+    values = [game.value for game in Game]
+    return _array_sql(
+        column,
+        f"CASE WHEN e IN {_in_list(values)} THEN e "
+        f"ELSE {_literal(Game.Paper.value)} END",
+    )
+
+
+def keywords_sql(column: str) -> str:
+    """SQL equivalent of get_keywords, which drops unknown keywords."""
+    return _array_sql(column, "e", f"e IN {_in_list(k.value for k in Keyword)}")
+
+
+def finishes_sql(column: str) -> str:
+    """SQL equivalent of get_finishes, dropping unknown finishes."""
+    return _array_sql(
+        column, "lower(e)", f"lower(e) IN {_in_list(f.value for f in Finish)}"
+    )
+
+
+def legalities_sql(column: str) -> str:
+    """SQL equivalent of FormatLegalities.from_legalities, as the 6 bytes
+    stored by a LegalitiesField."""
+    formats = ", ".join(
+        f"({_literal(format.value)}, {bit_start})"
+        for format, (bit_start, _) in FormatLegalities.FORMAT_BITS.items()
+    )
+    statuses = ", ".join(
+        f"({_literal(status.value)}, {encoding})"
+        for status, encoding in FormatLegalities.STATUS_ENCODING.items()
+    )
+    encoded = (
+        f"(SELECT sum(st.encoding::bigint << f.bit_start) "
+        f"FROM jsonb_each_text({column}) AS l(format, status) "
+        f"JOIN (VALUES {formats}) AS f(format, bit_start) ON f.format = l.format "
+        f"JOIN (VALUES {statuses}) AS st(status, encoding) ON st.status = l.status)"
+    )
+    # int8send is the 8 byte big-endian encoding, of which the last 6 are kept
+    return f"substring(int8send(coalesce({encoded}, 0)::bigint) FROM 3)"
+
+
+def _is_truthy(json: str) -> str:
+    return f"coalesce({json} NOT IN ('null', '{{}}', '[]'), FALSE)"
+
+
+def _normal_image_uri(image_uris: str) -> str:
+    return (
+        f"CASE WHEN {image_uris} ? 'normal' THEN {image_uris} ->> 'normal' ELSE '' END"
+    )
+
+
+def card_sql(alias: str) -> Dict[str, str]:
+    """SQL expressions of the Card fields, read from a ScryfallCard row alias."""
+    return {
+        "name": f"{alias}.name",
+        "main_type": main_type_sql(f"{alias}.type_line"),
+        "type_line": f"{alias}.type_line",
+        "oracle_text": f"{alias}.oracle_text",
+        "keywords": keywords_sql(f"{alias}.keywords"),
+        "cmc": f"{alias}.cmc",
+        "mana_cost": f"{alias}.mana_cost",
+        "colors": colors_sql(f"{alias}.colors"),
+        "color_identity": colors_sql(f"{alias}.color_identity"),
+        "power": f"{alias}.power",
+        "toughness": f"{alias}.toughness",
+        "games": games_sql(f"{alias}.games"),
+        "legalities": legalities_sql(f"{alias}.legalities"),
+        "reserved": f"{alias}.reserved",
+        "game_changer": f"{alias}.game_changer",
+    }
+
+
+def printing_sql(alias: str, card_alias: str) -> Dict[str, str]:
+    """SQL expressions of the Printing fields, read from a ScryfallCard row
+    alias joined to its Card as card_alias."""
+    image_uris = f"{alias}.image_uris"
+    front = f"{alias}.card_faces -> 0 -> 'image_uris'"
+    back = f"{alias}.card_faces -> 1 -> 'image_uris'"
+    # Printing.get_image_uris: the card's own images or else, for mdfcs, those
+    # of its faces
+    faces = f"NOT {_is_truthy(image_uris)} AND {_is_truthy(f'{alias}.card_faces')}"
+    return {
+        "card": f"{card_alias}.id",
+        "set_code": f"{alias}.set_code",
+        "set_name": f"{alias}.set_name",
+        "collector_number": f"{alias}.collector_number",
+        "is_serialized": f"coalesce('serialized' = ANY({alias}.promo_types), FALSE)",
+        "image_uri": (
+            f"CASE WHEN {_is_truthy(image_uris)} THEN {_normal_image_uri(image_uris)} "
+            f"WHEN {faces} AND {_is_truthy(front)} THEN {_normal_image_uri(front)} END"
+        ),
+        "back_image_uri": (
+            f"CASE WHEN {faces} AND {_is_truthy(back)} "
+            f"THEN {_normal_image_uri(back)} END"
+        ),
+        "finishes": finishes_sql(f"{alias}.finishes"),
+        **price_sql(alias),
+    }
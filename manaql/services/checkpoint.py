@@ -0,0 +1,44 @@
+import uuid
+from typing import Any, Dict, List, Optional
+
+from database.models.batch_progress import BatchProgress
+from django.db.models import QuerySet
+
+
+class Checkpoint:
+    """Records the batches of a stage completed by a run, so that a retry, or
+    a later run with the same run id, only processes the remaining batches.
+
+    A batch is recorded by its first and last keys, e.g. primary keys or names,
+    along with its result. Recording it in the same transaction as the batch's
+    writes makes a batch recorded if and only if its writes were committed.
+    """
+
+    def __init__(self, stage: str, run_id: Optional[str] = None):
+        self.stage = stage
+        self.run_id = run_id or uuid.uuid4().hex
+
+    def _batches(self) -> QuerySet:
+        return BatchProgress.objects.filter(run_id=self.run_id, stage=self.stage)
+
+    def started(self) -> bool:
+        """Whether any batch of the stage was completed by this run."""
+        return self._batches().exists()
+
+    def completed(self) -> List[BatchProgress]:
+        """The completed batches, in the order they were recorded."""
+        return list(self._batches().order_by("id"))
+
+    def record(self, first_key: Any, last_key: Any, result: Dict) -> None:
+        """Record a completed batch, in the transaction of its writes."""
+        BatchProgress.objects.create(
+            run_id=self.run_id,
+            stage=self.stage,
+            first_key=str(first_key),
+            last_key=str(last_key),
+            result=result,
+        )
+
+    def clear(self) -> None:
+        """Forget the stage's batches, once it completed."""
+        self._batches().delete()
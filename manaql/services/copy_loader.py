@@ -0,0 +1,251 @@
+import io
+import json
+import struct
+import uuid
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence
+
+from django.db import connection, models
+
+COPY_READ_SIZE = 1024 * 1024  # 1 MiB
+COPY_FORMATS = ("text", "binary")
+
+BINARY_HEADER = b"PGCOPY\n\xff\r\n\x00" + struct.pack("!ii", 0, 0)
+BINARY_TRAILER = struct.pack("!h", -1)
+BINARY_NULL = struct.pack("!i", -1)
+
+# element type OIDs for binary arrays, which postgres checks against the column
+ARRAY_ELEMENT_OIDS = {
+    "CharField": 1043,  # varchar
+    "TextField": 25,  # text
+}
+
+
+def _escape_text(value: str) -> str:
+    """Escape a value for the COPY text format."""
+    return (
+        value.replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+
+def _array_literal(values: Sequence) -> str:
+    """Format a list as a postgres array literal, e.g. {"a","b"}."""
+    elements = []
+    for value in values:
+        if value is None:
+            elements.append("NULL")
+        else:
+            value = str(value).replace("\\", "\\\\").replace('"', '\\"')
+            elements.append(f'"{value}"')
+    return "{" + ",".join(elements) + "}"
+
+
+def _text_encoder(field: models.Field) -> Callable:
+    match field.get_internal_type():
+        case "ArrayField":
+            return lambda value: _escape_text(_array_literal(value))
+        case "JSONField":
+            return lambda value: _escape_text(json.dumps(value))
+        case "BooleanField":
+            return lambda value: "t" if value else "f"
+        case "FloatField" | "IntegerField" | "BigIntegerField" | "AutoField":
+            return str
+        case "VectorField":
+            return lambda value: "[" + ",".join(str(float(x)) for x in value) + "]"
+        case _:
+            return lambda value: _escape_text(str(value))
+
+
+def _binary_array(value: Sequence, element_oid: int) -> bytes:
+    if not value:
+        return struct.pack("!iii", 0, 0, element_oid)
+
+    has_null = any(element is None for element in value)
+    parts = [struct.pack("!iiiii", 1, int(has_null), element_oid, len(value), 1)]
+    for element in value:
+        if element is None:
+            parts.append(BINARY_NULL)
+        else:
+            data = str(element).encode()
+            parts.append(struct.pack("!i", len(data)))
+            parts.append(data)
+    return b"".join(parts)
+
+
+def _binary_vector(value: Sequence) -> bytes:
+    # pgvector's vector_recv: the dimensions, an unused int16, then float4s
+    return struct.pack(f"!hh{len(value)}f", len(value), 0, *value)
+
+
+def _binary_encoder(field: models.Field) -> Callable:
+    match field.get_internal_type():
+        case "ArrayField":
+            base_type = field.base_field.get_internal_type()
+            if base_type not in ARRAY_ELEMENT_OIDS:
+                raise ValueError(f"Unsupported array type {base_type} for {field.name}")
+            oid = ARRAY_ELEMENT_OIDS[base_type]
+            return lambda value: _binary_array(value, oid)
+        case "JSONField":
+            # jsonb binary format: a version byte followed by the json text
+            return lambda value: b"\x01" + json.dumps(value).encode()
+        case "BooleanField":
+            return lambda value: b"\x01" if value else b"\x00"
+        case "FloatField":
+            return lambda value: struct.pack("!d", value)
+        case "IntegerField" | "AutoField":
+            return lambda value: struct.pack("!i", value)
+        case "BigIntegerField" | "BigAutoField":
+            return lambda value: struct.pack("!q", value)
+        case "CharField" | "TextField":
+            return lambda value: str(value).encode()
+        case "UUIDField":
+            return lambda value: uuid.UUID(str(value)).bytes
+        case "VectorField":
+            return _binary_vector
+        case internal_type:
+            raise ValueError(f"Unsupported field type {internal_type} for {field.name}")
+
+
+class _CopyStream(io.RawIOBase):
+    """Read-only file object over an iterator of byte chunks, for copy_expert."""
+
+    def __init__(self, chunks: Iterator[bytes]):
+        super().__init__()
+        self._chunks = chunks
+        self._buffer = b""
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        while not self._buffer:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return 0
+            # a view, so that consuming it below never copies the rest
+            self._buffer = memoryview(chunk)
+
+        n = min(len(b), len(self._buffer))
+        b[:n] = self._buffer[:n]
+        self._buffer = self._buffer[n:]
+        return n
+
+
+class CopyLoader:
+    """Loads rows into a model's table with PostgreSQL COPY ... FROM STDIN.
+
+    Rows are tuples of python values in the order of `fields` (all concrete
+    non primary key fields by default). They are encoded lazily into the COPY
+    text or binary format and streamed to postgres in COPY_READ_SIZE chunks,
+    without instantiating any model.
+    """
+
+    def __init__(
+        self,
+        model: type[models.Model],
+        fields: Optional[Sequence[str]] = None,
+        copy_format: str = "text",
+        db_table: Optional[str] = None,
+    ):
+        if copy_format not in COPY_FORMATS:
+            raise ValueError(f"Unknown COPY format {copy_format}")
+
+        self.model = model
+        self.copy_format = copy_format
+        self.db_table = db_table or model._meta.db_table
+        if fields:
+            self.fields = [model._meta.get_field(name) for name in fields]
+        else:
+            self.fields = [f for f in model._meta.concrete_fields if not f.primary_key]
+
+        make_encoder = _binary_encoder if copy_format == "binary" else _text_encoder
+        self._encoders = [make_encoder(field) for field in self.fields]
+
+    def row(self, values: Dict) -> tuple:
+        """Build a row from a dict of field name to value."""
+        return tuple(values.get(field.name) for field in self.fields)
+
+    def copy_sql(self) -> str:
+        quote_name = connection.ops.quote_name
+        columns = ", ".join(quote_name(field.column) for field in self.fields)
+        return (
+            f"COPY {quote_name(self.db_table)} ({columns}) "
+            f"FROM STDIN WITH (FORMAT {self.copy_format})"
+        )
+
+    def _encode_text_row(self, row: Sequence) -> bytes:
+        return (
+            "\t".join(
+                "\\N" if value is None else encode(value)
+                for encode, value in zip(self._encoders, row)
+            )
+            + "\n"
+        ).encode()
+
+    def _encode_binary_row(self, row: Sequence) -> bytes:
+        parts = [struct.pack("!h", len(self._encoders))]
+        for encode, value in zip(self._encoders, row):
+            if value is None:
+                parts.append(BINARY_NULL)
+            else:
+                data = encode(value)
+                parts.append(struct.pack("!i", len(data)))
+                parts.append(data)
+        return b"".join(parts)
+
+    def encode_row(self, row: Sequence) -> bytes:
+        """Encode a row into the COPY format, raising if a value can't be."""
+        if self.copy_format == "binary":
+            return self._encode_binary_row(row)
+        return self._encode_text_row(row)
+
+    def _chunks(self, encoded_rows: Iterable[bytes]) -> Iterator[bytes]:
+        """Join encoded rows into COPY data chunks of about COPY_READ_SIZE."""
+        binary = self.copy_format == "binary"
+        chunk: List[bytes] = [BINARY_HEADER] if binary else []
+        chunk_size = 0
+        for data in encoded_rows:
+            chunk.append(data)
+            chunk_size += len(data)
+            if chunk_size >= COPY_READ_SIZE:
+                yield b"".join(chunk)
+                chunk = []
+                chunk_size = 0
+
+        if binary:
+            chunk.append(BINARY_TRAILER)
+        if chunk:
+            yield b"".join(chunk)
+
+    def encode_rows(self, rows: Iterable[Sequence]) -> Iterator[bytes]:
+        """Encode rows into COPY data, yielded in chunks of about COPY_READ_SIZE."""
+        binary = self.copy_format == "binary"
+        encode_row = self._encode_binary_row if binary else self._encode_text_row
+        return self._chunks(map(encode_row, rows))
+
+    def _copy(self, chunks: Iterator[bytes]) -> None:
+        stream = _CopyStream(chunks)
+        with connection.cursor() as cursor:
+            # positionally, as the debug cursor wrapper takes no keywords
+            cursor.copy_expert(self.copy_sql(), stream, COPY_READ_SIZE)
+
+    def load(self, rows: Iterable[Sequence]) -> int:
+        """COPY the rows into the table and return how many were loaded."""
+        count = 0
+
+        def counted(rows):
+            nonlocal count
+            for row in rows:
+                count += 1
+                yield row
+
+        self._copy(self.encode_rows(counted(rows)))
+        return count
+
+    def load_encoded(self, encoded_rows: Sequence[bytes]) -> int:
+        """COPY rows already encoded by encode_row, e.g. so that a row that
+        can't be encoded fails on its own rather than the whole COPY."""
+        self._copy(self._chunks(encoded_rows))
+        return len(encoded_rows)
@@ -1,4 +1,5 @@
 import functools
+import random
 import time
 from typing import Any, Callable, TypeVar
 
@@ -11,6 +12,7 @@ def with_retry(
     max_retries: int = 3,
     initial_backoff: float = 1.0,
     backoff_multiplier: float = 2.0,
+    jitter: float = 0.5,
     exceptions: tuple = (OperationalError,),
 ) -> Callable[[Callable[..., T]], Callable[..., T]]:
     """
@@ -20,6 +22,8 @@ def with_retry(
         max_retries: Maximum number of retry attempts
         initial_backoff: Initial backoff time in seconds
         backoff_multiplier: Multiplier for exponential backoff
+        jitter: Fraction of each backoff that is randomized, so that concurrent
+            workers failing together do not retry in lockstep
         exceptions: Tuple of exceptions to catch and retry
     """
 
@@ -38,11 +42,12 @@ def with_retry(
                         print(f"Failed after {max_retries} retries: {str(e)}")
                         raise
 
+                    delay = current_backoff * (1 - jitter * random.random())
                     print(
-                        f"Operation failed, retrying ({retry_count}/{max_retries}) after {current_backoff:.1f}s..."
+                        f"Operation failed, retrying ({retry_count}/{max_retries}) after {delay:.1f}s..."
                     )
                     connections.close_all()
-                    time.sleep(current_backoff)
+                    time.sleep(delay)
                     current_backoff *= backoff_multiplier
 
         return wrapper
@@ -0,0 +1,366 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from tqdm import tqdm
+
+READ_SIZE = 1024 * 1024  # 1 MiB
+RANGE_SIZE = 32 * 1024 * 1024  # 32 MiB
+STATE_SAVE_INTERVAL = 8 * 1024 * 1024  # persist progress every 8 MiB per range
+
+
+@dataclass
+class ByteRange:
+    """An inclusive byte range of the remote file and how much of it is on disk."""
+
+    start: int
+    end: int
+    downloaded: int = 0
+
+    @property
+    def size(self) -> int:
+        return self.end - self.start + 1
+
+    @property
+    def done(self) -> bool:
+        return self.downloaded >= self.size
+
+
+@dataclass
+class DownloadState:
+    """Sidecar state of an in-progress download, used to resume it."""
+
+    url: str
+    size: int
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    ranges: List[ByteRange] = field(default_factory=list)
+
+    @property
+    def downloaded(self) -> int:
+        return sum(r.downloaded for r in self.ranges)
+
+    def matches(self, other: "DownloadState") -> bool:
+        return (
+            self.url == other.url
+            and self.size == other.size
+            and self.etag == other.etag
+            and self.last_modified == other.last_modified
+        )
+
+    @staticmethod
+    def load(path: Path) -> Optional["DownloadState"]:
+        if not path.exists():
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            data["ranges"] = [ByteRange(**r) for r in data.get("ranges", [])]
+            return DownloadState(**data)
+        except (OSError, ValueError, TypeError) as e:
+            print(f"Ignoring unreadable download state {path}: {e}")
+            return None
+
+    def save(self, path: Path) -> None:
+        tmp_path = path.with_name(f"{path.name}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(asdict(self), f)
+        os.replace(tmp_path, path)
+
+
+@dataclass
+class DownloadResult:
+    """Holds the results of a download."""
+
+    size: int = 0
+    resumed_bytes: int = 0
+    connections: int = 1
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    download_time: float = 0.0  # in seconds
+
+    @property
+    def throughput(self) -> float:
+        """Bytes per second transferred during this run."""
+        if not self.download_time:
+            return 0.0
+        return (self.size - self.resumed_bytes) / self.download_time
+
+
+class RangeNotSatisfiedError(Exception):
+    """The server ignored a Range request, i.e. the remote file has changed."""
+
+
+class RangedDownloader:
+    """Downloads a file over several pooled connections using HTTP Range requests.
+
+    The file is split into byte ranges that are fetched concurrently and written
+    in place into a preallocated partial file. Progress is persisted to a sidecar
+    state file (``<local_path>.state``) so that an interrupted transfer resumes
+    from where it stopped instead of starting over. Servers that don't support
+    ranges fall back to a single streamed request.
+    """
+
+    def __init__(
+        self,
+        session: requests.Session,
+        connections: int = 4,
+        range_size: int = RANGE_SIZE,
+        read_size: int = READ_SIZE,
+        max_retries: int = 3,
+        initial_backoff: float = 1.0,
+    ):
+        self.session = session
+        self.connections = max(1, connections)
+        self.range_size = range_size
+        self.read_size = read_size
+        self.max_retries = max_retries
+        self.initial_backoff = initial_backoff
+        self._lock = threading.Lock()
+
+        # make sure the session's pool keeps one connection per worker
+        adapter = HTTPAdapter(
+            pool_connections=self.connections, pool_maxsize=self.connections
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    @staticmethod
+    def state_path(local_path: Path) -> Path:
+        return local_path.with_name(f"{local_path.name}.state")
+
+    def download(
+        self,
+        url: str,
+        local_path: Path,
+        expected_size: int = 0,
+        headers: Optional[Dict[str, str]] = None,
+    ) -> Optional[DownloadResult]:
+        """Download url to local_path, resuming a previous partial download if possible.
+
+        Returns None if the server answered 304 Not Modified to the given
+        conditional headers.
+        """
+        start_time = time.time()
+
+        # ranges must refer to the stored bytes, so ask for the identity encoding
+        head_response = self.session.head(
+            url,
+            headers={**(headers or {}), "Accept-Encoding": "identity"},
+            allow_redirects=True,
+        )
+        if head_response.status_code == 304:
+            return None
+        head_response.raise_for_status()
+
+        size = int(head_response.headers.get("Content-Length", expected_size) or 0)
+        state = DownloadState(
+            url=url,
+            size=size,
+            etag=head_response.headers.get("ETag"),
+            last_modified=head_response.headers.get("Last-Modified"),
+        )
+        supports_ranges = (
+            head_response.headers.get("Accept-Ranges", "").lower() == "bytes"
+            and size > 0
+        )
+
+        if supports_ranges:
+            result = self._download_ranges(state, local_path)
+        else:
+            result = self._download_single(url, local_path, state, headers)
+
+        result.download_time = time.time() - start_time
+        return result
+
+    def _download_single(
+        self,
+        url: str,
+        local_path: Path,
+        state: DownloadState,
+        headers: Optional[Dict[str, str]],
+    ) -> DownloadResult:
+        """Fallback for servers without range support: one streamed request."""
+        print("Server does not support ranged requests, downloading in one stream")
+        response = self.session.get(url, stream=True, headers=headers)
+        response.raise_for_status()
+
+        size = 0
+        with tqdm(total=state.size or None, unit="B", unit_scale=True) as pbar:
+            with open(local_path, "wb") as f:
+                for chunk in response.iter_content(chunk_size=self.read_size):
+                    if chunk:
+                        f.write(chunk)
+                        size += len(chunk)
+                        pbar.update(len(chunk))
+
+        self.state_path(local_path).unlink(missing_ok=True)
+        return DownloadResult(
+            size=size,
+            etag=response.headers.get("ETag", state.etag),
+            last_modified=response.headers.get("Last-Modified", state.last_modified),
+        )
+
+    def _load_or_create_state(
+        self, state: DownloadState, local_path: Path
+    ) -> DownloadState:
+        state_path = self.state_path(local_path)
+        previous = DownloadState.load(state_path)
+        if (
+            previous is not None
+            and previous.matches(state)
+            and local_path.exists()
+            and local_path.stat().st_size == state.size
+        ):
+            print(
+                f"Resuming download, {previous.downloaded}/{state.size} bytes already on disk"
+            )
+            return previous
+
+        state.ranges = [
+            ByteRange(start, min(start + self.range_size, state.size) - 1)
+            for start in range(0, state.size, self.range_size)
+        ]
+        # preallocate the partial file so that every range can be written in place
+        with open(local_path, "wb") as f:
+            f.truncate(state.size)
+        state.save(state_path)
+        return state
+
+    def _download_ranges(
+        self, state: DownloadState, local_path: Path
+    ) -> DownloadResult:
+        state = self._load_or_create_state(state, local_path)
+        state_path = self.state_path(local_path)
+        resumed_bytes = state.downloaded
+        pending = [r for r in state.ranges if not r.done]
+
+        print(
+            f"Downloading {state.size} bytes in {len(pending)} ranges "
+            f"over {self.connections} connections"
+        )
+
+        with tqdm(
+            total=state.size, initial=resumed_bytes, unit="B", unit_scale=True
+        ) as pbar:
+            try:
+                with ThreadPoolExecutor(max_workers=self.connections) as executor:
+                    futures = [
+                        executor.submit(
+                            self._download_range_with_retry,
+                            state,
+                            byte_range,
+                            local_path,
+                            state_path,
+                            pbar,
+                        )
+                        for byte_range in pending
+                    ]
+                    for future in as_completed(futures):
+                        future.result()
+            except RangeNotSatisfiedError:
+                # the remote file changed under us, the partial file is useless
+                state_path.unlink(missing_ok=True)
+                raise
+            finally:
+                with self._lock:
+                    if state_path.exists():
+                        state.save(state_path)
+
+        state_path.unlink(missing_ok=True)
+        return DownloadResult(
+            size=state.size,
+            resumed_bytes=resumed_bytes,
+            connections=self.connections,
+            etag=state.etag,
+            last_modified=state.last_modified,
+        )
+
+    def _download_range_with_retry(
+        self,
+        state: DownloadState,
+        byte_range: ByteRange,
+        local_path: Path,
+        state_path: Path,
+        pbar: tqdm,
+    ) -> None:
+        retry_count = 0
+        backoff = self.initial_backoff
+        while True:
+            try:
+                return self._download_range(
+                    state, byte_range, local_path, state_path, pbar
+                )
+            except RangeNotSatisfiedError:
+                raise
+            except (requests.RequestException, OSError) as e:
+                retry_count += 1
+                if retry_count >= self.max_retries:
+                    print(
+                        f"Range {byte_range.start}-{byte_range.end} failed after "
+                        f"{self.max_retries} retries: {e}"
+                    )
+                    raise
+                print(
+                    f"Range {byte_range.start}-{byte_range.end} failed, resuming at "
+                    f"{byte_range.start + byte_range.downloaded} after {backoff:.1f}s: {e}"
+                )
+                time.sleep(backoff)
+                backoff *= 2
+
+    def _download_range(
+        self,
+        state: DownloadState,
+        byte_range: ByteRange,
+        local_path: Path,
+        state_path: Path,
+        pbar: tqdm,
+    ) -> None:
+        offset = byte_range.start + byte_range.downloaded
+        headers = {
+            "Range": f"bytes={offset}-{byte_range.end}",
+            "Accept-Encoding": "identity",
+        }
+        validator = state.etag or state.last_modified
+        if validator:
+            headers["If-Range"] = validator
+
+        with self.session.get(state.url, headers=headers, stream=True) as response:
+            if response.status_code == 200:
+                raise RangeNotSatisfiedError(
+                    f"Server ignored range request for {state.url}"
+                )
+            response.raise_for_status()
+
+            unsaved = 0
+            with open(local_path, "r+b", buffering=0) as f:
+                f.seek(offset)
+                for chunk in response.iter_content(chunk_size=self.read_size):
+                    if not chunk:
+                        continue
+                    chunk = chunk[: byte_range.size - byte_range.downloaded]
+                    f.write(chunk)
+                    with self._lock:
+                        byte_range.downloaded += len(chunk)
+                        pbar.update(len(chunk))
+                    unsaved += len(chunk)
+                    if unsaved >= STATE_SAVE_INTERVAL:
+                        f.flush()
+                        with self._lock:
+                            state.save(state_path)
+                        unsaved = 0
+                    if byte_range.done:
+                        break
+
+        if not byte_range.done:
+            raise requests.ConnectionError(
+                f"Connection closed after {byte_range.downloaded}/{byte_range.size} "
+                f"bytes of range {byte_range.start}-{byte_range.end}"
+            )
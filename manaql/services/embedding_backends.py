@@ -0,0 +1,324 @@
+import asyncio
+import functools
+import hashlib
+import math
+import os
+import re
+from abc import ABC, abstractmethod
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+import openai
+
+from .rate_limiter import RateLimiter
+
+# inputs and estimated tokens packed into each embeddings request; the API
+# allows up to 2048 inputs and 300k tokens per request
+EMBEDDING_BATCH_SIZE = 512
+EMBEDDING_BATCH_TOKENS = 100_000
+# a conservative estimate, as English text averages about 4 characters a token
+CHARS_PER_TOKEN = 3
+# the quotas of text-embedding-3-small at usage tier 1
+EMBEDDING_REQUESTS_PER_MINUTE = 3000
+EMBEDDING_TOKENS_PER_MINUTE = 1_000_000
+# requests kept in flight at once
+EMBEDDING_CONCURRENCY = 8
+# retries of a request that was rate limited or failed to reach the API
+EMBEDDING_MAX_RETRIES = 5
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
+)
+
+# texts the hashing backend embeds per call, which only bounds memory
+HASHING_PAGE_SIZE = 4096
+# words, numbers and mana symbols such as {T} or {2/U}
+HASHING_TOKEN_PATTERN = re.compile(r"\{[^}]*\}|[a-z0-9]+(?:'[a-z]+)?")
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def env_int(name: str, default: int) -> int:
+    return int(os.getenv(name, default))
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    """The seconds the server asked to wait before retrying, if it did."""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    try:
+        if "retry-after-ms" in response.headers:
+            return float(response.headers["retry-after-ms"]) / 1000
+        if "retry-after" in response.headers:
+            return float(response.headers["retry-after"])
+    except ValueError:  # e.g. an HTTP date
+        pass
+    return None
+
+
+class PartialEmbeddingError(Exception):
+    """Raised when some of a call's embedding requests failed, with the
+    embeddings of the texts whose requests succeeded, which were paid for.
+
+    The embeddings and the failed texts are keyed like the texts were: by
+    index from a backend, by text hash from EmbeddingService.embed_cards.
+    """
+
+    def __init__(self, embeddings: Dict, failed: Set, error: BaseException):
+        super().__init__(f"{len(failed)} embeddings failed: {error}")
+        self.embeddings = embeddings
+        self.failed = failed
+        self.error = error
+
+
+@dataclass
+class EmbeddingStats:
+    """Holds the requests made by an EmbeddingService, and the rate achieved."""
+
+    requests: int = 0
+    texts: int = 0
+    tokens: int = 0
+    retries: int = 0
+    cached: int = 0  # cards whose embedding was found in the cache
+    elapsed: float = 0.0  # seconds spent generating embeddings
+
+    @property
+    def requests_per_minute(self) -> float:
+        return self.requests * 60 / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def tokens_per_minute(self) -> float:
+        return self.tokens * 60 / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def texts_per_second(self) -> float:
+        return self.texts / self.elapsed if self.elapsed else 0.0
+
+    def __str__(self) -> str:
+        return (
+            f"Embedding requests: {self.requests} "
+            f"({self.requests_per_minute:.0f}/min)\n"
+            f"Embedding tokens: {self.tokens} ({self.tokens_per_minute:.0f}/min)\n"
+            f"Texts embedded: {self.texts} ({self.texts_per_second:.0f}/s)\n"
+            f"Retries: {self.retries}\n"
+            f"Cached embeddings: {self.cached}"
+        )
+
+
+class EmbeddingBackend(ABC):
+    """Generates the embeddings of texts for an EmbeddingService."""
+
+    # the name embeddings are cached under, along with their text, so that
+    # switching backends never reuses another backend's embeddings
+    model: str
+    dimensions: int
+
+    @property
+    @abstractmethod
+    def page_size(self) -> int:
+        """Texts to embed per call to use the backend fully."""
+
+    @abstractmethod
+    def embed(self, texts: List[str], stats: EmbeddingStats) -> List[List[float]]:
+        """Generate the embeddings of the texts, in order, counting them in stats."""
+
+
+class OpenAIBackend(EmbeddingBackend):
+    """Embeds texts with OpenAI's text-embedding-3-small model.
+
+    Texts are packed into batched requests, up to max_concurrency of which are
+    kept in flight by an asyncio client, paced by a token bucket over both the
+    requests and the tokens per minute quotas. A rate limited request pauses
+    every request for as long as its Retry-After asks, then is retried.
+    """
+
+    model = "text-embedding-3-small"
+
+    def __init__(
+        self,
+        dimensions: int,
+        max_batch_size: Optional[int] = None,
+        max_batch_tokens: Optional[int] = None,
+        max_concurrency: Optional[int] = None,
+        requests_per_minute: Optional[int] = None,
+        tokens_per_minute: Optional[int] = None,
+    ):
+        self.dimensions = dimensions
+        self.api_key = os.getenv("OPENAI_API_KEY")
+        self.base_url = os.getenv("OPENAI_BASE_URL")
+        self.max_batch_size = max_batch_size or env_int(
+            "EMBEDDING_BATCH_SIZE", EMBEDDING_BATCH_SIZE
+        )
+        self.max_batch_tokens = max_batch_tokens or env_int(
+            "EMBEDDING_BATCH_TOKENS", EMBEDDING_BATCH_TOKENS
+        )
+        self.max_concurrency = max_concurrency or env_int(
+            "EMBEDDING_CONCURRENCY", EMBEDDING_CONCURRENCY
+        )
+        self.max_retries = EMBEDDING_MAX_RETRIES
+        self.limiter = RateLimiter(
+            requests_per_minute
+            or env_int("EMBEDDING_REQUESTS_PER_MINUTE", EMBEDDING_REQUESTS_PER_MINUTE),
+            tokens_per_minute
+            or env_int("EMBEDDING_TOKENS_PER_MINUTE", EMBEDDING_TOKENS_PER_MINUTE),
+        )
+
+    @property
+    def page_size(self) -> int:
+        """Texts to embed per call to keep every request slot busy."""
+        return self.max_batch_size * self.max_concurrency
+
+    def _batches(self, texts: List[str]) -> Iterator[List[int]]:
+        """Pack the indices of texts into batches of at most max_batch_size
+        texts and, unless a single text exceeds it, max_batch_tokens tokens."""
+        batch: List[int] = []
+        tokens = 0
+        for i, text in enumerate(texts):
+            text_tokens = estimate_tokens(text)
+            if batch and (
+                len(batch) >= self.max_batch_size
+                or tokens + text_tokens > self.max_batch_tokens
+            ):
+                yield batch
+                batch, tokens = [], 0
+            batch.append(i)
+            tokens += text_tokens
+        if batch:
+            yield batch
+
+    async def _request(
+        self,
+        client: openai.AsyncOpenAI,
+        texts: List[str],
+        tokens: int,
+        stats: EmbeddingStats,
+    ) -> openai.types.CreateEmbeddingResponse:
+        for attempt in range(self.max_retries + 1):
+            await self.limiter.acquire(tokens)
+            try:
+                return await client.embeddings.create(
+                    model=self.model, input=texts, dimensions=self.dimensions
+                )
+            except RETRYABLE_ERRORS as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = _retry_after(e) or 2**attempt
+                print(f"Embedding request failed, retrying after {delay:.1f}s: {e}")
+                stats.retries += 1
+                if isinstance(e, openai.RateLimitError):
+                    # the quota is shared, so every request backs off
+                    self.limiter.pause(delay)
+                else:
+                    await asyncio.sleep(delay)
+
+    async def aembed(
+        self, texts: List[str], stats: EmbeddingStats
+    ) -> List[List[float]]:
+        """Generate the embeddings of the given texts, in order, with as few
+        requests to OpenAI's API as the batch limits allow, max_concurrency
+        of them at a time.
+
+        A request that still fails after its retries fails only its own
+        texts: if others succeeded, PartialEmbeddingError is raised with
+        their embeddings, otherwise the request's error is.
+        """
+        embeddings: List[Optional[List[float]]] = [None] * len(texts)
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def embed(client: openai.AsyncOpenAI, batch: List[int]) -> None:
+            batch_texts = [texts[i] for i in batch]
+            tokens = sum(estimate_tokens(text) for text in batch_texts)
+            async with semaphore:
+                response = await self._request(client, batch_texts, tokens, stats)
+            # each embedding carries the index of its input within the request
+            for item in response.data:
+                embeddings[batch[item.index]] = item.embedding
+            stats.requests += 1
+            stats.texts += len(batch)
+            stats.tokens += response.usage.total_tokens or tokens
+
+        # retries are left to _request, which paces them with the limiter
+        async with openai.AsyncOpenAI(
+            api_key=self.api_key, base_url=self.base_url, max_retries=0
+        ) as client:
+            outcomes = await asyncio.gather(
+                *(embed(client, batch) for batch in self._batches(texts)),
+                return_exceptions=True,
+            )
+
+        errors = [outcome for outcome in outcomes if isinstance(outcome, BaseException)]
+        failed = {i for i, embedding in enumerate(embeddings) if embedding is None}
+        if not failed:
+            return embeddings
+        error = (
+            errors[0]
+            if errors
+            else Exception(f"{len(failed)} embeddings were missing from the responses")
+        )
+        if len(failed) == len(texts):
+            raise error
+        succeeded = {
+            i: embedding for i, embedding in enumerate(embeddings) if i not in failed
+        }
+        raise PartialEmbeddingError(succeeded, failed, error)
+
+    def embed(self, texts: List[str], stats: EmbeddingStats) -> List[List[float]]:
+        return asyncio.run(self.aembed(texts, stats))
+
+
+@functools.lru_cache(maxsize=1 << 18)
+def _feature_slot(feature: str, dimensions: int) -> Tuple[int, float]:
+    """The dimension a feature is hashed to, and its sign."""
+    digest = hashlib.blake2b(feature.encode(), digest_size=8).digest()
+    value = int.from_bytes(digest, "big")
+    return value % dimensions, 1.0 if value >> 63 else -1.0
+
+
+class HashingBackend(EmbeddingBackend):
+    """Embeds texts on the CPU with a deterministic hashing vectorizer.
+
+    Each text's words, mana symbols and pairs of adjacent ones are hashed to a
+    dimension and a sign, weighted by 1 + log of their count, and the vector
+    is normalized to unit length, so that texts sharing more features have a
+    greater cosine similarity. This needs no model, network or API key, e.g.
+    for CI, offline machines or experiments, but captures no meaning beyond
+    the shared words: its embeddings are not comparable to OpenAI's.
+    """
+
+    def __init__(self, dimensions: int):
+        self.dimensions = dimensions
+        # versioned, so that changing the features re-keys the cache
+        self.model = f"hashing-v1-{dimensions}"
+
+    @property
+    def page_size(self) -> int:
+        return HASHING_PAGE_SIZE
+
+    def _features(self, text: str) -> Counter:
+        tokens = HASHING_TOKEN_PATTERN.findall(text.lower())
+        features = Counter(tokens)
+        features.update(f"{a} {b}" for a, b in zip(tokens, tokens[1:]))
+        return features
+
+    def _embed_text(self, text: str) -> List[float]:
+        values: Dict[int, float] = {}
+        for feature, count in self._features(text).items():
+            index, sign = _feature_slot(feature, self.dimensions)
+            values[index] = values.get(index, 0.0) + sign * (1.0 + math.log(count))
+
+        embedding = [0.0] * self.dimensions
+        norm = math.sqrt(sum(value * value for value in values.values()))
+        for index, value in values.items():
+            if norm:
+                embedding[index] = value / norm
+        return embedding
+
+    def embed(self, texts: List[str], stats: EmbeddingStats) -> List[List[float]]:
+        embeddings = [self._embed_text(text) for text in texts]
+        stats.texts += len(texts)
+        return embeddings
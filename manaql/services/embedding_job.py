@@ -0,0 +1,144 @@
+import time
+from dataclasses import dataclass
+from typing import List, Optional, Set
+
+from database.models.card import Card
+from django.db import InterfaceError, OperationalError, transaction
+from django.db.models import QuerySet
+
+from .checkpoint import Checkpoint
+from .embedding_backends import PartialEmbeddingError
+from .embedding_service import EmbeddingService
+
+
+@dataclass
+class EmbeddingJobResult:
+    """Holds the results of an embedding job."""
+
+    cards_processed: int = 0
+    cards_failed: int = 0
+    batches: int = 0
+    resumed_cards: int = 0  # processed by an earlier attempt of the run
+    processing_time: float = 0.0
+
+    @property
+    def cards_per_second(self) -> float:
+        if not self.processing_time:
+            return 0.0
+        return (self.cards_processed - self.resumed_cards) / self.processing_time
+
+    def __str__(self) -> str:
+        return (
+            f"Total cards: {self.cards_processed + self.cards_failed}\n"
+            f"Successfully processed: {self.cards_processed}\n"
+            f"Failed: {self.cards_failed}\n"
+            f"Resumed after: {self.resumed_cards} cards\n"
+            f"Batches: {self.batches} ({self.cards_per_second:.1f} cards/s)"
+        )
+
+
+class EmbeddingJob:
+    """Generates the embeddings of a set of cards, batch by batch, in order of id.
+
+    Each batch is the next batch_size cards with an id greater than the last
+    one's, so that saving embeddings never shifts the cards still to come, and
+    every batch costs one index range scan however far the job got, unlike an
+    OFFSET. A single pass therefore covers every card.
+
+    Each batch is saved and recorded in the checkpoint in one transaction, and
+    the job resumes after the last recorded card when run again with the same
+    run id. Cards whose embeddings could not be generated are counted as
+    failed and skipped, so they keep no embedding for a later run to pick
+    up, while the rest of their batch is saved. A lost connection fails the job, to be resumed.
+    """
+
+    STAGE = "embed"
+
+    def __init__(
+        self,
+        service: Optional[EmbeddingService] = None,
+        batch_size: Optional[int] = None,
+        run_id: Optional[str] = None,
+    ):
+        self.service = service or EmbeddingService()
+        self.batch_size = batch_size or self.service.page_size
+        self.checkpoint = Checkpoint(self.STAGE, run_id)
+
+    def _save_batch(self, cards: List[Card]) -> int:
+        """Save the embeddings of a batch of cards, and return the number of
+        cards whose embeddings failed, when only some of the requests did."""
+        failed: Set[str] = set()
+        try:
+            embeddings = self.service.embed_cards(cards)
+        except PartialEmbeddingError as e:
+            print(f"Failed to generate some embeddings: {e}")
+            embeddings, failed = e.embeddings, e.failed
+        saved = [card for card in cards if card.embedding_text_hash not in failed]
+        with transaction.atomic():
+            self.service.save_embeddings(saved, embeddings)
+            self.checkpoint.record(
+                cards[0].id, cards[-1].id, {"cards_processed": len(saved)}
+            )
+        return len(cards) - len(saved)
+
+    def run(
+        self, cards: Optional[QuerySet] = None, limit: Optional[int] = None
+    ) -> EmbeddingJobResult:
+        """Generate the embeddings of the cards, by default those without one,
+        at most limit of them if given."""
+        start_time = time.monotonic()
+        result = EmbeddingJobResult()
+        if cards is None:
+            cards = Card.objects.filter(embedding__isnull=True)
+        # the embeddings are written back from the cache, never read
+        cards = cards.defer("embedding").order_by("id")
+
+        last_id = 0
+        completed = self.checkpoint.completed()
+        if completed:
+            last_id = int(completed[-1].last_key)
+            result.resumed_cards = sum(
+                batch.result["cards_processed"] for batch in completed
+            )
+            result.cards_processed = result.resumed_cards
+            print(
+                f"Resuming run {self.checkpoint.run_id} after card {last_id} "
+                f"({result.resumed_cards} cards processed)..."
+            )
+
+        total = cards.filter(id__gt=last_id).count()
+        if limit is not None:
+            total = min(total, limit)
+        done = 0
+
+        while done < total:
+            batch = list(
+                cards.filter(id__gt=last_id)[: min(self.batch_size, total - done)]
+            )
+            if not batch:
+                break
+            last_id = batch[-1].id
+            done += len(batch)
+            result.batches += 1
+
+            batch_start = time.monotonic()
+            try:
+                failed = self._save_batch(batch)
+                result.cards_processed += len(batch) - failed
+                result.cards_failed += failed
+            except (InterfaceError, OperationalError):
+                raise
+            except Exception as e:
+                result.cards_failed += len(batch)
+                print(f"Failed to generate embeddings for {len(batch)} cards: {e}")
+                continue
+
+            elapsed = time.monotonic() - batch_start
+            print(
+                f"Batch {result.batches}: {len(batch)} cards in {elapsed:.2f}s "
+                f"({len(batch) / elapsed:.1f} cards/s), {done}/{total} cards"
+            )
+
+        self.checkpoint.clear()
+        result.processing_time = time.monotonic() - start_time
+        return result
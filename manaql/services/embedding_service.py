@@ -1,17 +1,109 @@
+import hashlib
 import os
-from typing import List
-import openai
+from typing import Dict, Iterable, Iterator, List, Optional, Set
 import time
 from database.models.card import Card
+from database.models.embedding_cache import EmbeddingCache
+from django.db import connection, transaction
+from django.db.models import QuerySet
 from common.color import Color
 
+from .copy_loader import CopyLoader
+from .embedding_backends import (
+    EmbeddingBackend,
+    EmbeddingStats,
+    HashingBackend,
+    OpenAIBackend,
+    PartialEmbeddingError,
+)
+
+# dimensions of the card.embedding and embedding_cache.embedding columns,
+# which every backend's embeddings have. They are fixed by the schema:
+# changing them takes a migration, and regenerating every embedding
+EMBEDDING_DIMENSIONS = Card._meta.get_field("embedding").dimensions
+EMBEDDING_BACKENDS = ("openai", "hashing")
+
+
+def text_hash(model: str, text: str) -> str:
+    """Hash a model and a text, the key of their EmbeddingCache."""
+    data = f"{model}\n{text}".encode()
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
 
 class EmbeddingService:
-    """Service for generating and managing card embeddings using OpenAI's text-embedding-3-small model."""
+    """Service for generating and managing card embeddings.
+
+    Embeddings are generated by a backend, OpenAI's text-embedding-3-small
+    model by default, see OpenAIBackend, or with EMBEDDING_BACKEND=hashing a
+    local hashing vectorizer, see HashingBackend, with the EMBEDDING_DIMENSIONS
+    of the embedding columns.
+    Embeddings are cached and written back in bulk, see save_embeddings.
+    Without the cache, every text is embedded again and its cached embedding
+    overwritten, e.g. to refresh embeddings generated by an older model.
+    """
+
+    staging_table = "embedding_staging"
+    backend: EmbeddingBackend
+
+    def __init__(
+        self,
+        max_batch_size: Optional[int] = None,
+        max_batch_tokens: Optional[int] = None,
+        max_concurrency: Optional[int] = None,
+        requests_per_minute: Optional[int] = None,
+        tokens_per_minute: Optional[int] = None,
+        backend: Optional[str] = None,
+    ):
+        backend = backend or os.getenv("EMBEDDING_BACKEND", "openai")
+        if backend == "openai":
+            self.with_openai_backend(
+                max_batch_size=max_batch_size,
+                max_batch_tokens=max_batch_tokens,
+                max_concurrency=max_concurrency,
+                requests_per_minute=requests_per_minute,
+                tokens_per_minute=tokens_per_minute,
+            )
+        elif backend == "hashing":
+            self.with_hashing_backend()
+        else:
+            raise ValueError(
+                f"Unknown embedding backend {backend}, "
+                f"expected one of {', '.join(EMBEDDING_BACKENDS)}"
+            )
+        self.use_cache = True
+        self.stats = EmbeddingStats()
+        self.loader = CopyLoader(
+            EmbeddingCache,
+            fields=("text_hash", "embedding"),
+            copy_format="binary",
+            db_table=self.staging_table,
+        )
+
+    def with_backend(self, backend: EmbeddingBackend) -> None:
+        if backend.dimensions != EMBEDDING_DIMENSIONS:
+            raise ValueError(
+                f"{backend.model} embeddings have {backend.dimensions} dimensions, "
+                f"but the embedding columns hold {EMBEDDING_DIMENSIONS}"
+            )
+        self.backend = backend
+
+    def with_cache(self, enabled: bool = True) -> None:
+        self.use_cache = enabled
+
+    def with_openai_backend(self, **kwargs) -> None:
+        self.with_backend(OpenAIBackend(EMBEDDING_DIMENSIONS, **kwargs))
 
-    def __init__(self):
-        self.client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-        self.model = "text-embedding-3-small"
+    def with_hashing_backend(self) -> None:
+        self.with_backend(HashingBackend(EMBEDDING_DIMENSIONS))
+
+    @property
+    def model(self) -> str:
+        return self.backend.model
+
+    @property
+    def page_size(self) -> int:
+        """Cards to embed per call to use the backend fully."""
+        return self.backend.page_size
 
     def generate_card_text(self, card: Card) -> str:
         """
@@ -53,13 +145,21 @@ class EmbeddingService:
 
         return " | ".join(text_parts)
 
-    def generate_embedding(self, text: str) -> List[float]:
-        """Generate an embedding for the given text using OpenAI's API."""
+    def generate_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """Generate the embeddings of the given texts, in order, with the backend."""
+        start_time = time.monotonic()
         try:
-            response = self.client.embeddings.create(model=self.model, input=text)
-            return response.data[0].embedding
+            return self.backend.embed(texts, self.stats)
+        except PartialEmbeddingError:
+            raise
         except Exception as e:
-            raise Exception(f"Failed to generate embedding: {str(e)}")
+            raise Exception(f"Failed to generate embeddings: {str(e)}")
+        finally:
+            self.stats.elapsed += time.monotonic() - start_time
+
+    def generate_embedding(self, text: str) -> List[float]:
+        """Generate an embedding for the given text using OpenAI's API."""
+        return self.generate_embeddings([text])[0]
 
     def generate_card_embedding(self, card: Card) -> List[float]:
         """Generate an embedding for a card."""
@@ -68,25 +168,152 @@ class EmbeddingService:
 
     def update_card_embedding(self, card: Card) -> None:
         """Update a card's embedding in the database."""
-        embedding = self.generate_card_embedding(card)
-        card.embedding = embedding
-        card.save(update_fields=["embedding"])
-        time.sleep(0.7)
+        self.update_card_embeddings([card])
+
+    def cached_hashes(self, text_hashes: Iterable[str]) -> Set[str]:
+        """The given text hashes whose embeddings are cached."""
+        return set(
+            EmbeddingCache.objects.filter(text_hash__in=list(text_hashes)).values_list(
+                "text_hash", flat=True
+            )
+        )
+
+    def save_embeddings(
+        self, cards: List[Card], embeddings: Dict[str, List[float]]
+    ) -> None:
+        """Cache the new embeddings, by text hash, and write every card's
+        embedding from the cache, in a few statements rather than one per card.
+
+        The new embeddings are copied into a temporary table, in pgvector's
+        binary format, and inserted into EmbeddingCache from there. Each card
+        is then updated from the cache entry of its embedding_text_hash, so
+        cached embeddings never travel through python.
+        """
+        quote_name = connection.ops.quote_name
+        cache_table = quote_name(EmbeddingCache._meta.db_table)
+        card_table = quote_name(Card._meta.db_table)
+        staging = quote_name(self.staging_table)
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            if embeddings:
+                cursor.execute(f"DROP TABLE IF EXISTS {staging}")
+                cursor.execute(
+                    f"CREATE TEMPORARY TABLE {staging} AS "
+                    f"SELECT text_hash, embedding FROM {cache_table} WITH NO DATA"
+                )
+                self.loader.load(embeddings.items())
+                # without the cache, the regenerated embeddings replace it
+                conflict = (
+                    "DO NOTHING"
+                    if self.use_cache
+                    else "DO UPDATE SET embedding = EXCLUDED.embedding, "
+                    "created_at = EXCLUDED.created_at"
+                )
+                cursor.execute(
+                    f"INSERT INTO {cache_table} "
+                    f"(text_hash, model, embedding, created_at) "
+                    f"SELECT text_hash, %s, embedding, now() FROM {staging} "
+                    f"ON CONFLICT (text_hash) {conflict}",
+                    [self.model],
+                )
+                cursor.execute(f"DROP TABLE {staging}")
+
+            cursor.execute(
+                f"UPDATE {card_table} c "
+                f"SET embedding = e.embedding, embedding_text_hash = e.text_hash "
+                f"FROM unnest(%s::integer[], %s::varchar[]) AS u(id, text_hash) "
+                f"JOIN {cache_table} e ON e.text_hash = u.text_hash "
+                f"WHERE c.id = u.id",
+                [
+                    [card.id for card in cards],
+                    [card.embedding_text_hash for card in cards],
+                ],
+            )
+
+    def embed_cards(self, cards: List[Card]) -> Dict[str, List[float]]:
+        """Set each card's embedding_text_hash, and generate the embeddings of
+        the card texts missing from EmbeddingCache, or of every card text
+        without the cache, in batched requests.
+
+        If only some of the requests failed, PartialEmbeddingError is raised
+        with the embeddings that were generated and the failed text hashes.
+
+        Returns:
+            dict: the generated embeddings, by text hash, for save_embeddings
+        """
+        texts: Dict[str, str] = {}
+        for card in cards:
+            text = self.generate_card_text(card)
+            card.embedding_text_hash = text_hash(self.model, text)
+            texts[card.embedding_text_hash] = text
+
+        cached = self.cached_hashes(texts) if self.use_cache else set()
+        self.stats.cached += sum(
+            1 for card in cards if card.embedding_text_hash in cached
+        )
+        missing = [hash for hash in texts if hash not in cached]
+        if not missing:
+            return {}
+        try:
+            generated = self.generate_embeddings([texts[hash] for hash in missing])
+        except PartialEmbeddingError as e:
+            raise PartialEmbeddingError(
+                {missing[i]: embedding for i, embedding in e.embeddings.items()},
+                {missing[i] for i in e.failed},
+                e.error,
+            )
+        return dict(zip(missing, generated))
+
+    def update_card_embeddings(self, cards: List[Card]) -> None:
+        """Update the embeddings of cards in the database.
+
+        The embeddings of card texts found in EmbeddingCache are reused, and
+        only the others are generated, in batched requests, and cached. Each
+        card records the hash of the text its embedding was generated from.
+        The cards are written in bulk by save_embeddings, and the embeddings
+        of the card objects are left as they were. If only some of the
+        requests failed, the embeddings that were generated are saved before
+        PartialEmbeddingError is raised.
+        """
+        try:
+            embeddings = self.embed_cards(cards)
+        except PartialEmbeddingError as e:
+            self.save_embeddings(
+                [card for card in cards if card.embedding_text_hash not in e.failed],
+                e.embeddings,
+            )
+            raise
+        self.save_embeddings(cards, embeddings)
+
+    def stale_cards(self, cards: Optional[QuerySet] = None) -> Iterator[Card]:
+        """The cards, among all by default, without an embedding or whose text
+        changed since their embedding was generated.
+
+        Cards embedded before their text hash was recorded are assumed to be
+        current, as merging clears the embeddings of the cards that changed.
+        """
+        if cards is None:
+            cards = Card.objects.all()
+        cards = cards.defer("embedding").order_by("id")
+
+        yield from cards.filter(embedding__isnull=True).iterator(chunk_size=1000)
+        for card in cards.filter(
+            embedding__isnull=False, embedding_text_hash__isnull=False
+        ).iterator(chunk_size=1000):
+            current = text_hash(self.model, self.generate_card_text(card))
+            if current != card.embedding_text_hash:
+                yield card
 
     def batch_update_embeddings(
-        self, cards: List[Card], batch_size: int = 10, rate_limit: int = 100
+        self, cards: List[Card], batch_size: Optional[int] = None
     ) -> None:
-        """Update embeddings for multiple cards in batches."""
-        # Calculate sleep time to stay within rate limit
-        seconds_per_minute = 60
-        sleep_time = seconds_per_minute / rate_limit  # seconds per request
+        """Update embeddings for multiple cards in batches of batch_size cards,
+        page_size by default. Requests are paced by the rate limiter."""
+        batch_size = batch_size or self.page_size
 
         for i in range(0, len(cards), batch_size):
             batch = cards[i : i + batch_size]
-            for card in batch:
-                try:
-                    self.update_card_embedding(card)
-                    # Rate limiting: sleep to stay within OpenAI's rate limit
-                    time.sleep(sleep_time)
-                except Exception as e:
-                    print(f"Failed to update embedding for card {card.name}: {str(e)}")
+            try:
+                self.update_card_embeddings(batch)
+            except Exception as e:
+                print(f"Failed to update embeddings for {len(batch)} cards: {str(e)}")
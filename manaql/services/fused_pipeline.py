@@ -0,0 +1,223 @@
+import os
+from contextlib import nullcontext
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Iterator, List, Set, Tuple
+
+from database.models.card import Card
+from database.models.printing import Printing
+from database.models.scryfall_card import ScryfallCard
+from django.db import transaction
+
+from .card_processor import PROCESSING_BATCH_SIZE, ProcessingResult
+from .merger import CardMerger, PrintingMerger
+from .scryfall_exporter import filterCard
+from .shadow_table import ShadowLoad
+
+
+@dataclass
+class FusedResult(ProcessingResult):
+    """Holds the results of a fused ingest and processing pass."""
+
+    filtered_count: int = 0
+    staged_count: int = 0
+
+    def __str__(self) -> str:
+        return (
+            f"{super().__str__()}\n"
+            f"Filtered: {self.filtered_count} cards\n"
+            f"Staged: {self.staged_count} scryfall cards"
+        )
+
+
+class FusedPipeline:
+    """Builds cards and printings straight from a stream of Scryfall cards.
+
+    Rather than writing the cards to scryfall_card and reading them back, each
+    card that passes filterCard is converted to an unsaved ScryfallCard, from
+    which Card and Printing are derived as by SequentialStrategy: the first
+    ScryfallCard of each name creates its card, and every ScryfallCard of a
+    created card a printing. Created cards are looked up in a map of name to
+    card id, so only that map and one batch of about batch_size cards are
+    held in memory. Each batch is saved in a transaction of its own.
+
+    By default, the tables are loaded into shadow tables that replace them
+    once loaded, so readers see the previous cards and printings until then.
+    When merging, cards are upserted on their name and printings on their set
+    and collector number instead, which keeps the ids of existing rows and the
+    embeddings of unchanged cards, and the rows missing from the stream are
+    deleted at the end. scryfall_card is only replaced with staging enabled,
+    e.g. for debugging or for the price-only updates that diff against it,
+    and is otherwise left alone.
+    """
+
+    def __init__(self, batch_size: int = PROCESSING_BATCH_SIZE):
+        self.batch_size = batch_size
+        self.staging = False
+        self.merge = os.getenv("CARD_MERGE_ENABLED") == "true"
+        self.card_ids: Dict[str, int] = {}
+        # names whose card could not be created, whose printings are skipped
+        self.failed_names: Set[str] = set()
+        # the set and collector number of every printing saved when merging
+        self.printing_keys: Set[Tuple[str, str]] = set()
+
+    def with_staging(self, enabled: bool = True) -> None:
+        self.staging = enabled
+
+    def with_merge(self, enabled: bool = True) -> None:
+        self.merge = enabled
+
+    def _save_cards(self, cards: List[Card], result: FusedResult) -> None:
+        if not self.merge:
+            Card.objects.bulk_create(cards, batch_size=self.batch_size)
+            self.card_ids.update((card.name, card.id) for card in cards)
+            result.cards_created += len(cards)
+            return
+
+        created, updated = CardMerger(batch_size=self.batch_size).merge(cards)
+        result.cards_created += created
+        result.cards_updated += updated
+        # an upsert returns nothing for unchanged cards, so their ids are read back
+        self.card_ids.update(
+            Card.objects.filter(name__in=[card.name for card in cards]).values_list(
+                "name", "id"
+            )
+        )
+
+    def _save_printings(self, printings: List[Printing], result: FusedResult) -> None:
+        if not self.merge:
+            Printing.objects.bulk_create(printings, batch_size=self.batch_size)
+            result.printings_created += len(printings)
+            return
+
+        created, updated = PrintingMerger(batch_size=self.batch_size).merge(printings)
+        result.printings_created += created
+        result.printings_updated += updated
+        self.printing_keys.update(
+            (printing.set_code, printing.collector_number) for printing in printings
+        )
+
+    def _save_batch(
+        self,
+        scryfall_cards: List[ScryfallCard],
+        cards: List[Card],
+        printings_data: List[ScryfallCard],
+        result: FusedResult,
+    ) -> None:
+        """Save the batch's cards, then the printings of the ScryfallCards in
+        printings_data, whose cards are all created by now."""
+        with transaction.atomic():
+            if self.staging and scryfall_cards:
+                ScryfallCard.objects.bulk_create(
+                    scryfall_cards, batch_size=self.batch_size
+                )
+                result.staged_count += len(scryfall_cards)
+
+            if cards:
+                self._save_cards(cards, result)
+
+            printings = [
+                Printing.from_scryfall_card(
+                    self.card_ids[scryfall_card.name], scryfall_card
+                )
+                for scryfall_card in printings_data
+            ]
+            if printings:
+                self._save_printings(printings, result)
+
+    def _load(self, cards: Iterator[Dict], result: FusedResult) -> None:
+        scryfall_cards: List[ScryfallCard] = []
+        new_cards: Dict[str, Card] = {}
+        printings_data: List[ScryfallCard] = []
+
+        for card in cards:
+            if filterCard(card):
+                result.filtered_count += 1
+                continue
+
+            try:
+                scryfall_card = ScryfallCard.from_scryfall_card(card)
+            except Exception as e:
+                print(f"Unable to convert {card.get('name')} due to exception: {e}")
+                result.failed_cards.append(card.get("name"))
+                continue
+            scryfall_cards.append(scryfall_card)
+
+            name = scryfall_card.name
+            if name in self.failed_names:
+                result.failed_cards.append(name)
+                continue
+            if name not in self.card_ids and name not in new_cards:
+                try:
+                    new_cards[name] = Card.from_scryfall_card(scryfall_card)
+                except Exception as e:
+                    print(f"Error creating card {name}: {e}")
+                    self.failed_names.add(name)
+                    result.failed_cards.append(name)
+                    continue
+            printings_data.append(scryfall_card)
+
+            if len(scryfall_cards) >= self.batch_size:
+                self._save_batch(
+                    scryfall_cards, list(new_cards.values()), printings_data, result
+                )
+                scryfall_cards, new_cards, printings_data = [], {}, []
+
+        self._save_batch(
+            scryfall_cards, list(new_cards.values()), printings_data, result
+        )
+
+    def _delete_vanished(self, result: FusedResult) -> None:
+        """Delete the printings and cards that were missing from the stream.
+
+        The rows of cards that failed to be created are kept, as when
+        processing keeps the cards of failed ScryfallCards.
+        """
+        printing_ids = [
+            id
+            for id, set_code, collector_number, name in Printing.objects.values_list(
+                "id", "set_code", "collector_number", "card__name"
+            )
+            if (set_code, collector_number) not in self.printing_keys
+            and name not in self.failed_names
+        ]
+        card_ids = [
+            id
+            for id, name in Card.objects.values_list("id", "name")
+            if name not in self.card_ids and name not in self.failed_names
+        ]
+        with transaction.atomic():
+            result.printings_deleted, _ = Printing.objects.filter(
+                id__in=printing_ids
+            ).delete()
+            _, deleted = Card.objects.filter(id__in=card_ids).delete()
+        result.cards_deleted = deleted.get(Card._meta.label, 0)
+
+    def process_cards(self, cards: Iterator[Dict]) -> FusedResult:
+        """Rebuild, or merge into, the card and printing tables in one pass."""
+        start_time = datetime.now()
+        result = FusedResult()
+        self.card_ids = {}
+        self.failed_names = set()
+        self.printing_keys = set()
+
+        print("Ingesting and processing cards in a single pass...")
+
+        # scryfall_card is only replaced when it is reloaded, so that it
+        # otherwise keeps the snapshot the next plain ingest diffs against
+        staged = [ScryfallCard] if self.staging else []
+        if self.merge:
+            # card and printing are left out, so they are written in place
+            with ShadowLoad(staged) if staged else nullcontext():
+                self._load(cards, result)
+            self._delete_vanished(result)
+        else:
+            with ShadowLoad(staged + [Card, Printing]):
+                self._load(cards, result)
+
+        print(
+            f"Created {result.cards_created} cards "
+            f"and {result.printings_created} printings"
+        )
+        result.processing_time = (datetime.now() - start_time).total_seconds()
+        return result
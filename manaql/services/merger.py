@@ -0,0 +1,138 @@
+from typing import List, Sequence
+
+from database.models.card import Card
+from database.models.printing import Printing
+from django.db import connection, models, transaction
+from psycopg2.extras import execute_values
+
+# columns read by EmbeddingService.generate_card_text: when any of them
+# changes, the stored embedding no longer matches the card and is cleared
+EMBEDDED_FIELDS = (
+    "name",
+    "main_type",
+    "type_line",
+    "mana_cost",
+    "cmc",
+    "colors",
+    "oracle_text",
+    "keywords",
+    "power",
+    "toughness",
+    "games",
+)
+
+
+class Merger:
+    """Upserts rows on a unique key with INSERT ... ON CONFLICT DO UPDATE.
+
+    New rows are inserted. Existing rows keep their id, and are only
+    rewritten if one of their columns changed.
+    """
+
+    model: type[models.Model]
+    unique_fields: Sequence[str]
+    # columns left out of the upsert, and thus untouched on existing rows
+    excluded_fields: Sequence[str] = ()
+
+    def __init__(self, batch_size: int = 500):
+        self.batch_size = batch_size
+        self.fields = [
+            f
+            for f in self.model._meta.concrete_fields
+            if not f.primary_key and f.name not in self.excluded_fields
+        ]
+
+    def _columns(self, fields: Sequence, prefix: str = "") -> str:
+        quote_name = connection.ops.quote_name
+        return ", ".join(f"{prefix}{quote_name(f.column)}" for f in fields)
+
+    def _updates(self) -> List[str]:
+        quote_name = connection.ops.quote_name
+        return [
+            f"{quote_name(f.column)} = EXCLUDED.{quote_name(f.column)}"
+            for f in self.fields
+            if f.name not in self.unique_fields
+        ]
+
+    def insert_sql(self) -> str:
+        """The INSERT INTO clause for self.fields, with the table aliased t."""
+        table = connection.ops.quote_name(self.model._meta.db_table)
+        return f"INSERT INTO {table} AS t ({self._columns(self.fields)})"
+
+    def conflict_sql(self) -> str:
+        """The ON CONFLICT clause that updates existing rows that changed."""
+        unique = [self.model._meta.get_field(name) for name in self.unique_fields]
+        return (
+            f"ON CONFLICT ({self._columns(unique)}) "
+            f"DO UPDATE SET {', '.join(self._updates())} "
+            f"WHERE ({self._columns(self.fields, 't.')}) "
+            f"IS DISTINCT FROM ({self._columns(self.fields, 'EXCLUDED.')})"
+        )
+
+    def merge_sql(self) -> str:
+        return (
+            f"{self.insert_sql()} VALUES %s {self.conflict_sql()} "
+            f"RETURNING (t.xmax = 0)"
+        )
+
+    def _values(self, obj: models.Model) -> tuple:
+        return tuple(
+            f.get_db_prep_save(getattr(obj, f.attname), connection) for f in self.fields
+        )
+
+    def merge(self, objs: List[models.Model]) -> tuple[int, int]:
+        """Upsert the rows, which must have distinct unique keys.
+
+        Returns:
+            tuple: (created, updated)
+        """
+        if not objs:
+            return 0, 0
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            # a row is returned for every insert or update, but not for an
+            # unchanged row; xmax is 0 for a newly inserted row
+            inserted = execute_values(
+                cursor.cursor,
+                self.merge_sql(),
+                [self._values(obj) for obj in objs],
+                page_size=self.batch_size,
+                fetch=True,
+            )
+        created = sum(1 for (is_insert,) in inserted if is_insert)
+        return created, len(inserted) - created
+
+
+class CardMerger(Merger):
+    """Upserts cards on their unique name.
+
+    The embedding of an existing card, and the hash of the text it was
+    generated from, are kept unless a column of that text changed, in which
+    case they are cleared so that the embedding job regenerates them.
+    """
+
+    model = Card
+    unique_fields = ("name",)
+    excluded_fields = ("embedding", "embedding_text_hash")
+
+    def _updates(self) -> List[str]:
+        quote_name = connection.ops.quote_name
+        embedded = [Card._meta.get_field(name) for name in EMBEDDED_FIELDS]
+        changed = (
+            f"({self._columns(embedded, 't.')}) "
+            f"IS DISTINCT FROM ({self._columns(embedded, 'EXCLUDED.')})"
+        )
+        updates = super()._updates()
+        for name in self.excluded_fields:
+            column = quote_name(Card._meta.get_field(name).column)
+            updates.append(
+                f"{column} = CASE WHEN {changed} THEN NULL ELSE t.{column} END"
+            )
+        return updates
+
+
+class PrintingMerger(Merger):
+    """Upserts printings on their set and collector number."""
+
+    model = Printing
+    unique_fields = ("set_code", "collector_number")
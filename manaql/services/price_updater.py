@@ -0,0 +1,149 @@
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Iterator, Optional
+
+from database.models.scryfall_card import ScryfallCard
+from django.db import connection, transaction
+
+from .copy_loader import CopyLoader
+from .printing_prices import update_printing_prices
+from .scryfall_exporter import filterCard
+
+# keys read from each card for a price update, and the ones read by filterCard
+PRICE_CARD_FIELDS = (
+    "id",
+    "lang",
+    "layout",
+    "games",
+    "set",
+    "collector_number",
+    "prices",
+)
+
+
+@dataclass
+class PriceResult:
+    """Holds the results of a price update."""
+
+    cards_read: int = 0
+    filtered_count: int = 0
+    printings_updated: int = 0
+    scryfall_cards_updated: int = 0
+    # cards added, removed or changed in more than their prices, if checked
+    content_changes: Optional[int] = None
+    applied: bool = False
+    processing_time: float = 0.0  # in seconds
+
+    def __str__(self) -> str:
+        lines = [
+            "Price Update Results:",
+            f"Cards read: {self.cards_read}",
+            f"Filtered: {self.filtered_count} cards",
+            f"Printings updated: {self.printings_updated}",
+            f"Scryfall cards updated: {self.scryfall_cards_updated}",
+        ]
+        if self.content_changes is not None:
+            lines.append(f"Content changes: {self.content_changes} cards")
+        if not self.applied:
+            lines.append("Prices were not applied")
+        lines.append(f"Processing time: {self.processing_time:.2f} seconds")
+        return "\n".join(lines)
+
+
+class PriceUpdater:
+    """Updates prices from Scryfall cards without rebuilding cards or printings.
+
+    The Scryfall id, set, collector number and prices of each card are copied
+    into a temporary table, from which a single UPDATE ... FROM sets the price
+    columns of every printing whose prices changed, and another the prices of
+    the matching ScryfallCards. Cards, their ids and embeddings are untouched.
+
+    With check_content, the content hash of each card is copied as well, and
+    the prices are only applied if no card was added, removed or changed in
+    more than its prices, i.e. if updating prices brings every table up to date.
+    This needs the full cards rather than just PRICE_CARD_FIELDS.
+    """
+
+    price_table = "scryfall_card_price"
+    fields = ("scryfall_id", "set_code", "collector_number", "prices", "content_hash")
+
+    def __init__(self, check_content: bool = False, copy_format: str = "text"):
+        self.check_content = check_content
+        self.loader = CopyLoader(
+            ScryfallCard,
+            fields=self.fields,
+            copy_format=copy_format,
+            db_table=self.price_table,
+        )
+
+    def _values(self, card: Dict) -> Dict:
+        if self.check_content:
+            return ScryfallCard.values_from_scryfall_card(card)
+        return dict(
+            scryfall_id=card.get("id", None),
+            set_code=card.get("set", None),
+            collector_number=card.get("collector_number", None),
+            prices=card.get("prices", None),
+        )
+
+    def _rows(self, cards: Iterator[Dict], result: PriceResult) -> Iterator[tuple]:
+        for card in cards:
+            result.cards_read += 1
+            if filterCard(card):
+                result.filtered_count += 1
+                continue
+            yield self.loader.row(self._values(card))
+
+    def _count_content_changes(self, cursor) -> int:
+        quote_name = connection.ops.quote_name
+        table = quote_name(ScryfallCard._meta.db_table)
+        prices = quote_name(self.price_table)
+        cursor.execute(
+            f"SELECT (SELECT count(*) FROM {prices} t "
+            f"LEFT JOIN {table} s ON s.scryfall_id = t.scryfall_id "
+            f"WHERE s.content_hash IS DISTINCT FROM t.content_hash) + "
+            f"(SELECT count(*) FROM {table} s WHERE s.scryfall_id IS NULL "
+            f"OR NOT EXISTS (SELECT 1 FROM {prices} t WHERE t.scryfall_id = s.scryfall_id))"
+        )
+        return cursor.fetchone()[0]
+
+    def update(self, cards: Iterator[Dict]) -> PriceResult:
+        start_time = datetime.now()
+        result = PriceResult()
+        quote_name = connection.ops.quote_name
+        table = quote_name(ScryfallCard._meta.db_table)
+        prices = quote_name(self.price_table)
+        columns = ", ".join(quote_name(f.column) for f in self.loader.fields)
+
+        print("Loading prices...")
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {prices}")
+            cursor.execute(
+                f"CREATE TEMPORARY TABLE {prices} AS "
+                f"SELECT {columns} FROM {table} WITH NO DATA"
+            )
+            self.loader.load(self._rows(cards, result))
+            # temporary tables are never analyzed automatically
+            cursor.execute(f"ANALYZE {prices}")
+
+            if self.check_content:
+                result.content_changes = self._count_content_changes(cursor)
+
+            if not result.content_changes:
+                print("Updating prices...")
+                result.printings_updated = update_printing_prices(
+                    cursor, self.price_table
+                )
+                cursor.execute(
+                    f"UPDATE {table} s SET prices = t.prices FROM {prices} t "
+                    f"WHERE s.scryfall_id = t.scryfall_id "
+                    f"AND s.prices IS DISTINCT FROM t.prices"
+                )
+                result.scryfall_cards_updated = cursor.rowcount
+                result.applied = True
+
+            cursor.execute(f"DROP TABLE {prices}")
+
+        result.processing_time = (datetime.now() - start_time).total_seconds()
+        print(result)
+        return result
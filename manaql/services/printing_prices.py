@@ -0,0 +1,54 @@
+from typing import Dict, List
+
+from database.models.printing import Printing
+from django.db import connection
+
+# Printing price columns, by the Scryfall prices key each one is read from
+PRINTING_PRICES = {
+    "price_usd": "usd",
+    "price_usd_foil": "usd_foil",
+    "price_usd_etched": "usd_etched",
+    "price_eur": "eur",
+    "price_eur_foil": "eur_foil",
+    "price_eur_etched": None,  # computed in the API, as in Printing.from_scryfall_card
+}
+
+
+def price_sql(alias: str) -> Dict[str, str]:
+    """SQL expressions of the Printing price fields, read from alias.prices."""
+    return {
+        field_name: (
+            "NULL::numeric"
+            if key is None
+            else f"NULLIF({alias}.prices ->> '{key}', '')::numeric"
+        )
+        for field_name, key in PRINTING_PRICES.items()
+    }
+
+
+def update_printing_prices(cursor, source_table: str) -> int:
+    """Set the prices of printings from a table of ScryfallCard columns.
+
+    Printings are matched on set and collector number, and only the ones whose
+    prices changed are written. Returns the number of printings updated.
+    """
+    quote_name = connection.ops.quote_name
+    printing = quote_name(Printing._meta.db_table)
+    set_column = quote_name(Printing._meta.get_field("set_code").column)
+
+    columns: List[str] = []
+    values: List[str] = []
+    for field_name, value in price_sql("t").items():
+        columns.append(quote_name(Printing._meta.get_field(field_name).column))
+        values.append(value)
+
+    assignments = ", ".join(f"{c} = {v}" for c, v in zip(columns, values))
+    current = ", ".join(f"p.{c}" for c in columns)
+    cursor.execute(
+        f"UPDATE {printing} p SET {assignments} "
+        f"FROM {quote_name(source_table)} t "
+        f"WHERE p.{set_column} = t.set_code "
+        f"AND p.collector_number = t.collector_number "
+        f"AND ({current}) IS DISTINCT FROM ({', '.join(values)})"
+    )
+    return cursor.rowcount
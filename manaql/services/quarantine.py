@@ -0,0 +1,83 @@
+import json
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple, TypeVar
+
+import psycopg2
+from django.db import DataError, IntegrityError, transaction
+
+T = TypeVar("T")
+
+# errors the database raises for the rows themselves, which bisecting
+# isolates. COPY raises psycopg2's own errors, as django does not wrap
+# copy_expert. Rows that can't be built or encoded are failed by the caller
+# before they are inserted
+DATA_ERRORS = (DataError, IntegrityError, psycopg2.DataError, psycopg2.IntegrityError)
+
+
+class Quarantine:
+    """Appends the raw records that could not be loaded to an NDJSON file.
+
+    Each line is a JSON object with the time of the failure, its error and the
+    record as it was read, so that bad records can be inspected and fixed
+    without re-ingesting everything. The file is only created once a record
+    fails, and is shared by the threads of a strategy.
+    """
+
+    def __init__(self, file_path: Path | str):
+        self.file_path = Path(file_path)
+        self._lock = threading.Lock()
+
+    def add(self, record: Dict, error: Exception) -> None:
+        line = json.dumps(
+            {
+                "failed_at": datetime.now(timezone.utc).isoformat(),
+                "error": f"{type(error).__name__}: {error}".strip(),
+                "record": record,
+            },
+            default=str,
+        )
+        with self._lock, open(self.file_path, "a") as f:
+            f.write(line + "\n")
+
+
+def _bisect(
+    records: List[Dict], rows: List[T], insert: Callable[[List[T]], object]
+) -> Tuple[int, List[Tuple[Dict, Exception]]]:
+    try:
+        with transaction.atomic():
+            insert(rows)
+        return len(rows), []
+    except DATA_ERRORS as e:
+        if len(rows) == 1:
+            return 0, [(records[0], e)]
+
+    middle = len(rows) // 2
+    inserted, failed = _bisect(records[:middle], rows[:middle], insert)
+    more_inserted, more_failed = _bisect(records[middle:], rows[middle:], insert)
+    return inserted + more_inserted, failed + more_failed
+
+
+def insert_bisecting(
+    records: List[Dict], rows: List[T], insert: Callable[[List[T]], object]
+) -> Tuple[int, List[Tuple[Dict, Exception]]]:
+    """Insert the rows built from the records in one transaction.
+
+    If that fails, each half of the rows is inserted in turn, recursively, until
+    the failing rows are isolated: the other rows are committed, at the cost of
+    about 2 * log2(len(rows)) extra inserts per failing row. Only DATA_ERRORS
+    are blamed on the rows: any other error, such as a lost connection, is
+    raised, for the caller to reconnect and retry rather than quarantine rows
+    that were never at fault. So is the error of a batch whose every row
+    fails, which points at the table or the code rather than the rows.
+
+    Returns:
+        tuple: (inserted count, [(record, error) for each failing row])
+    """
+    if not rows:
+        return 0, []
+    inserted, failed = _bisect(records, rows, insert)
+    if len(rows) > 1 and not inserted:
+        raise failed[0][1]
+    return inserted, failed
@@ -0,0 +1,81 @@
+import asyncio
+import time
+from typing import Optional
+
+
+class TokenBucket:
+    """Paces an asyncio workload to a rate per minute.
+
+    The bucket holds up to burst tokens, a second's worth by default, and
+    refills continuously with the rest of rate_per_minute, so that no minute
+    acquires more than rate_per_minute. An acquire larger than the bucket
+    waits for it to be full, then leaves it in debt, so that later acquires
+    wait for the debt to be repaid.
+    """
+
+    def __init__(self, rate_per_minute: float, burst: Optional[float] = None):
+        if rate_per_minute <= 0:
+            raise ValueError(f"rate_per_minute must be positive, not {rate_per_minute}")
+        self.capacity = burst or rate_per_minute / 60
+        # the bucket refills with what the burst leaves of the minute's quota
+        if self.capacity >= rate_per_minute:
+            raise ValueError(
+                f"burst must be less than rate_per_minute, {rate_per_minute}, "
+                f"not {self.capacity}"
+            )
+        self.rate = (rate_per_minute - self.capacity) / 60  # per second
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self.updated_at) * self.rate
+        )
+        self.updated_at = now
+
+    def delay(self, amount: float) -> float:
+        """Seconds until amount can be acquired, 0 if it can be now."""
+        self._refill()
+        missing = min(amount, self.capacity) - self.tokens
+        return max(0.0, missing / self.rate)
+
+    def take(self, amount: float) -> None:
+        self._refill()
+        self.tokens -= amount
+
+
+class RateLimiter:
+    """Paces requests to both a requests per minute and a tokens per minute
+    quota, and pauses every request while the server asks to back off."""
+
+    def __init__(self, requests_per_minute: float, tokens_per_minute: float):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.paused_until = 0.0
+        self._lock: Optional[asyncio.Lock] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    async def acquire(self, tokens: int) -> None:
+        """Wait until a request of the given tokens fits in both quotas."""
+        # a lock is bound to the loop it is used in, and each run has its own
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._lock, self._loop = asyncio.Lock(), loop
+        # requests acquire one at a time, in order, so none starves
+        async with self._lock:
+            while True:
+                delay = max(
+                    self.paused_until - time.monotonic(),
+                    self.requests.delay(1),
+                    self.tokens.delay(tokens),
+                )
+                if delay <= 0:
+                    break
+                await asyncio.sleep(delay)
+            self.requests.take(1)
+            self.tokens.take(tokens)
+
+    def pause(self, seconds: float) -> None:
+        """Hold every request back for the given seconds, e.g. on a 429."""
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
@@ -1,14 +1,18 @@
 import gzip
 import os
-import tempfile
 from contextlib import contextmanager
 from pathlib import Path
-from typing import Dict, Iterator
+from typing import Dict, Iterator, Optional, Tuple
 from urllib.parse import urlparse
 
-import ijson
 import requests
-from tqdm import tqdm
+from common.bulk_data import BulkData
+
+from .artifact_cache import ArtifactCache
+from .artifact_writer import ArtifactManifest, open_artifact
+from .card_parser import CARD_FIELDS, CardParser
+from .downloader import DownloadResult, RangedDownloader
+from .streaming import READ_SIZE, PrefetchReader
 
 
 class ScryfallService:
@@ -16,6 +20,8 @@ class ScryfallService:
 
     BULK_DATA_URL = "https://api.scryfall.com/bulk-data"
 
+    BULK_DATA_TYPE = "default_cards"
+
     def __init__(self, app_name: str, app_version: str):
         self.session = requests.Session()
         self.session.headers.update(
@@ -23,77 +29,215 @@ class ScryfallService:
                 "User-Agent": f"{app_name}/{app_version}",
             }
         )
+        self.cache = ArtifactCache(self.BULK_DATA_TYPE)
+        self.downloader = RangedDownloader(
+            self.session, connections=int(os.getenv("DOWNLOAD_CONNECTIONS", "4"))
+        )
+        self._bulk_data: Optional[BulkData] = None
+
+    def get_bulk_data(self) -> BulkData:
+        """Get the metadata of the latest bulk data, fetched once per service."""
+        if self._bulk_data is not None:
+            return self._bulk_data
 
-    def _get_bulk_data_url(self) -> tuple[str, int]:
-        """Get the download URL and size for the latest bulk data."""
         response = self.session.get(self.BULK_DATA_URL)
         response.raise_for_status()
 
         for item in response.json()["data"]:
-            if item["type"] == "default_cards":
-                return item["download_uri"], item["size"]
+            if item["type"] == self.BULK_DATA_TYPE:
+                self._bulk_data = BulkData.from_scryfall_bulk_data(item)
+                return self._bulk_data
 
         raise ValueError("Could not find default cards bulk data")
 
-    def _download_file(self, url: str, local_path: Path, expected_size: int) -> None:
-        """Download a file in chunks while showing progress."""
-        head_response = self.session.head(url)
-        actual_size = int(head_response.headers.get("Content-Length", expected_size))
-
-        response = self.session.get(url, stream=True)
-        response.raise_for_status()
-
+    def _get_bulk_data_url(self) -> tuple[str, int]:
+        """Get the download URL and size for the latest bulk data."""
+        bulk_data = self.get_bulk_data()
+        return bulk_data.download_uri, bulk_data.size
+
+    def _download_file(
+        self,
+        url: str,
+        local_path: Path,
+        expected_size: int,
+        headers: Optional[Dict[str, str]] = None,
+    ) -> Optional[DownloadResult]:
+        """Download a file over several ranged connections, resuming a partial download.
+
+        Returns None if the server answered 304 Not Modified to the conditional
+        headers.
+        """
         print("Downloading Scryfall bulk data")
+        result = self.downloader.download(url, local_path, expected_size, headers)
+        if result is not None:
+            print(
+                f"Downloaded {result.size} bytes in {result.download_time:.2f}s "
+                f"({result.throughput / 1024 / 1024:.2f} MiB/s, "
+                f"{result.resumed_bytes} bytes resumed)"
+            )
+        return result
+
+    def download_bulk_data(self) -> Path:
+        """Download the latest bulk data into the artifact cache.
+
+        The download is skipped when the cached file is from the same snapshot
+        (same updated_at), or when the server confirms it is unchanged.
+        """
+        bulk_data = self.get_bulk_data()
+        if self.cache.is_current(bulk_data):
+            print(f"Using cached Scryfall bulk data from {bulk_data.updated_at}")
+            return self.cache.get_file_path()
+
+        file_name = os.path.basename(urlparse(bulk_data.download_uri).path)
+        local_path = self.cache.path_for(file_name)
+        partial_path = local_path.with_name(f"{local_path.name}.part")
+
+        # an interrupted download leaves the partial file behind to be resumed
+        result = self._download_file(
+            bulk_data.download_uri,
+            partial_path,
+            bulk_data.size,
+            headers=self.cache.conditional_headers(),
+        )
 
-        with tqdm(total=actual_size, unit="B", unit_scale=True) as pbar:
-            with open(local_path, "wb") as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    if chunk:
-                        f.write(chunk)
-                        pbar.update(len(chunk))
-
-    def _create_card_iterator(self, file_path: Path) -> Iterator[Dict]:
-        """Create an iterator over card objects from a file."""
+        if result is None:
+            print("Scryfall bulk data not modified, using cached file")
+            cached_path = self.cache.get_file_path()
+            self.cache.store(bulk_data, cached_path.name)
+            return cached_path
+
+        os.replace(partial_path, local_path)
+        bulk_data.etag = result.etag
+        bulk_data.last_modified = result.last_modified
+        self.cache.store(bulk_data, file_name)
+        return local_path
+
+    def _create_card_iterator(
+        self, file_path: Path, fields: Tuple[str, ...] = CARD_FIELDS
+    ) -> Iterator[Dict]:
+        """Create an iterator over card objects from a file.
+
+        The file may be a JSON array or NDJSON, either plain or compressed with
+        gzip/zstd. Artifacts with a checksum manifest are verified first.
+        """
         print(f"Opening file for parsing: {file_path}")
 
-        def generate_cards():
-            if file_path.name.endswith(".gz"):
-                file_obj = gzip.open(file_path, "rb")
-            else:
-                file_obj = open(file_path, "rb")
+        manifest = ArtifactManifest.load(file_path)
+        if manifest is not None and not manifest.verify(file_path):
+            raise ValueError(f"{file_path} does not match its checksum manifest")
 
+        def generate_cards():
+            file_obj = open_artifact(file_path)
             try:
-                cards = ijson.items(file_obj, "item")
-                count = 0
-                for card in cards:
-                    count += 1
-                    yield card
+                yield from CardParser(fields).parse_file(file_obj)
             finally:
                 file_obj.close()
 
         return generate_cards()
 
     @contextmanager
-    def stream_all_cards(self) -> Iterator[Dict]:
-        """Stream and parse Scryfall bulk data with minimal memory usage."""
-        temp_dir = tempfile.TemporaryDirectory()
-        try:
-            download_url, expected_size = self._get_bulk_data_url()
-
-            filename = os.path.basename(urlparse(download_url).path)
-            local_path = Path(temp_dir.name) / filename
+    def _stream_bulk_data(
+        self, bulk_data: BulkData, tee: bool, fields: Tuple[str, ...] = CARD_FIELDS
+    ) -> Iterator[Dict]:
+        """Parse cards straight from the HTTP response body while it downloads.
+
+        The body is read ahead on a background thread, decoded on the fly
+        (Content-Encoding, or a .gz file) and fed to ijson, so cards are yielded
+        while bytes are still arriving. With tee, the body is also written to
+        the artifact cache, and kept only if the whole stream was consumed.
+        """
+        file_name = os.path.basename(urlparse(bulk_data.download_uri).path)
+        local_path = self.cache.path_for(file_name)
+        partial_path = local_path.with_name(f"{local_path.name}.stream")
+
+        response = self.session.get(bulk_data.download_uri, stream=True)
+        response.raise_for_status()
+        response.raw.decode_content = True
 
-            self._download_file(download_url, local_path, expected_size)
+        print("Streaming Scryfall bulk data")
+        tee_file = open(partial_path, "wb") if tee else None
+        reader = PrefetchReader(response.raw, tee=tee_file, total=bulk_data.size)
+        source = gzip.GzipFile(fileobj=reader) if file_name.endswith(".gz") else reader
+        completed = False
 
-            yield self._create_card_iterator(local_path)
+        def generate_cards():
+            nonlocal completed
+            yield from CardParser(fields).parse(source)
+            # drain trailing bytes so the tee holds the whole file
+            while reader.read(READ_SIZE):
+                pass
+            completed = True
 
+        try:
+            yield generate_cards()
         finally:
-            temp_dir.cleanup()
-
-    def download_all_cards(self) -> list:
-        """Legacy method that downloads all cards into memory."""
-        cards = []
-        with self.stream_all_cards() as card_stream:
-            for card in card_stream:
-                cards.append(card)
-        return cards
+            response.close()
+            reader.close()
+            if tee_file is not None:
+                tee_file.close()
+                if completed:
+                    os.replace(partial_path, local_path)
+                    bulk_data.etag = response.headers.get("ETag")
+                    bulk_data.last_modified = response.headers.get("Last-Modified")
+                    self.cache.store(bulk_data, file_name)
+                else:
+                    partial_path.unlink(missing_ok=True)
+
+    def iter_bulk_data_bytes(self, read_size: int = READ_SIZE) -> Iterator[bytes]:
+        """Yield the raw (uncompressed) bytes of the latest bulk data.
+
+        The bytes come from the artifact cache if it holds the latest snapshot,
+        otherwise straight from the response body.
+        """
+        bulk_data = self.get_bulk_data()
+        if self.cache.is_current(bulk_data):
+            print(f"Using cached Scryfall bulk data from {bulk_data.updated_at}")
+            with open_artifact(self.cache.get_file_path()) as f:
+                while chunk := f.read(read_size):
+                    yield chunk
+            return
+
+        print("Streaming Scryfall bulk data")
+        with self.session.get(bulk_data.download_uri, stream=True) as response:
+            response.raise_for_status()
+            yield from response.iter_content(chunk_size=read_size)
+
+    @contextmanager
+    def stream_all_cards(
+        self,
+        streaming: Optional[bool] = None,
+        tee: bool = True,
+        file_path: Optional[Path] = None,
+        fields: Tuple[str, ...] = CARD_FIELDS,
+    ) -> Iterator[Dict]:
+        """Stream and parse Scryfall bulk data with minimal memory usage.
+
+        By default the bulk data is downloaded to the artifact cache before it
+        is parsed. With streaming (or STREAMING_DOWNLOAD_ENABLED=true), cards are
+        parsed from the response body as it arrives instead, unless the cache
+        already holds the latest snapshot. With file_path, cards are parsed from
+        that local file (e.g. an artifact from `manage.py download`) instead.
+        Cards only hold the given fields.
+        """
+        if file_path is not None:
+            yield self._create_card_iterator(Path(file_path), fields)
+            return
+
+        if streaming is None:
+            streaming = os.getenv("STREAMING_DOWNLOAD_ENABLED") == "true"
+
+        bulk_data = self.get_bulk_data()
+        if streaming and not self.cache.is_current(bulk_data):
+            with self._stream_bulk_data(bulk_data, tee, fields) as cards:
+                yield cards
+        else:
+            local_path = self.download_bulk_data()
+            yield self._create_card_iterator(local_path, fields)
+
+    def is_ingested(self) -> bool:
+        """Whether the latest bulk data has already been ingested."""
+        return self.cache.is_ingested(self.get_bulk_data())
+
+    def mark_ingested(self) -> None:
+        """Record the latest bulk data as ingested."""
+        self.cache.mark_ingested(self.get_bulk_data())
@@ -1,15 +1,23 @@
-import gc
 import multiprocessing as mp
 import os
+import queue
+import threading
 from abc import ABC, abstractmethod
-from concurrent.futures import ProcessPoolExecutor, as_completed
 from dataclasses import dataclass, field
 from datetime import datetime
-from typing import Dict, Iterator, List, Optional, Tuple
+from typing import Callable, Dict, Iterator, List, Optional, Set, Tuple
 
 from common.scryfall import AllowedLayout
 from database.models.scryfall_card import ScryfallCard
-from django.db import connections, transaction
+from django.db import connection, connections, transaction
+
+from .copy_loader import CopyLoader
+from .printing_prices import update_printing_prices
+from .quarantine import Quarantine, insert_bisecting
+from .shadow_table import ShadowLoad
+
+# artifact the cards that fail to load are appended to
+QUARANTINE_FILE = "scryfall_card_quarantine.ndjson"
 
 
 def filterCard(scryfall_card: Dict) -> bool:
@@ -45,6 +53,8 @@ class ProcessingResult:
     filtered_count: int = 0
     failed_cards: List[Dict] = field(default_factory=list)
     processing_time: float = 0.0  # in seconds
+    # names of the cards an incremental ingest changed, None when any may have
+    changed_names: Optional[Set[str]] = None
 
     def __str__(self) -> str:
         return (
@@ -56,11 +66,71 @@ class ProcessingResult:
         )
 
 
+@dataclass
+class DeltaResult(ProcessingResult):
+    """Holds the results of an incremental ingest."""
+
+    inserted_count: int = 0
+    updated_count: int = 0
+    repriced_count: int = 0
+    deleted_count: int = 0
+    unchanged_count: int = 0
+
+    def __str__(self) -> str:
+        return (
+            f"{super().__str__()}\n"
+            f"Inserted: {self.inserted_count} cards\n"
+            f"Updated: {self.updated_count} cards\n"
+            f"Repriced: {self.repriced_count} cards\n"
+            f"Deleted: {self.deleted_count} cards\n"
+            f"Unchanged: {self.unchanged_count} cards"
+        )
+
+
+def _build_card(card: Dict) -> ScryfallCard:
+    """Build a card's ScryfallCard, preparing its values for the database as
+    bulk_create will, so that a value that can't be prepared fails its card."""
+    card_object = ScryfallCard.from_scryfall_card(card)
+    for model_field in ScryfallCard._meta.concrete_fields:
+        model_field.get_db_prep_save(
+            getattr(card_object, model_field.attname), connection
+        )
+    return card_object
+
+
+def _bulk_create(card_objects: List[ScryfallCard]) -> None:
+    ScryfallCard.objects.bulk_create(card_objects, batch_size=len(card_objects))
+
+
 class ProcessingStrategy(ABC):
     """Abstract base class for card processing strategies."""
 
+    # whether process() updates the existing rows instead of expecting an empty table
+    incremental = False
+
     def __init__(self, batch_size: int = 1000):
         self.batch_size = batch_size
+        # where the cards that fail to load are written, if anywhere
+        self.quarantine: Optional[Quarantine] = None
+
+    def _build(
+        self, card: Dict, build: Callable[[Dict], object], result: ProcessingResult
+    ) -> Optional[object]:
+        """Build the row of a card, failing the card if it is malformed."""
+        try:
+            return build(card)
+        except Exception as e:
+            self._fail(result, [(card, e)])
+            return None
+
+    def _fail(
+        self, result: ProcessingResult, failures: List[Tuple[Dict, Exception]]
+    ) -> None:
+        for card, error in failures:
+            print(f"Unable to insert {card.get('name', '')} due to exception: {error}")
+            result.failed_cards.append(card)
+            if self.quarantine is not None:
+                self.quarantine.add(card, error)
 
     @abstractmethod
     def process(self, cards: List[Dict]) -> ProcessingResult:
@@ -78,47 +148,31 @@ class SequentialStrategy(ProcessingStrategy):
 
         print("Starting sequential processing...")
 
-        if isinstance(cards, Iterator):
-            cards_list = list(cards)
-        else:
-            cards_list = cards
-
-        print(f"Processing {len(cards_list)} scryfall cards")
-
+        # consume the cards lazily, so that a streaming iterator is inserted
+        # while the rest of the bulk data is still being downloaded
         batch_size = 500
+        batch = []
         card_objects = []
 
-        for card in cards_list:
+        for card in cards:
             total_processed += 1
 
             if filterCard(card):
                 result.filtered_count += 1
                 continue
 
-            card_objects.append(ScryfallCard.from_scryfall_card(card))
+            card_object = self._build(card, _build_card, result)
+            if card_object is None:
+                continue
+            batch.append(card)
+            card_objects.append(card_object)
 
             if len(card_objects) >= batch_size:
-                try:
-                    with transaction.atomic():
-                        ScryfallCard.objects.bulk_create(
-                            card_objects, batch_size=batch_size
-                        )
-                    result.success_count += len(card_objects)
-                except Exception as e:
-                    print(f"Error processing batch: {e}")
-                    # continue with next batch instead of failing completely
-                finally:
-                    card_objects = []
+                self._save_batch(batch, card_objects, result)
+                batch, card_objects = [], []
 
         if card_objects:
-            try:
-                with transaction.atomic():
-                    ScryfallCard.objects.bulk_create(
-                        card_objects, batch_size=batch_size
-                    )
-                result.success_count += len(card_objects)
-            except Exception as e:
-                print(f"Error processing final batch: {e}")
+            self._save_batch(batch, card_objects, result)
 
         print(f"Total cards processed: {total_processed}")
         print(f"Success: {result.success_count}")
@@ -127,78 +181,374 @@ class SequentialStrategy(ProcessingStrategy):
         result.processing_time = (datetime.now() - start_time).total_seconds()
         return result
 
+    def _save_batch(
+        self,
+        batch: List[Dict],
+        card_objects: List[ScryfallCard],
+        result: ProcessingResult,
+    ) -> None:
+        # a failing batch is bisected, so that only its bad cards are lost
+        success, failed = insert_bisecting(batch, card_objects, _bulk_create)
+        result.success_count += success
+        self._fail(result, failed)
 
-class ParallelStrategy(ProcessingStrategy):
-    """Memory-optimized parallel processing strategy."""
 
-    def __init__(self, batch_size: int = 1000, max_workers: Optional[int] = None):
+class ParallelStrategy(ProcessingStrategy):
+    """Streaming producer/consumer strategy with a bounded queue of batches.
+
+    The calling thread reads cards from the (possibly streaming) iterator into
+    batches and puts them on a bounded queue, while worker threads, each with
+    its own database connection, take batches off the queue and insert them.
+    A full queue blocks the reader, so at most O(max_workers * batch_size)
+    cards are in memory, however large the bulk data is.
+    Bad cards are quarantined, but any other error, such as a lost
+    connection, stops the reader and is raised once the workers are done.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = 1000,
+        max_workers: Optional[int] = None,
+        queue_size: Optional[int] = None,
+    ):
         super().__init__(batch_size)
         self.max_workers = min(max_workers or mp.cpu_count(), 4)
+        self.queue_size = queue_size or self.max_workers * 2
         print(f"Initializing ParallelStrategy with {self.max_workers} workers")
 
     @staticmethod
-    def _process_batch(batch: List[Dict]) -> Tuple[int, int, List[Dict]]:
-        """Process a batch of cards in a separate process with proper cleanup"""
-        connections.close_all()
-        success = filtered = 0
-        failed: List[Dict] = []
+    def _process_batch(
+        batch: List[Dict],
+    ) -> Tuple[int, int, List[Tuple[Dict, Exception]]]:
+        """Filter and insert a batch of cards in a single transaction, which
+        is bisected if it fails so that only its bad cards are lost."""
+        filtered = 0
+        failed: List[Tuple[Dict, Exception]] = []
+
+        cards = []
+        card_objects = []
+        for card in batch:
+            if filterCard(card):
+                filtered += 1
+                continue
+            try:
+                card_objects.append(_build_card(card))
+                cards.append(card)
+            except Exception as e:
+                failed.append((card, e))
+
+        success, insert_failed = insert_bisecting(cards, card_objects, _bulk_create)
+        return success, filtered, failed + insert_failed
+
+    def _worker(
+        self,
+        batches: queue.Queue,
+        result: ProcessingResult,
+        lock: threading.Lock,
+        errors: List[Exception],
+    ) -> None:
+        try:
+            while True:
+                batch = batches.get()
+                if batch is None:
+                    return
+                if errors:
+                    continue  # drain the queue, so that the reader never blocks
+                try:
+                    success, filtered, failed = self._process_batch(batch)
+                except Exception as e:
+                    # e.g. a lost connection, which is not the cards' fault
+                    print(f"Worker failed to process batch: {e}")
+                    with lock:
+                        errors.append(e)
+                    continue
+                with lock:
+                    result.success_count += success
+                    result.filtered_count += filtered
+                    self._fail(result, failed)
+        finally:
+            # each thread has its own connection, don't leak it
+            connections.close_all()
 
+    def process(self, cards: Iterator[Dict] | List[Dict]) -> ProcessingResult:
+        """Process cards from either an iterator or a list."""
+        start_time = datetime.now()
+        result = ProcessingResult()
+        lock = threading.Lock()
+        errors: List[Exception] = []
+        batches: queue.Queue = queue.Queue(maxsize=self.queue_size)
+
+        workers = [
+            threading.Thread(target=self._worker, args=(batches, result, lock, errors))
+            for _ in range(self.max_workers)
+        ]
+        for worker in workers:
+            worker.start()
+
+        batch_count = 0
         try:
-            with transaction.atomic():
-                card_objects = []
-                for card in batch:
-                    if filterCard(card):
-                        filtered += 1
-                        continue
-                    card_objects.append(ScryfallCard.from_scryfall_card(card))
-
-                if card_objects:
-                    ScryfallCard.objects.bulk_create(card_objects, batch_size=1000)
-                success = len(card_objects)
-        except Exception as e:
-            print(f"Batch processing failed: {e}")
-            raise
+            batch = []
+            for card in cards:
+                if errors:
+                    break
+                batch.append(card)
+                if len(batch) >= self.batch_size:
+                    batches.put(batch)  # blocks while the workers catch up
+                    batch_count += 1
+                    batch = []
+            if batch:
+                batches.put(batch)
+                batch_count += 1
         finally:
-            del card_objects
-            gc.collect()
+            for _ in workers:
+                batches.put(None)
+            for worker in workers:
+                worker.join()
+
+        if errors:
+            raise errors[0]
+        print(f"Processed {batch_count} batches")
+        result.processing_time = (datetime.now() - start_time).total_seconds()
+        return result
+
 
-        return success, filtered, failed
+class CopyStrategy(ProcessingStrategy):
+    """Stream cards into the table with PostgreSQL COPY instead of INSERTs."""
+
+    def __init__(self, batch_size: int = 10000, copy_format: str = "text"):
+        super().__init__(batch_size)
+        self.loader = CopyLoader(ScryfallCard, copy_format=copy_format)
+
+    def _row(self, card: Dict) -> bytes:
+        # encoded up front, so that a value that can't be encoded fails its card
+        values = ScryfallCard.values_from_scryfall_card(card)
+        return self.loader.encode_row(self.loader.row(values))
+
+    def _copy_batch(
+        self, batch: List[Dict], rows: List[bytes], result: ProcessingResult
+    ) -> None:
+        # a failing batch is bisected, so that only its bad cards are lost
+        success, failed = insert_bisecting(batch, rows, self.loader.load_encoded)
+        result.success_count += success
+        self._fail(result, failed)
 
     def process(self, cards: Iterator[Dict] | List[Dict]) -> ProcessingResult:
-        """Process cards from either an iterator or a list."""
         start_time = datetime.now()
         result = ProcessingResult()
+        total_processed = 0
 
-        # Convert iterator to list if needed
-        if isinstance(cards, Iterator):
-            cards_list = list(cards)
-        else:
-            cards_list = cards
+        print(f"Starting COPY ({self.loader.copy_format}) processing...")
 
-        print(f"Processing {len(cards_list)} scryfall cards")
+        batch = []
+        rows = []
+        for card in cards:
+            total_processed += 1
 
-        with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
-            batches = [
-                cards_list[i : i + self.batch_size]
-                for i in range(0, len(cards_list), self.batch_size)
-            ]
+            if filterCard(card):
+                result.filtered_count += 1
+                continue
 
-            print(f"Created {len(batches)} batches")
-            futures = []
+            row = self._build(card, self._row, result)
+            if row is None:
+                continue
+            batch.append(card)
+            rows.append(row)
+            if len(rows) >= self.batch_size:
+                self._copy_batch(batch, rows, result)
+                batch, rows = [], []
 
-            for batch in batches:
-                futures.append(executor.submit(self._process_batch, batch))
+        if rows:
+            self._copy_batch(batch, rows, result)
 
-            for future in as_completed(futures):
-                try:
-                    success, filtered, failed = future.result()
-                    result.success_count += success
-                    result.filtered_count += filtered
-                    result.failed_cards.extend(failed)
-                except Exception as e:
-                    print(f"Future processing failed: {e}")
-                finally:
-                    del future
+        print(f"Total cards processed: {total_processed}")
+        print(f"Success: {result.success_count}")
+        print(f"Filtered: {result.filtered_count}")
+
+        result.processing_time = (datetime.now() - start_time).total_seconds()
+        return result
+
+
+class DeltaStrategy(ProcessingStrategy):
+    """Apply only the difference between the cards and the scryfall_card table.
+
+    Cards are keyed by their Scryfall id, and compared by content hash and
+    prices against the stored snapshot, which is held in memory as a map of id
+    to hash, name and prices. Only new and changed cards are copied into a
+    temporary table, then a single transaction deletes the cards that are
+    gone, updates the changed ones and inserts the new ones, so writes scale
+    with the size of the change rather than the size of the catalogue.
+
+    Cards whose prices are all that changed are repriced: their printings'
+    prices are updated in place, and their names are not reported as changed.
+
+    The changed cards are copied in batches, each bisected if it fails, so
+    that a malformed card is quarantined rather than failing the ingest. As
+    its Scryfall id was seen, its stored version, if any, is kept.
+    """
+
+    incremental = True
+    delta_table = "scryfall_card_delta"
+
+    def __init__(self, batch_size: int = 10000, copy_format: str = "text"):
+        super().__init__(batch_size)
+        self.loader = CopyLoader(
+            ScryfallCard, copy_format=copy_format, db_table=self.delta_table
+        )
+
+    def _load_snapshot(self) -> Dict[str, Tuple[str, str, Optional[Dict]]]:
+        """Map the Scryfall id of every stored card to its content hash, name and prices."""
+        rows = (
+            ScryfallCard.objects.filter(scryfall_id__isnull=False)
+            .values_list("scryfall_id", "content_hash", "name", "prices")
+            .iterator(chunk_size=self.batch_size)
+        )
+        return {str(scryfall_id): tuple(values) for scryfall_id, *values in rows}
+
+    def _changes(
+        self,
+        cards: Iterator[Dict] | List[Dict],
+        snapshot: Dict[str, Tuple[str, str, Optional[Dict]]],
+        seen: Set[str],
+        result: DeltaResult,
+    ) -> Iterator[Tuple[Dict, bytes, str]]:
+        """The new and changed cards, with their rows and whether they are
+        inserted, updated or repriced, which is counted once they are loaded."""
+        for card in cards:
+            if filterCard(card):
+                result.filtered_count += 1
+                continue
+
+            values = self._build(card, ScryfallCard.values_from_scryfall_card, result)
+            if values is None:
+                continue
+            scryfall_id = values["scryfall_id"]
+            if scryfall_id is None or scryfall_id in seen:
+                self._fail(
+                    result,
+                    [(card, ValueError("Unable to diff without a unique Scryfall id"))],
+                )
+                continue
+            seen.add(scryfall_id)
+
+            previous = snapshot.get(scryfall_id)
+            if previous is None:
+                change = "inserted"
+            elif previous[0] == values["content_hash"]:
+                if previous[2] == values["prices"]:
+                    result.unchanged_count += 1
+                    continue
+                change = "repriced"
+            else:
+                change = "updated"
+
+            # encoded up front, so that a value that can't be encoded fails its card
+            row = self._build(
+                card, lambda _: self.loader.encode_row(self.loader.row(values)), result
+            )
+            if row is None:
+                continue
+            if change != "repriced":
+                result.changed_names.add(values["name"])
+                if change == "updated":
+                    result.changed_names.add(previous[1])
+            yield card, row, change
+
+    def _copy_batch(
+        self, changes: List[Tuple[Dict, bytes, str]], result: DeltaResult
+    ) -> None:
+        # a failing batch is bisected, so that only its bad cards are lost
+        cards = [card for card, _, _ in changes]
+        _, failed = insert_bisecting(
+            cards, [row for _, row, _ in changes], self.loader.load_encoded
+        )
+        failed_cards = {id(card) for card, _ in failed}
+        for card, _, change in changes:
+            if id(card) not in failed_cards:
+                count = f"{change}_count"
+                setattr(result, count, getattr(result, count) + 1)
+        self._fail(result, failed)
+
+    def _apply_delta(self, cursor, deleted_ids: List[str]) -> None:
+        quote_name = connection.ops.quote_name
+        table = quote_name(ScryfallCard._meta.db_table)
+        delta = quote_name(self.delta_table)
+        key = quote_name(ScryfallCard._meta.get_field("scryfall_id").column)
+        columns = [quote_name(f.column) for f in self.loader.fields]
+
+        # cards stored before they were keyed by Scryfall id can't be diffed
+        cursor.execute(
+            f"DELETE FROM {table} WHERE {key} = ANY(%s::uuid[]) OR {key} IS NULL",
+            [deleted_ids],
+        )
+        cursor.execute(
+            f"UPDATE {table} SET "
+            + ", ".join(f"{column} = d.{column}" for column in columns)
+            + f" FROM {delta} d WHERE {table}.{key} = d.{key}"
+        )
+        cursor.execute(
+            f"INSERT INTO {table} ({', '.join(columns)}) "
+            f"SELECT {', '.join(columns)} FROM {delta} d "
+            f"WHERE NOT EXISTS (SELECT 1 FROM {table} t WHERE t.{key} = d.{key})"
+        )
+        # printings of changed cards are rebuilt, but repriced ones are kept
+        update_printing_prices(cursor, self.delta_table)
+
+    def process(self, cards: Iterator[Dict] | List[Dict]) -> DeltaResult:
+        start_time = datetime.now()
+        result = DeltaResult(changed_names=set())
+        seen: Set[str] = set()
+
+        print("Loading previous snapshot...")
+        snapshot = self._load_snapshot()
+        unkeyed_names = set(
+            ScryfallCard.objects.filter(scryfall_id__isnull=True)
+            .values_list("name", flat=True)
+            .distinct()
+        )
+        print(f"Diffing cards against {len(snapshot)} stored cards...")
+
+        quote_name = connection.ops.quote_name
+        delta = quote_name(self.delta_table)
+        columns = ", ".join(quote_name(f.column) for f in self.loader.fields)
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {delta}")
+            cursor.execute(
+                f"CREATE TEMPORARY TABLE {delta} AS SELECT {columns} "
+                f"FROM {quote_name(ScryfallCard._meta.db_table)} WITH NO DATA"
+            )
+            changes = []
+            for change in self._changes(cards, snapshot, seen, result):
+                changes.append(change)
+                if len(changes) >= self.batch_size:
+                    self._copy_batch(changes, result)
+                    changes = []
+            self._copy_batch(changes, result)
+
+            deleted_ids = [
+                scryfall_id for scryfall_id in snapshot if scryfall_id not in seen
+            ]
+            result.deleted_count = len(deleted_ids)
+            result.changed_names.update(
+                snapshot[scryfall_id][1] for scryfall_id in deleted_ids
+            )
+            result.changed_names.update(unkeyed_names)
+
+            self._apply_delta(cursor, deleted_ids)
+            cursor.execute(f"DROP TABLE {delta}")
+
+        result.success_count = (
+            result.inserted_count + result.updated_count + result.repriced_count
+        )
+        if not snapshot:
+            # nothing to diff against, so every card is new
+            result.changed_names = None
+
+        print(f"Inserted: {result.inserted_count}")
+        print(f"Updated: {result.updated_count}")
+        print(f"Repriced: {result.repriced_count}")
+        print(f"Deleted: {result.deleted_count}")
+        print(f"Unchanged: {result.unchanged_count}")
+        print(f"Filtered: {result.filtered_count}")
 
         result.processing_time = (datetime.now() - start_time).total_seconds()
         return result
@@ -211,13 +561,32 @@ class ScryfallExporter:
     strategy: ProcessingStrategy
 
     def __init__(self):
-        if os.getenv("PARALLEL_PROCESSING_ENABLED") == "true":
+        if os.getenv("INCREMENTAL_INGEST_ENABLED") == "true":
+            self.with_delta_strategy(os.getenv("COPY_FORMAT", "text"))
+        elif os.getenv("COPY_PROCESSING_ENABLED") == "true":
+            self.with_copy_strategy(os.getenv("COPY_FORMAT", "text"))
+        elif os.getenv("PARALLEL_PROCESSING_ENABLED") == "true":
             self.with_parallel_strategy()
         else:
             self.with_sequential_strategy()
+        self.shadow_load = os.getenv("SHADOW_LOAD_ENABLED") == "true"
+        self.quarantine: Optional[Quarantine] = None
 
     def process_cards(self, cards: List[Dict]) -> ProcessingResult:
-        """Process cards using the specified strategy."""
+        """Process cards using the specified strategy.
+
+        With shadow loading, cards are loaded into a shadow table that replaces
+        scryfall_card once loaded, instead of clearing scryfall_card first.
+        Incremental strategies update scryfall_card in place.
+        """
+        self.strategy.quarantine = self.quarantine
+        if self.strategy.incremental:
+            return self.strategy.process(cards)
+
+        if self.shadow_load:
+            with ShadowLoad([ScryfallCard]):
+                return self.strategy.process(cards)
+
         self._clear_database_once()
         return self.strategy.process(cards)
 
@@ -227,6 +596,19 @@ class ScryfallExporter:
     def with_parallel_strategy(self) -> None:
         self.strategy = ParallelStrategy()
 
+    def with_copy_strategy(self, copy_format: str = "text") -> None:
+        self.strategy = CopyStrategy(copy_format=copy_format)
+
+    def with_delta_strategy(self, copy_format: str = "text") -> None:
+        self.strategy = DeltaStrategy(copy_format=copy_format)
+
+    def with_shadow_load(self, enabled: bool = True) -> None:
+        self.shadow_load = enabled
+
+    def with_quarantine(self, file_path: str) -> None:
+        """Write the cards that fail to load to an NDJSON file."""
+        self.quarantine = Quarantine(file_path)
+
     @classmethod
     def _clear_database_once(cls) -> None:
         """Clear the database only on the first execution."""
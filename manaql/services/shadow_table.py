@@ -0,0 +1,235 @@
+from typing import List, Optional, Tuple
+
+from django.db import connection, models, transaction
+from django.db.backends.signals import connection_created
+
+STAGING_SCHEMA = "ingest_staging"
+RETIRED_SCHEMA = "ingest_retired"
+
+# how long the swap waits on readers of the live tables before giving up
+SWAP_LOCK_TIMEOUT = "10s"
+
+# check, primary key, unique and exclusion constraints; foreign keys are added
+# once every shadow table has its primary key
+TABLE_CONSTRAINT_TYPES = ("c", "p", "u", "x")
+
+
+class ShadowLoad:
+    """Rebuilds tables in UNLOGGED shadow copies and swaps them in atomically.
+
+    On enter, an empty UNLOGGED copy of each model's table (columns, defaults
+    and identities, but no indexes or constraints) is created in
+    STAGING_SCHEMA, which is put first on the search_path of every database
+    connection, so the ORM and COPY load into the shadow tables unchanged.
+
+    On a clean exit, the indexes and constraints of the live tables are
+    recreated with their original names, the shadow tables are switched to
+    LOGGED, and in one short transaction the live tables are moved out of the
+    way and dropped while the shadow tables are moved into their place.
+    Readers keep seeing the previous data until that transaction commits.
+
+    With keep=False, the shadow tables are dropped on exit instead, leaving
+    the live tables untouched, e.g. to benchmark a load.
+
+    Models must be ordered so that referenced tables come first.
+    """
+
+    def __init__(self, models: List[type[models.Model]], keep: bool = True):
+        self.models = models
+        self.keep = keep
+        self.tables = [model._meta.db_table for model in models]
+        self.schema: Optional[str] = None
+        self._search_path: Optional[str] = None
+        self._foreign_keys: List[Tuple[str, str, str]] = []
+
+    def _qualified(self, schema: str, table: str) -> str:
+        quote_name = connection.ops.quote_name
+        return f"{quote_name(schema)}.{quote_name(table)}"
+
+    def _staging(self, table: str) -> str:
+        return self._qualified(STAGING_SCHEMA, table)
+
+    def _live(self, table: str) -> str:
+        return self._qualified(self.schema, table)
+
+    def prepare(self) -> None:
+        """Create empty UNLOGGED shadow tables in STAGING_SCHEMA."""
+        quote_name = connection.ops.quote_name
+        print(f"Creating shadow tables for {', '.join(self.tables)}...")
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute("SELECT current_schema()")
+            self.schema = cursor.fetchone()[0]
+
+            # leftovers of a run that failed before its swap
+            cursor.execute(
+                f"DROP SCHEMA IF EXISTS {quote_name(STAGING_SCHEMA)} CASCADE"
+            )
+            cursor.execute(f"CREATE SCHEMA {quote_name(STAGING_SCHEMA)}")
+            cursor.execute(f"CREATE SCHEMA IF NOT EXISTS {quote_name(RETIRED_SCHEMA)}")
+
+            for table in self.tables:
+                cursor.execute(
+                    f"CREATE UNLOGGED TABLE {self._staging(table)} "
+                    f"(LIKE {self._live(table)} INCLUDING DEFAULTS INCLUDING IDENTITY "
+                    f"INCLUDING GENERATED INCLUDING STORAGE)"
+                )
+                self._sync_identities(cursor, table)
+
+            # rendered while the live tables are still first on the search_path,
+            # so that references to them resolve to the shadow tables later on
+            self._foreign_keys = []
+            for table in self.tables:
+                cursor.execute(
+                    "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+                    "WHERE conrelid = %s::regclass AND contype = 'f' ORDER BY conname",
+                    [self._live(table)],
+                )
+                self._foreign_keys.extend(
+                    (table, name, definition) for name, definition in cursor.fetchall()
+                )
+
+    def _sync_identities(self, cursor, table: str) -> None:
+        """Continue the shadow table's identity sequences from the live ones.
+
+        LIKE ... INCLUDING IDENTITY creates new sequences starting from scratch,
+        which would hand out ids that previously belonged to other rows.
+        """
+        cursor.execute(
+            "SELECT attname FROM pg_attribute WHERE attrelid = %s::regclass "
+            "AND attidentity <> '' AND NOT attisdropped",
+            [self._live(table)],
+        )
+        for (column,) in cursor.fetchall():
+            cursor.execute(
+                "SELECT pg_get_serial_sequence(%s, %s), pg_get_serial_sequence(%s, %s)",
+                [self._live(table), column, self._staging(table), column],
+            )
+            live_sequence, staging_sequence = cursor.fetchone()
+            cursor.execute(
+                f"SELECT setval(%s, last_value, is_called) FROM {live_sequence}",
+                [staging_sequence],
+            )
+
+    def _set_search_path(self, sender, connection, **kwargs) -> None:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SET search_path TO {connection.ops.quote_name(STAGING_SCHEMA)}, "
+                f"{self._search_path}"
+            )
+
+    def redirect(self) -> None:
+        """Put STAGING_SCHEMA first on the search_path of current and new connections."""
+        with connection.cursor() as cursor:
+            cursor.execute("SHOW search_path")
+            self._search_path = cursor.fetchone()[0]
+        # connections opened by worker threads, or after a retry, are redirected too
+        connection_created.connect(self._set_search_path)
+        self._set_search_path(None, connection)
+
+    def restore(self) -> None:
+        """Undo redirect()."""
+        connection_created.disconnect(self._set_search_path)
+        if self._search_path is not None:
+            with connection.cursor() as cursor:
+                cursor.execute(f"SET search_path TO {self._search_path}")
+        self._search_path = None
+
+    def finalize(self) -> None:
+        """Index the loaded shadow tables, then switch them to LOGGED."""
+        print("Creating indexes on shadow tables...")
+        with connection.cursor() as cursor:
+            for table in self.tables:
+                self._copy_indexes(cursor, table)
+
+            with transaction.atomic():
+                for table, name, definition in self._foreign_keys:
+                    cursor.execute(
+                        f"ALTER TABLE {self._staging(table)} "
+                        f"ADD CONSTRAINT {connection.ops.quote_name(name)} {definition}"
+                    )
+
+            # referenced tables first, as a logged table can't reference an unlogged one
+            for table in self.tables:
+                cursor.execute(f"ALTER TABLE {self._staging(table)} SET LOGGED")
+                cursor.execute(f"ANALYZE {self._staging(table)}")
+
+    def _copy_indexes(self, cursor, table: str) -> None:
+        """Recreate the live table's indexes and their constraints on the shadow table."""
+        cursor.execute(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+            "WHERE conrelid = %s::regclass AND contype IN %s ORDER BY contype, conname",
+            [self._live(table), TABLE_CONSTRAINT_TYPES],
+        )
+        for name, definition in cursor.fetchall():
+            cursor.execute(
+                f"ALTER TABLE {self._staging(table)} "
+                f"ADD CONSTRAINT {connection.ops.quote_name(name)} {definition}"
+            )
+
+        # pg_get_indexdef always schema-qualifies the table, so point it at the shadow
+        cursor.execute(
+            "SELECT replace(pg_get_indexdef(i.indexrelid), "
+            "' ON ' || quote_ident(%s) || '.' || quote_ident(%s) || ' ', "
+            "' ON ' || quote_ident(%s) || '.' || quote_ident(%s) || ' ') "
+            "FROM pg_index i WHERE i.indrelid = %s::regclass AND NOT EXISTS ("
+            "SELECT 1 FROM pg_constraint c "
+            "WHERE c.conindid = i.indexrelid AND c.conrelid = i.indrelid) "
+            "ORDER BY i.indexrelid",
+            [self.schema, table, STAGING_SCHEMA, table, self._live(table)],
+        )
+        for (definition,) in cursor.fetchall():
+            cursor.execute(definition)
+
+    def swap(self) -> None:
+        """Replace the live tables with the shadow tables in one transaction."""
+        print(f"Swapping in shadow tables for {', '.join(self.tables)}...")
+        quote_name = connection.ops.quote_name
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f"SET LOCAL lock_timeout = '{SWAP_LOCK_TIMEOUT}'")
+            for table in self.tables:
+                cursor.execute(
+                    f"ALTER TABLE {self._live(table)} SET SCHEMA {quote_name(RETIRED_SCHEMA)}"
+                )
+                cursor.execute(
+                    f"ALTER TABLE {self._staging(table)} SET SCHEMA {quote_name(self.schema)}"
+                )
+            retired = ", ".join(
+                self._qualified(RETIRED_SCHEMA, table)
+                for table in reversed(self.tables)
+            )
+            # fails, and so undoes the swap, if anything else still depends on them
+            cursor.execute(f"DROP TABLE {retired}")
+            cursor.execute(f"DROP SCHEMA {quote_name(STAGING_SCHEMA)}")
+
+    def discard(self) -> None:
+        """Drop the shadow tables, leaving the live tables untouched."""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"DROP SCHEMA IF EXISTS {connection.ops.quote_name(STAGING_SCHEMA)} CASCADE"
+            )
+
+    def __enter__(self) -> "ShadowLoad":
+        self.prepare()
+        self.redirect()
+        return self
+
+    def _cleanup(self) -> None:
+        try:
+            self.restore()
+            self.discard()
+        except Exception as e:
+            print(f"Unable to drop shadow tables: {e}")
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is not None or not self.keep:
+            self._cleanup()
+            return
+
+        try:
+            # still redirected, so foreign keys reference the other shadow tables
+            self.finalize()
+            self.restore()
+            self.swap()
+        except Exception:
+            self._cleanup()
+            raise
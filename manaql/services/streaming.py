@@ -0,0 +1,97 @@
+import io
+import queue
+import threading
+from typing import BinaryIO, Optional
+
+from tqdm import tqdm
+
+READ_SIZE = 1024 * 1024  # 1 MiB
+MAX_BUFFERED_CHUNKS = 16
+
+
+class PrefetchReader(io.RawIOBase):
+    """Read-only file object that pulls a byte stream on a background thread.
+
+    The background thread keeps reading from the source (typically an HTTP
+    response body) into a bounded queue while the consumer parses what has
+    already arrived, so network I/O overlaps with parsing and inserting.
+    Every chunk can optionally be copied to a tee file as it is read.
+    """
+
+    def __init__(
+        self,
+        source: BinaryIO,
+        read_size: int = READ_SIZE,
+        max_chunks: int = MAX_BUFFERED_CHUNKS,
+        tee: Optional[BinaryIO] = None,
+        total: Optional[int] = None,
+    ):
+        super().__init__()
+        self.source = source
+        self.read_size = read_size
+        self.tee = tee
+        self.bytes_read = 0
+        self.eof = False
+
+        self._queue: queue.Queue = queue.Queue(maxsize=max_chunks)
+        self._stopped = threading.Event()
+        self._buffer = b""
+        self._pbar = tqdm(total=total, unit="B", unit_scale=True)
+        self._thread = threading.Thread(target=self._fill, daemon=True)
+        self._thread.start()
+
+    def _put(self, item) -> bool:
+        while not self._stopped.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _fill(self) -> None:
+        try:
+            while not self._stopped.is_set():
+                chunk = self.source.read(self.read_size)
+                if not chunk:
+                    break
+                if self.tee is not None:
+                    self.tee.write(chunk)
+                self._pbar.update(len(chunk))
+                if not self._put(chunk):
+                    return
+            self._put(b"")
+        except BaseException as e:
+            self._put(e)
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        if not self._buffer and not self.eof:
+            item = self._queue.get()
+            if isinstance(item, BaseException):
+                raise item
+            if not item:
+                self.eof = True
+            # a view, so that consuming it below never copies the rest
+            self._buffer = memoryview(item)
+
+        n = min(len(b), len(self._buffer))
+        b[:n] = self._buffer[:n]
+        self._buffer = self._buffer[n:]
+        self.bytes_read += n
+        return n
+
+    def close(self) -> None:
+        if not self.closed:
+            self._stopped.set()
+            # unblock the background thread if it is waiting on a full queue
+            while not self._queue.empty():
+                try:
+                    self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            self._thread.join()
+            self._pbar.close()
+        super().close()
@@ -0,0 +1,140 @@
+import json
+from decimal import Decimal
+import os
+import tempfile
+from pathlib import Path
+from unittest.mock import patch
+
+from database.models.batch_progress import BatchProgress
+from database.models.card import Card
+from database.models.printing import Printing
+from database.models.run_log import RunLog
+from django.core.management import call_command
+from django.test import TestCase
+from services.card_processor import CardProcessor
+from services.embedding_job import EmbeddingJob
+from services.price_updater import PriceUpdater
+from services.scryfall_exporter import ScryfallExporter
+
+from .test_fused_pipeline import CARDS as FUSED_CARDS
+
+# incremental ingests key cards by their Scryfall id
+CARDS = [
+    {**card, "id": f"00000000-0000-0000-0000-{i:012d}"}
+    for i, card in enumerate(FUSED_CARDS)
+]
+
+
+class TestAllCommand(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.file_path = Path(self.tmp.name) / "cards.json"
+        with open(self.file_path, "w") as f:
+            json.dump(CARDS, f)
+
+        # embed locally, without reaching OpenAI
+        environ = patch.dict(os.environ, {"EMBEDDING_BACKEND": "hashing"})
+        environ.start()
+        self.addCleanup(environ.stop)
+
+    def _call(self, *args):
+        # each run of the command is a new process, which clears the tables again
+        ScryfallExporter._db_cleared = False
+        CardProcessor._db_cleared = False
+        with open(os.devnull, "w") as devnull:
+            call_command("all", *args, file_path=str(self.file_path), stdout=devnull)
+
+    def _assert_logged(self, *messages):
+        logged = list(RunLog.objects.order_by("id").values_list("message", flat=True))
+        for message in messages:
+            self.assertTrue(
+                any(log.startswith(message) for log in logged),
+                f"{message!r} not in {logged}",
+            )
+
+    def test_fused_should_build_and_embed_every_card(self):
+        self._call("--fused")
+
+        self.assertEqual(Card.objects.count(), 3)
+        self.assertEqual(Printing.objects.count(), 6)
+        self.assertFalse(Card.objects.filter(embedding__isnull=True).exists())
+        self._assert_logged("Ingestion complete.", "Command finished.")
+
+    def _write(self, cards):
+        with open(self.file_path, "w") as f:
+            json.dump(cards, f)
+
+    def _repriced(self):
+        return [{**card, "prices": {**card["prices"], "usd": "9.99"}} for card in CARDS]
+
+    def _changed(self):
+        return [
+            {**card, "oracle_text": "Changed."} if card["name"] == "Opt" else card
+            for card in CARDS
+        ]
+
+    def test_should_resume_the_embeddings_of_the_given_run(self):
+        with patch(
+            "ingest.management.commands.all.EmbeddingJob", wraps=EmbeddingJob
+        ) as job:
+            self._call("--fused", "--run-id", "resumed")
+
+        self.assertEqual(job.call_args.kwargs["run_id"], "resumed")
+        self.assertFalse(Card.objects.filter(embedding__isnull=True).exists())
+        self.assertFalse(BatchProgress.objects.exists())
+
+    def test_should_only_reprice_when_no_card_changed_beyond_its_prices(self):
+        self._call()
+        card_ids = set(Card.objects.values_list("id", flat=True))
+
+        self._write(self._repriced())
+        self._call()
+
+        self.assertEqual(set(Card.objects.values_list("id", flat=True)), card_ids)
+        self.assertEqual(
+            set(Printing.objects.values_list("price_usd", flat=True)), {Decimal("9.99")}
+        )
+        self._assert_logged("Only prices changed, skipped ingestion.")
+
+    def test_should_ingest_content_changes_with_the_configured_strategy(self):
+        self._call()
+
+        self._write(self._changed())
+        with patch.object(
+            ScryfallExporter, "with_delta_strategy"
+        ) as with_delta_strategy:
+            self._call()
+
+        with_delta_strategy.assert_not_called()
+        self.assertEqual(Card.objects.get(name="Opt").oracle_text, "Changed.")
+        self.assertEqual(Printing.objects.count(), 6)
+        self._assert_logged("Ingestion complete.")
+
+    @patch.dict(os.environ, {"INCREMENTAL_INGEST_ENABLED": "true"})
+    def test_incremental_should_reprice_in_the_same_pass(self):
+        self._call()
+        card_ids = set(Card.objects.values_list("id", flat=True))
+
+        self._write(self._repriced())
+        with patch.object(PriceUpdater, "update") as update:
+            self._call()
+
+        update.assert_not_called()
+        self.assertEqual(set(Card.objects.values_list("id", flat=True)), card_ids)
+        self.assertEqual(
+            set(Printing.objects.values_list("price_usd", flat=True)), {Decimal("9.99")}
+        )
+        self._assert_logged("No cards changed beyond their prices")
+
+    @patch.dict(os.environ, {"INCREMENTAL_INGEST_ENABLED": "true"})
+    def test_incremental_should_rebuild_only_the_changed_cards(self):
+        self._call()
+        forest_id = Card.objects.get(name="Forest").id
+
+        self._write(self._changed())
+        self._call()
+
+        self.assertEqual(Card.objects.get(name="Forest").id, forest_id)
+        self.assertEqual(Card.objects.get(name="Opt").oracle_text, "Changed.")
+        self.assertEqual(Printing.objects.count(), 6)
@@ -0,0 +1,101 @@
+import tempfile
+from pathlib import Path
+from unittest.mock import patch
+
+from common.bulk_data import BulkData
+from django.test import TestCase
+from services.artifact_cache import ArtifactCache
+
+
+def make_bulk_data(updated_at: str) -> BulkData:
+    return BulkData.from_scryfall_bulk_data(
+        {
+            "object": "bulk_data",
+            "id": "e2ef41e3-5778-4bc2-af3f-78eca4dd9c23",
+            "type": "default_cards",
+            "updated_at": updated_at,
+            "uri": "https://api.scryfall.com/bulk-data/e2ef41e3-5778-4bc2-af3f-78eca4dd9c23",
+            "name": "Default Cards",
+            "description": "A JSON file containing every card object on Scryfall in English or the printed language if the card is only available in one language.",
+            "size": 512,
+            "download_uri": "https://data.scryfall.io/default-cards/default-cards-20241128100723.json",
+            "content_type": "application/json",
+            "content_encoding": "gzip",
+        }
+    )
+
+
+class TestArtifactCache(TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        artifacts_dir = Path(self.temp_dir.name)
+        patcher = patch(
+            "services.artifact_cache.get_artifact_file_path",
+            lambda file_name: artifacts_dir / file_name,
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.temp_dir.cleanup)
+        self.cache = ArtifactCache()
+
+    def _store(self, bulk_data: BulkData, file_name: str) -> Path:
+        path = self.cache.path_for(file_name)
+        path.write_text("[]")
+        self.cache.store(bulk_data, file_name)
+        return path
+
+    def test_bulk_data_ignores_unknown_keys(self):
+        bulk_data = make_bulk_data("2024-11-28T10:07:23.000+00:00")
+        self.assertEqual(bulk_data.type, "default_cards")
+        self.assertIsNone(bulk_data.etag)
+
+    def test_empty_cache_is_not_current(self):
+        bulk_data = make_bulk_data("2024-11-28T10:07:23.000+00:00")
+        self.assertFalse(self.cache.is_current(bulk_data))
+        self.assertEqual(self.cache.conditional_headers(), {})
+
+    def test_cache_is_current_for_same_snapshot(self):
+        bulk_data = make_bulk_data("2024-11-28T10:07:23.000+00:00")
+        self._store(bulk_data, "default-cards-1.json")
+        self.assertTrue(self.cache.is_current(bulk_data))
+        self.assertFalse(
+            self.cache.is_current(make_bulk_data("2024-11-29T10:07:23.000+00:00"))
+        )
+
+    def test_cache_is_not_current_when_file_is_missing(self):
+        bulk_data = make_bulk_data("2024-11-28T10:07:23.000+00:00")
+        self._store(bulk_data, "default-cards-1.json").unlink()
+        self.assertFalse(self.cache.is_current(bulk_data))
+
+    def test_store_removes_previous_file(self):
+        old_path = self._store(
+            make_bulk_data("2024-11-28T10:07:23.000+00:00"), "default-cards-1.json"
+        )
+        new_path = self._store(
+            make_bulk_data("2024-11-29T10:07:23.000+00:00"), "default-cards-2.json"
+        )
+        self.assertFalse(old_path.exists())
+        self.assertEqual(self.cache.get_file_path(), new_path)
+
+    def test_conditional_headers_use_stored_validators(self):
+        bulk_data = make_bulk_data("2024-11-28T10:07:23.000+00:00")
+        bulk_data.etag = '"abc"'
+        bulk_data.last_modified = "Thu, 28 Nov 2024 10:07:23 GMT"
+        self._store(bulk_data, "default-cards-1.json")
+        self.assertEqual(
+            self.cache.conditional_headers(),
+            {
+                "If-None-Match": '"abc"',
+                "If-Modified-Since": "Thu, 28 Nov 2024 10:07:23 GMT",
+            },
+        )
+
+    def test_mark_ingested(self):
+        bulk_data = make_bulk_data("2024-11-28T10:07:23.000+00:00")
+        self._store(bulk_data, "default-cards-1.json")
+        self.assertFalse(self.cache.is_ingested(bulk_data))
+        self.cache.mark_ingested(bulk_data)
+        self.assertTrue(self.cache.is_ingested(bulk_data))
+        self.assertFalse(
+            self.cache.is_ingested(make_bulk_data("2024-11-29T10:07:23.000+00:00"))
+        )
@@ -0,0 +1,76 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+from django.test import TestCase
+from services.artifact_writer import (
+    ArtifactManifest,
+    ArtifactWriter,
+    open_artifact,
+    with_compression_suffix,
+    zstandard,
+)
+
+
+class TestArtifactWriter(TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.body = json.dumps([{"name": f"Forest {i}"} for i in range(1000)]).encode()
+
+    def _write(self, compression: str) -> Path:
+        file_name = with_compression_suffix("scryfall_data.json", compression)
+        file_path = Path(self.temp_dir.name) / file_name
+        with ArtifactWriter(file_path, compression, "2024-11-28") as writer:
+            for i in range(0, len(self.body), 4096):
+                writer.write(self.body[i : i + 4096])
+        return file_path
+
+    def _assert_round_trip(self, file_path: Path, compression: str) -> None:
+        with open_artifact(file_path) as f:
+            self.assertEqual(f.read(), self.body)
+
+        manifest = ArtifactManifest.load(file_path)
+        self.assertEqual(manifest.compression, compression)
+        self.assertEqual(manifest.raw_size, len(self.body))
+        self.assertEqual(manifest.source_updated_at, "2024-11-28")
+        self.assertTrue(manifest.verify(file_path))
+
+    def test_gzip_round_trip(self):
+        file_path = self._write("gzip")
+        self.assertEqual(file_path.name, "scryfall_data.json.gz")
+        self._assert_round_trip(file_path, "gzip")
+        self.assertLess(ArtifactManifest.load(file_path).size, len(self.body))
+
+    @unittest.skipIf(zstandard is None, "zstandard is not installed")
+    def test_zstd_round_trip(self):
+        file_path = self._write("zstd")
+        self.assertEqual(file_path.name, "scryfall_data.json.zst")
+        self._assert_round_trip(file_path, "zstd")
+
+    def test_uncompressed_round_trip(self):
+        file_path = self._write("none")
+        self.assertEqual(file_path.name, "scryfall_data.json")
+        self._assert_round_trip(file_path, "none")
+
+    def test_manifest_detects_corruption(self):
+        file_path = self._write("gzip")
+        with open(file_path, "r+b") as f:
+            f.seek(20)
+            f.write(b"\x00\x00\x00\x00")
+        self.assertFalse(ArtifactManifest.load(file_path).verify(file_path))
+
+    def test_failed_write_leaves_no_artifact(self):
+        file_path = Path(self.temp_dir.name) / "scryfall_data.json.gz"
+        with self.assertRaises(RuntimeError):
+            with ArtifactWriter(file_path, "gzip") as writer:
+                writer.write(self.body)
+                raise RuntimeError("connection reset")
+        self.assertEqual(list(Path(self.temp_dir.name).iterdir()), [])
+
+    def test_dry_run_writes_nothing(self):
+        with ArtifactWriter(None, "gzip") as writer:
+            writer.write(self.body)
+        self.assertEqual(writer.manifest.raw_size, len(self.body))
+        self.assertEqual(list(Path(self.temp_dir.name).iterdir()), [])
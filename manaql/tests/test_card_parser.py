@@ -0,0 +1,70 @@
+import io
+import json
+from unittest.mock import patch
+
+import ijson
+from django.test import TestCase
+from services.card_parser import CARD_FIELDS, CardParser, get_ijson_backend
+
+
+class TestCardParser(TestCase):
+    def setUp(self):
+        self.valid_card = {
+            "object": "card",
+            "name": "Forest",
+            "lang": "en",
+            "layout": "normal",
+            "games": ["paper"],
+            "cmc": 0.0,
+            "legalities": {"standard": "legal"},
+            "related_uris": {"edhrec": "https://edhrec.com/route/?cc=Forest"},
+            "purchase_uris": {"tcgplayer": "https://www.tcgplayer.com"},
+            "all_parts": [{"object": "related_card", "name": "Forest"}],
+        }
+
+    def _parse(self, cards, **kwargs):
+        parser = CardParser(**kwargs)
+        return parser, list(parser.parse(io.BytesIO(json.dumps(cards).encode())))
+
+    def test_parse_projects_card_fields(self):
+        _, cards = self._parse([self.valid_card])
+        self.assertEqual(len(cards), 1)
+        self.assertTrue(set(cards[0]).issubset(CARD_FIELDS))
+        self.assertNotIn("related_uris", cards[0])
+        self.assertNotIn("all_parts", cards[0])
+        self.assertEqual(cards[0]["legalities"], {"standard": "legal"})
+
+    def test_parse_uses_floats(self):
+        _, cards = self._parse([self.valid_card])
+        self.assertIsInstance(cards[0]["cmc"], float)
+
+    def test_parse_filters_cards(self):
+        parser, cards = self._parse(
+            [
+                self.valid_card,
+                {**self.valid_card, "lang": "ja"},
+                {**self.valid_card, "layout": "token"},
+                {**self.valid_card, "games": ["arena"]},
+            ]
+        )
+        self.assertEqual(len(cards), 1)
+        self.assertEqual(parser.parsed_count, 4)
+        self.assertEqual(parser.filtered_count, 3)
+
+    def test_parse_without_filter(self):
+        _, cards = self._parse(
+            [self.valid_card, {**self.valid_card, "lang": "ja"}], filter_cards=False
+        )
+        self.assertEqual(len(cards), 2)
+
+    def test_backend_falls_back_when_c_extension_is_missing(self):
+        get_backend = ijson.get_backend
+
+        def without_c_backend(name):
+            if name == "yajl2_c":
+                raise ImportError("yajl2_c unavailable")
+            return get_backend(name)
+
+        with patch("services.card_parser.ijson.get_backend", without_c_backend):
+            backend = get_ijson_backend()
+        self.assertNotEqual(backend.__name__, "ijson.backends.yajl2_c")
@@ -1,8 +1,12 @@
 from database.models.card import Card
 from database.models.printing import Printing
 from database.models.scryfall_card import ScryfallCard
-from django.test import TestCase
-from services.card_processor import CardProcessor
+from django.test import TestCase, TransactionTestCase
+from services.card_processor import (
+    CardProcessor,
+    ParallelStrategy,
+    SequentialStrategy,
+)
 
 
 class TestCardProcessor(TestCase):
@@ -64,3 +68,221 @@ class TestCardProcessor(TestCase):
         self.processor.process_cards()
         self.assertEqual(Card.objects.count(), 1)
         self.assertEqual(Printing.objects.count(), 2)
+
+    def test_process_cards_should_only_rebuild_changed_names(self):
+        for name in ("Forest", "Island"):
+            ScryfallCard.objects.create(
+                name=name,
+                type_line=f"Basic Land — {name}",
+                set_code="blb",
+                set_name="Bloomburrow",
+                collector_number=name,
+                image_uris={"normal": f"https://cards.scryfall.io/{name}.jpg"},
+                finishes=["nonfoil"],
+                prices={
+                    "usd": "0.10",
+                    "usd_foil": None,
+                    "usd_etched": None,
+                    "eur": None,
+                    "eur_foil": None,
+                },
+            )
+        self.processor.process_cards()
+        forest = Card.objects.get(name="Forest")
+
+        ScryfallCard.objects.filter(name="Island").update(type_line="Land")
+        result = self.processor.process_cards(changed_names={"Island"})
+
+        self.assertEqual(result.cards_created, 1)
+        self.assertEqual(result.printings_created, 1)
+        self.assertEqual(Card.objects.get(name="Forest").id, forest.id)
+        self.assertEqual(Card.objects.get(name="Island").type_line, "Land")
+        self.assertEqual(Printing.objects.count(), 2)
+
+    def test_process_cards_should_save_in_batches(self):
+        for i in range(7):
+            for name in ("Island", f"Card {i}"):
+                ScryfallCard.objects.create(
+                    name=name,
+                    type_line="Instant",
+                    set_code="tst",
+                    set_name="Test",
+                    collector_number=f"{name}-{i}",
+                    image_uris={"normal": f"https://cards.scryfall.io/{i}.jpg"},
+                    finishes=["nonfoil"],
+                    prices={
+                        "usd": None,
+                        "usd_foil": None,
+                        "usd_etched": None,
+                        "eur": None,
+                        "eur_foil": None,
+                    },
+                )
+        ScryfallCard.objects.create(name=None, set_code="tst", collector_number="x")
+        self.processor.strategy = SequentialStrategy(batch_size=3)
+
+        result = self.processor.process_cards()
+
+        self.assertEqual(result.cards_created, 8)
+        self.assertEqual(result.printings_created, 14)
+        self.assertEqual(result.failed_cards, [None])
+        self.assertEqual(Printing.objects.filter(card__name="Island").count(), 7)
+        for printing in Printing.objects.select_related("card"):
+            self.assertTrue(printing.collector_number.startswith(printing.card.name))
+
+
+def _create_scryfall_card(name: str, **fields) -> ScryfallCard:
+    return ScryfallCard.objects.create(
+        **{
+            "name": name,
+            "type_line": "Instant",
+            "oracle_text": f"{name} deals 3 damage to any target.",
+            "set_code": "m10",
+            "set_name": "Magic 2010",
+            "collector_number": name,
+            "image_uris": {"normal": f"https://cards.scryfall.io/{name}.jpg"},
+            "finishes": ["nonfoil"],
+            "prices": {
+                "usd": "0.10",
+                "usd_foil": None,
+                "usd_etched": None,
+                "eur": None,
+                "eur_foil": None,
+            },
+            **fields,
+        }
+    )
+
+
+class TestCardProcessorMerge(TestCase):
+    def setUp(self):
+        for name in ("Lightning Bolt", "Shock", "Lava Spike"):
+            _create_scryfall_card(name)
+        self.processor = CardProcessor()
+        self.processor.with_sequential_strategy()
+        self.processor.with_merge()
+        self.processor.process_cards()
+        Card.objects.update(embedding=[0.5] * 1536, embedding_text_hash="0" * 32)
+        self.ids = dict(Card.objects.values_list("name", "id"))
+        self.printing_ids = dict(Printing.objects.values_list("collector_number", "id"))
+
+    def test_merge_should_upsert_and_delete_vanished_cards(self):
+        ScryfallCard.objects.filter(name="Shock").update(
+            oracle_text="Shock deals 2 damage to any target."
+        )
+        ScryfallCard.objects.filter(name="Lightning Bolt").update(reserved=True)
+        ScryfallCard.objects.filter(name="Lava Spike").delete()
+        _create_scryfall_card("Chain Lightning")
+
+        result = self.processor.process_cards()
+
+        self.assertEqual(result.cards_created, 1)
+        self.assertEqual(result.cards_updated, 2)
+        self.assertEqual(result.cards_deleted, 1)
+        self.assertEqual(result.printings_created, 1)
+        self.assertEqual(result.printings_updated, 0)
+        self.assertEqual(result.printings_deleted, 1)
+        cards = {card.name: card for card in Card.objects.all()}
+        self.assertEqual(set(cards), {"Lightning Bolt", "Shock", "Chain Lightning"})
+        self.assertEqual(cards["Shock"].id, self.ids["Shock"])
+        self.assertEqual(cards["Lightning Bolt"].id, self.ids["Lightning Bolt"])
+        self.assertTrue(cards["Lightning Bolt"].reserved)
+        # only the embedding of the card whose embedded text changed is cleared
+        self.assertIsNotNone(cards["Lightning Bolt"].embedding)
+        self.assertEqual(cards["Lightning Bolt"].embedding_text_hash, "0" * 32)
+        self.assertIsNone(cards["Shock"].embedding)
+        self.assertIsNone(cards["Shock"].embedding_text_hash)
+        self.assertIsNone(cards["Chain Lightning"].embedding)
+        self.assertEqual(Printing.objects.count(), 3)
+
+    def test_merge_should_skip_unchanged_cards(self):
+        result = self.processor.process_cards()
+
+        self.assertEqual(result.cards_created, 0)
+        self.assertEqual(result.cards_updated, 0)
+        self.assertEqual(result.cards_deleted, 0)
+        self.assertEqual(result.printings_created, 0)
+        self.assertEqual(result.printings_updated, 0)
+        self.assertEqual(dict(Card.objects.values_list("name", "id")), self.ids)
+        self.assertEqual(
+            dict(Printing.objects.values_list("collector_number", "id")),
+            self.printing_ids,
+        )
+        self.assertFalse(Card.objects.filter(embedding__isnull=True).exists())
+
+    def test_merge_should_update_changed_printings(self):
+        scryfall_card = ScryfallCard.objects.get(name="Shock")
+        scryfall_card.prices = {**scryfall_card.prices, "usd": "0.25"}
+        scryfall_card.save()
+        # the printing moves to another card with the same set and number
+        ScryfallCard.objects.filter(name="Lava Spike").update(
+            collector_number="Lightning Bolt"
+        )
+        ScryfallCard.objects.filter(name="Lightning Bolt").delete()
+
+        result = self.processor.process_cards()
+
+        self.assertEqual(result.printings_created, 1)
+        self.assertEqual(result.printings_updated, 1)
+        self.assertEqual(result.printings_deleted, 2)
+        shock = Printing.objects.get(collector_number="Shock")
+        self.assertEqual(shock.id, self.printing_ids["Shock"])
+        self.assertEqual(str(shock.price_usd), "0.25")
+        moved = Printing.objects.get(collector_number="Lightning Bolt")
+        self.assertEqual(moved.card.name, "Lava Spike")
+        self.assertEqual(Printing.objects.count(), 2)
+
+    def test_merge_should_only_touch_changed_names(self):
+        ScryfallCard.objects.filter(name="Shock").update(type_line="Sorcery")
+        ScryfallCard.objects.filter(name="Lava Spike").delete()
+
+        result = self.processor.process_cards(changed_names={"Shock", "Lava Spike"})
+
+        self.assertEqual(result.cards_updated, 1)
+        self.assertEqual(result.cards_deleted, 1)
+        self.assertEqual(result.printings_created, 0)
+        self.assertEqual(result.printings_deleted, 1)
+        self.assertEqual(
+            Printing.objects.get(collector_number="Shock").id,
+            self.printing_ids["Shock"],
+        )
+        self.assertEqual(Card.objects.get(name="Shock").id, self.ids["Shock"])
+        self.assertEqual(Card.objects.get(name="Shock").type_line, "Sorcery")
+        self.assertFalse(Card.objects.filter(name="Lava Spike").exists())
+        self.assertEqual(Printing.objects.count(), 2)
+
+
+class TestParallelStrategy(TransactionTestCase):
+    def setUp(self):
+        for i in range(20):
+            _create_scryfall_card(f"Card {i % 8}", collector_number=str(i))
+        ScryfallCard.objects.create(name=None, set_code="tst", collector_number="x")
+        self.processor = CardProcessor()
+        self.processor.strategy = ParallelStrategy(batch_size=3, max_workers=2)
+
+    def test_process_cards_should_process_key_ranges_in_processes(self):
+        result = self.processor.process_cards()
+
+        self.assertEqual(result.cards_created, 8)
+        self.assertEqual(result.printings_created, 20)
+        self.assertEqual(result.failed_cards, [None])
+        self.assertEqual(result.failed_printings, [None])
+        for printing in Printing.objects.select_related("card"):
+            self.assertEqual(
+                printing.card.name, f"Card {int(printing.collector_number) % 8}"
+            )
+
+    def test_process_cards_should_merge_in_processes(self):
+        self.processor.with_merge()
+        self.processor.process_cards()
+        printing_ids = set(Printing.objects.values_list("id", flat=True))
+        ScryfallCard.objects.filter(collector_number="3").update(set_name="Renamed")
+
+        result = self.processor.process_cards()
+
+        self.assertEqual(result.cards_created + result.cards_updated, 0)
+        self.assertEqual(result.printings_created, 0)
+        self.assertEqual(result.printings_updated, 1)
+        self.assertEqual(
+            set(Printing.objects.values_list("id", flat=True)), printing_ids
+        )
@@ -0,0 +1,88 @@
+from unittest.mock import patch
+
+from database.models.batch_progress import BatchProgress
+from database.models.card import Card
+from database.models.printing import Printing
+from database.models.scryfall_card import ScryfallCard
+from django.db import OperationalError
+from django.test import TransactionTestCase
+from services.card_processor import CardProcessor, SequentialStrategy
+
+PRICES = {
+    "usd": None,
+    "usd_foil": None,
+    "usd_etched": None,
+    "eur": None,
+    "eur_foil": None,
+}
+
+
+def _failing_save_printings(fail_on: set):
+    """Wrap SequentialStrategy._save_printings to fail on the given calls."""
+    save_printings = SequentialStrategy._save_printings
+    calls = []
+
+    def wrapper(self, printings, batch_size):
+        calls.append(len(printings))
+        if len(calls) in fail_on:
+            raise OperationalError("server closed the connection unexpectedly")
+        return save_printings(self, printings, batch_size)
+
+    return wrapper, calls
+
+
+@patch("services.db_retry.time.sleep")
+class TestCheckpointedRetries(TransactionTestCase):
+    def setUp(self):
+        for i in range(10):
+            ScryfallCard.objects.create(
+                name=f"Card {i}",
+                type_line="Instant",
+                set_code="tst",
+                set_name="Test",
+                collector_number=str(i),
+                image_uris={"normal": f"https://cards.scryfall.io/{i}.jpg"},
+                finishes=["nonfoil"],
+                prices=PRICES,
+            )
+        CardProcessor._db_cleared = False
+
+    def _processor(self, run_id=None) -> CardProcessor:
+        processor = CardProcessor(run_id=run_id)
+        processor.strategy = SequentialStrategy(batch_size=2)
+        return processor
+
+    def test_retry_should_only_redo_the_failed_batch(self, sleep):
+        save_printings, calls = _failing_save_printings(fail_on={3})
+        with patch.object(SequentialStrategy, "_save_printings", save_printings):
+            result = self._processor().process_cards()
+
+        # five batches of two, the third of which was saved twice
+        self.assertEqual(calls, [2] * 6)
+        self.assertEqual(sleep.call_count, 1)
+        self.assertEqual(result.cards_created, 10)
+        self.assertEqual(result.printings_created, 10)
+        self.assertEqual(Card.objects.count(), 10)
+        self.assertEqual(Printing.objects.count(), 10)
+        self.assertFalse(BatchProgress.objects.exists())
+
+    def test_run_id_should_resume_a_failed_run(self, sleep):
+        processor = self._processor()
+        save_printings, _ = _failing_save_printings(fail_on=set(range(3, 100)))
+        with patch.object(SequentialStrategy, "_save_printings", save_printings):
+            with self.assertRaises(OperationalError):
+                processor.process_cards()
+
+        self.assertEqual(Printing.objects.count(), 4)
+        printing_ids = set(Printing.objects.values_list("id", flat=True))
+        CardProcessor._db_cleared = False
+
+        result = self._processor(run_id=processor.checkpoint.run_id).process_cards()
+
+        self.assertEqual(result.cards_created, 10)
+        self.assertEqual(result.printings_created, 10)
+        self.assertEqual(Printing.objects.count(), 10)
+        self.assertTrue(
+            printing_ids <= set(Printing.objects.values_list("id", flat=True))
+        )
+        self.assertFalse(BatchProgress.objects.exists())
@@ -0,0 +1,124 @@
+import uuid
+
+from database.models.embedding_cache import EmbeddingCache
+from database.models.scryfall_card import ScryfallCard
+from django.db import connection
+from django.test import TestCase
+from services.copy_loader import CopyLoader
+from services.scryfall_exporter import ScryfallExporter
+
+
+class TestCopyLoader(TestCase):
+    def setUp(self):
+        self.card = {
+            "name": 'Borrowing 100,000 Arrows "Tab\tNewline\nBackslash\\"',
+            "lang": "en",
+            "layout": "normal",
+            "games": ["paper", "mtgo"],
+            "set": "ptk",
+            "set_name": "Portal Three Kingdoms",
+            "collector_number": "25",
+            "type_line": "Sorcery",
+            "finishes": ["nonfoil"],
+            "promo_types": [],
+            "oracle_text": "Draw a card for each tapped creature\\n{T}: — é",
+            "keywords": ['Quote"d', "Comma,Space ", "Brace{}", "Back\\slash", "NULL"],
+            "cmc": 3.0,
+            "mana_cost": "{2}{U}",
+            "colors": ["U"],
+            "color_identity": ["U"],
+            "legalities": {"vintage": "legal", "legacy": "legal"},
+            "reserved": True,
+            "prices": {"usd": "1.25", "usd_foil": None, "nested": {"tab": "\t"}},
+            "image_uris": None,
+            "card_faces": [{"name": "Front", "cmc": 1.5}, {"name": "Æther"}],
+        }
+
+    def _assert_loaded(self, copy_format: str) -> None:
+        loader = CopyLoader(ScryfallCard, copy_format=copy_format)
+        expected = ScryfallCard.values_from_scryfall_card(
+            {
+                **self.card,
+                "id": "0000579f-7b35-4ed3-b44c-db2a538066fe",
+                "oracle_id": "44623693-51d6-49ad-8cd7-140505caf02f",
+            }
+        )
+        loaded = loader.load([loader.row(expected)])
+
+        self.assertEqual(loaded, 1)
+        scryfall_card = ScryfallCard.objects.get()
+        for name, value in expected.items():
+            actual = getattr(scryfall_card, name)
+            if isinstance(actual, uuid.UUID):
+                actual = str(actual)
+            self.assertEqual(actual, value, name)
+
+    def test_load_text_format(self):
+        self._assert_loaded("text")
+
+    def test_load_binary_format(self):
+        self._assert_loaded("binary")
+
+    def test_load_nulls(self):
+        for copy_format in ("text", "binary"):
+            loader = CopyLoader(ScryfallCard, copy_format=copy_format)
+            values = ScryfallCard.values_from_scryfall_card({"name": None})
+            values["keywords"] = ["Flying", None]
+            loader.load([loader.row(values)])
+
+        for scryfall_card in ScryfallCard.objects.all():
+            self.assertIsNone(scryfall_card.name)
+            self.assertIsNone(scryfall_card.cmc)
+            self.assertIsNone(scryfall_card.prices)
+            self.assertEqual(scryfall_card.keywords, ["Flying", None])
+            self.assertEqual(scryfall_card.finishes, [])
+
+    def test_load_vectors(self):
+        # float4 values, so that both formats round-trip exactly
+        embedding = [0.5, -1.25, 3.0] + [0.0] * 1533
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "CREATE TEMPORARY TABLE vectors AS "
+                "SELECT text_hash, embedding FROM embedding_cache WITH NO DATA"
+            )
+            for copy_format in ("text", "binary"):
+                loader = CopyLoader(
+                    EmbeddingCache,
+                    fields=("text_hash", "embedding"),
+                    copy_format=copy_format,
+                    db_table="vectors",
+                )
+                loader.load([(copy_format, embedding)])
+            cursor.execute(
+                "INSERT INTO embedding_cache (text_hash, model, embedding, created_at) "
+                "SELECT text_hash, 'test', embedding, now() FROM vectors"
+            )
+
+        self.assertEqual(EmbeddingCache.objects.count(), 2)
+        for entry in EmbeddingCache.objects.all():
+            self.assertEqual(list(entry.embedding), embedding)
+
+    def test_load_many_rows(self):
+        loader = CopyLoader(ScryfallCard, copy_format="binary")
+        rows = (
+            loader.row(
+                ScryfallCard.values_from_scryfall_card(
+                    {**self.card, "name": f"Card {i}"}
+                )
+            )
+            for i in range(5000)
+        )
+        self.assertEqual(loader.load(rows), 5000)
+        self.assertEqual(ScryfallCard.objects.count(), 5000)
+
+    def test_exporter_copy_strategy(self):
+        exporter = ScryfallExporter()
+        exporter.with_copy_strategy("binary")
+        result = exporter.process_cards(
+            iter(
+                [self.card, {**self.card, "lang": "ja"}, {**self.card, "name": "Other"}]
+            )
+        )
+        self.assertEqual(result.success_count, 2)
+        self.assertEqual(result.filtered_count, 1)
+        self.assertEqual(ScryfallCard.objects.count(), 2)
@@ -0,0 +1,137 @@
+import os
+import re
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import requests
+from django.test import TestCase
+from services.downloader import DownloadState, RangedDownloader
+
+DATA = os.urandom(3 * 1024 * 1024 + 123)
+ETAG = '"v1"'
+
+
+class RangeRequestHandler(BaseHTTPRequestHandler):
+    """Serves DATA with Range support, optionally dropping connections mid-body."""
+
+    supports_ranges = True
+    drops_remaining = 0
+    requests_seen = []
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_headers(self, status: int, length: int, extra=None):
+        self.send_response(status)
+        self.send_header("Content-Length", str(length))
+        self.send_header("ETag", ETAG)
+        if self.supports_ranges:
+            self.send_header("Accept-Ranges", "bytes")
+        for key, value in (extra or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+
+    def do_HEAD(self):
+        if self.headers.get("If-None-Match") == ETAG:
+            self._send_headers(304, 0)
+            return
+        self._send_headers(200, len(DATA))
+
+    def do_GET(self):
+        cls = type(self)
+        cls.requests_seen.append(self.headers.get("Range"))
+        match = re.match(r"bytes=(\d+)-(\d+)", self.headers.get("Range") or "")
+        if not match or not self.supports_ranges:
+            self._send_headers(200, len(DATA))
+            self.wfile.write(DATA)
+            return
+
+        start, end = int(match.group(1)), int(match.group(2))
+        body = DATA[start : end + 1]
+        self._send_headers(
+            206, len(body), {"Content-Range": f"bytes {start}-{end}/{len(DATA)}"}
+        )
+        if cls.drops_remaining > 0:
+            cls.drops_remaining -= 1
+            self.wfile.write(body[: len(body) // 2])
+            self.wfile.flush()
+            self.close_connection = True
+            self.connection.shutdown(2)
+            return
+        self.wfile.write(body)
+
+
+class TestRangedDownloader(TestCase):
+    def setUp(self):
+        RangeRequestHandler.supports_ranges = True
+        RangeRequestHandler.drops_remaining = 0
+        RangeRequestHandler.requests_seen = []
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), RangeRequestHandler)
+        thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/cards.json"
+
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.local_path = Path(self.temp_dir.name) / "cards.json"
+
+        self.downloader = RangedDownloader(
+            requests.Session(),
+            connections=4,
+            range_size=512 * 1024,
+            read_size=64 * 1024,
+            max_retries=3,
+            initial_backoff=0,
+        )
+
+    def test_download_in_ranges(self):
+        result = self.downloader.download(self.url, self.local_path)
+        self.assertEqual(self.local_path.read_bytes(), DATA)
+        self.assertEqual(result.size, len(DATA))
+        self.assertEqual(result.etag, ETAG)
+        self.assertEqual(len(RangeRequestHandler.requests_seen), 7)
+        self.assertFalse(RangedDownloader.state_path(self.local_path).exists())
+
+    def test_download_retries_dropped_ranges(self):
+        RangeRequestHandler.drops_remaining = 2
+        self.downloader.download(self.url, self.local_path)
+        self.assertEqual(self.local_path.read_bytes(), DATA)
+
+    def test_download_resumes_from_state_file(self):
+        RangeRequestHandler.drops_remaining = 100
+        with self.assertRaises(requests.RequestException):
+            self.downloader.download(self.url, self.local_path)
+
+        state = DownloadState.load(RangedDownloader.state_path(self.local_path))
+        self.assertGreater(state.downloaded, 0)
+        self.assertLess(state.downloaded, len(DATA))
+
+        RangeRequestHandler.drops_remaining = 0
+        RangeRequestHandler.requests_seen = []
+        result = self.downloader.download(self.url, self.local_path)
+        self.assertEqual(self.local_path.read_bytes(), DATA)
+        self.assertEqual(result.resumed_bytes, state.downloaded)
+        # only the bytes missing from the previous run are requested again
+        requested = 0
+        for range_header in RangeRequestHandler.requests_seen:
+            start, end = re.match(r"bytes=(\d+)-(\d+)", range_header).groups()
+            requested += int(end) - int(start) + 1
+        self.assertEqual(requested, len(DATA) - state.downloaded)
+
+    def test_download_without_range_support(self):
+        RangeRequestHandler.supports_ranges = False
+        result = self.downloader.download(self.url, self.local_path)
+        self.assertEqual(self.local_path.read_bytes(), DATA)
+        self.assertEqual(result.connections, 1)
+
+    def test_download_not_modified(self):
+        result = self.downloader.download(
+            self.url, self.local_path, headers={"If-None-Match": ETAG}
+        )
+        self.assertIsNone(result)
+        self.assertFalse(self.local_path.exists())
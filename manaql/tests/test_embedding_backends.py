@@ -0,0 +1,73 @@
+import math
+
+from database.models.card import Card
+from database.models.embedding_cache import EmbeddingCache
+from django.test import SimpleTestCase, TestCase
+from services.embedding_backends import EmbeddingStats, HashingBackend
+from services.embedding_service import EmbeddingService
+
+
+def _cosine(a, b) -> float:
+    return sum(x * y for x, y in zip(a, b))
+
+
+class TestHashingBackend(SimpleTestCase):
+    def setUp(self):
+        self.backend = HashingBackend(dimensions=1536)
+        self.stats = EmbeddingStats()
+
+    def test_should_embed_deterministically(self):
+        texts = ["Name: Opt | Rules Text: Scry 1. Draw a card.", "Name: Forest"]
+        embeddings = self.backend.embed(texts, self.stats)
+
+        self.assertEqual(embeddings, HashingBackend(1536).embed(texts, self.stats))
+        self.assertEqual([len(embedding) for embedding in embeddings], [1536, 1536])
+        self.assertEqual(self.stats.texts, 4)
+
+    def test_should_normalize_embeddings(self):
+        embeddings = self.backend.embed(["Mana Cost: {2}{U}{U}", ""], self.stats)
+
+        self.assertAlmostEqual(math.sqrt(_cosine(*[embeddings[0]] * 2)), 1.0)
+        self.assertEqual(embeddings[1], [0.0] * 1536)
+
+    def test_should_embed_shared_words_closer(self):
+        opt, divination, forest = self.backend.embed(
+            [
+                "Type: Instant | Rules Text: Scry 1. Draw a card.",
+                "Type: Sorcery | Rules Text: Draw two cards.",
+                "Type: Basic Land — Forest | Rules Text: {T}: Add {G}.",
+            ],
+            self.stats,
+        )
+        self.assertGreater(_cosine(opt, divination), _cosine(opt, forest))
+
+
+class TestEmbeddingBackends(TestCase):
+    def test_hashing_backend_should_embed_cards_offline(self):
+        service = EmbeddingService(backend="hashing")
+        cards = [
+            Card.objects.create(name=f"Card {i}", main_type="Instant", games=[])
+            for i in range(3)
+        ]
+        service.update_card_embeddings(cards)
+
+        backend = HashingBackend(1536)
+        for card in Card.objects.all():
+            text = service.generate_card_text(card)
+            expected = backend.embed([text], EmbeddingStats())[0]
+            self.assertEqual(
+                [round(x, 5) for x in card.embedding], [round(x, 5) for x in expected]
+            )
+        self.assertEqual(
+            set(EmbeddingCache.objects.values_list("model", flat=True)),
+            {"hashing-v1-1536"},
+        )
+
+    def test_should_reject_unknown_backends(self):
+        with self.assertRaisesMessage(ValueError, "Unknown embedding backend"):
+            EmbeddingService(backend="word2vec")
+
+    def test_should_reject_backends_the_columns_cannot_hold(self):
+        service = EmbeddingService(backend="hashing")
+        with self.assertRaisesMessage(ValueError, "have 256 dimensions"):
+            service.with_backend(HashingBackend(256))
@@ -0,0 +1,125 @@
+from unittest.mock import patch
+
+from database.models.batch_progress import BatchProgress
+from database.models.card import Card
+from django.db import OperationalError, connection
+from django.test import TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from services.embedding_job import EmbeddingJob
+from services.embedding_service import EmbeddingService
+
+from .test_embedding_service import (
+    EmbeddingsRequestHandler,
+    fake_embedding,
+    serve_embeddings,
+)
+
+
+def _failing_save_embeddings(fail_on: set, error: Exception):
+    """Wrap EmbeddingService.save_embeddings to fail on the given calls."""
+    save_embeddings = EmbeddingService.save_embeddings
+    calls = []
+
+    def wrapper(self, cards, embeddings):
+        calls.append(len(cards))
+        if len(calls) in fail_on:
+            raise error
+        return save_embeddings(self, cards, embeddings)
+
+    return wrapper, calls
+
+
+class TestEmbeddingJob(TransactionTestCase):
+    def setUp(self):
+        self.service = serve_embeddings(self, max_batch_size=2, max_concurrency=1)
+        self.cards = [
+            Card.objects.create(name=f"Card {i}", main_type="Instant", games=[])
+            for i in range(10)
+        ]
+
+    def _assert_embedded(self, cards):
+        for card in Card.objects.filter(id__in=[card.id for card in cards]):
+            expected = fake_embedding(self.service.generate_card_text(card))
+            self.assertEqual(list(card.embedding), expected)
+
+    def test_should_embed_every_card_in_one_pass(self):
+        job = EmbeddingJob(self.service, batch_size=3)
+        with CaptureQueriesContext(connection) as context:
+            result = job.run()
+
+        self.assertEqual(result.cards_processed, 10)
+        self.assertEqual(result.batches, 4)
+        self.assertFalse(Card.objects.filter(embedding__isnull=True).exists())
+        self._assert_embedded(self.cards)
+        self.assertFalse(
+            any("OFFSET" in query["sql"] for query in context.captured_queries)
+        )
+        self.assertFalse(BatchProgress.objects.exists())
+
+    def test_should_stop_after_limit(self):
+        result = EmbeddingJob(self.service, batch_size=3).run(limit=4)
+
+        self.assertEqual(result.cards_processed, 4)
+        self.assertEqual(result.batches, 2)
+        self.assertEqual(Card.objects.filter(embedding__isnull=False).count(), 4)
+        self._assert_embedded(self.cards[:4])
+
+    def test_should_resume_after_the_last_completed_batch(self):
+        error = OperationalError("server closed the connection unexpectedly")
+        save_embeddings, calls = _failing_save_embeddings({3}, error)
+        job = EmbeddingJob(self.service, batch_size=3, run_id="run")
+        with patch.object(EmbeddingService, "save_embeddings", save_embeddings):
+            with self.assertRaises(OperationalError):
+                job.run()
+        self.assertEqual(BatchProgress.objects.count(), 2)
+
+        EmbeddingsRequestHandler.requests_seen = []
+        result = EmbeddingJob(self.service, batch_size=3, run_id="run").run()
+
+        self.assertEqual(result.resumed_cards, 6)
+        self.assertEqual(result.cards_processed, 10)
+        self.assertEqual(result.batches, 2)
+        # only the failed batch and the ones after it were embedded again
+        self.assertEqual(
+            [
+                text
+                for texts in EmbeddingsRequestHandler.requests_seen
+                for text in texts
+            ],
+            [self.service.generate_card_text(card) for card in self.cards[6:]],
+        )
+        self._assert_embedded(self.cards)
+        self.assertFalse(BatchProgress.objects.exists())
+
+    def test_should_save_the_cards_of_requests_that_succeeded(self):
+        EmbeddingsRequestHandler.failing_input = "Card 3"
+        result = EmbeddingJob(self.service, batch_size=4).run()
+
+        # the request of cards 2 and 3 failed, not the rest of their batch
+        self.assertEqual(result.cards_processed, 8)
+        self.assertEqual(result.cards_failed, 2)
+        self.assertEqual(
+            list(
+                Card.objects.filter(embedding__isnull=True)
+                .order_by("id")
+                .values_list("name", flat=True)
+            ),
+            ["Card 2", "Card 3"],
+        )
+
+    def test_should_skip_batches_that_fail(self):
+        save_embeddings, calls = _failing_save_embeddings({2}, ValueError("bad"))
+        job = EmbeddingJob(self.service, batch_size=3)
+        with patch.object(EmbeddingService, "save_embeddings", save_embeddings):
+            result = job.run()
+
+        self.assertEqual(result.cards_processed, 7)
+        self.assertEqual(result.cards_failed, 3)
+        self.assertEqual(
+            list(
+                Card.objects.filter(embedding__isnull=True)
+                .order_by("id")
+                .values_list("name", flat=True)
+            ),
+            ["Card 3", "Card 4", "Card 5"],
+        )
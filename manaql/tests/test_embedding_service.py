@@ -0,0 +1,285 @@
+import base64
+import json
+import os
+import struct
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+
+from database.models.card import Card
+from database.models.embedding_cache import EmbeddingCache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from services.embedding_backends import PartialEmbeddingError
+from services.embedding_service import EmbeddingService
+
+DIMENSIONS = 1536
+
+
+def fake_embedding(text: str) -> list:
+    """A deterministic embedding, whose first value is the text's length."""
+    return [float(len(text))] + [0.0] * (DIMENSIONS - 1)
+
+
+class EmbeddingsRequestHandler(BaseHTTPRequestHandler):
+    """Serves the OpenAI embeddings endpoint, answering in reverse order after
+    delay seconds, optionally rate limiting the first requests and rejecting
+    those with an input containing failing_input."""
+
+    requests_seen = []
+    rate_limited_remaining = 0
+    failing_input = None
+    delay = 0.0
+    lock = threading.Lock()
+    in_flight = 0
+    max_in_flight = 0
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, data: dict, extra=None):
+        response = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(response)))
+        for key, value in (extra or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(response)
+
+    def do_POST(self):
+        cls = type(self)
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        with cls.lock:
+            if cls.rate_limited_remaining > 0:
+                cls.rate_limited_remaining -= 1
+                error = {"error": {"message": "Rate limit reached", "type": "requests"}}
+                self._send_json(429, error, {"Retry-After": "0.3"})
+                return
+            if cls.failing_input and any(cls.failing_input in t for t in inputs):
+                error = {"error": {"message": "Invalid input", "type": "invalid"}}
+                self._send_json(400, error)
+                return
+            cls.requests_seen.append(inputs)
+            cls.in_flight += 1
+            cls.max_in_flight = max(cls.max_in_flight, cls.in_flight)
+        time.sleep(cls.delay)
+        with cls.lock:
+            cls.in_flight -= 1
+
+        data = []
+        for index, text in reversed(list(enumerate(inputs))):
+            embedding = fake_embedding(text)
+            if body.get("encoding_format") == "base64":
+                packed = struct.pack(f"<{len(embedding)}f", *embedding)
+                embedding = base64.b64encode(packed).decode()
+            data.append({"object": "embedding", "index": index, "embedding": embedding})
+
+        self._send_json(
+            200,
+            {
+                "object": "list",
+                "data": data,
+                "model": body["model"],
+                "usage": {"prompt_tokens": 0, "total_tokens": 0},
+            },
+        )
+
+
+def serve_embeddings(test_case, **kwargs) -> EmbeddingService:
+    """Serve fake embeddings for the test case, and return an EmbeddingService
+    of the given arguments that requests them."""
+    EmbeddingsRequestHandler.requests_seen = []
+    EmbeddingsRequestHandler.rate_limited_remaining = 0
+    EmbeddingsRequestHandler.failing_input = None
+    EmbeddingsRequestHandler.delay = 0.0
+    EmbeddingsRequestHandler.max_in_flight = 0
+    server = ThreadingHTTPServer(("127.0.0.1", 0), EmbeddingsRequestHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    test_case.addCleanup(server.server_close)
+    test_case.addCleanup(server.shutdown)
+
+    environ = {
+        "OPENAI_API_KEY": "test",
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{server.server_address[1]}/v1",
+    }
+    with patch.dict(os.environ, environ):
+        return EmbeddingService(**kwargs)
+
+
+class TestEmbeddingService(TestCase):
+    def setUp(self):
+        self.service = serve_embeddings(
+            self, max_batch_size=4, max_batch_tokens=100, max_concurrency=3
+        )
+
+    def test_generate_embeddings_should_map_results_by_index(self):
+        texts = [f"card {'x' * i}" for i in range(10)]
+        embeddings = self.service.generate_embeddings(texts)
+        self.assertEqual(embeddings, [fake_embedding(text) for text in texts])
+
+    def test_generate_embeddings_should_pack_texts_by_count(self):
+        texts = [f"card {i}" for i in range(10)]
+        self.service.generate_embeddings(texts)
+        self.assertEqual(
+            sorted(EmbeddingsRequestHandler.requests_seen),
+            [texts[0:4], texts[4:8], texts[8:10]],
+        )
+
+    def test_generate_embeddings_should_pack_texts_by_tokens(self):
+        # estimated at 21, 81, 101 and 21 tokens, so no adjacent two fit in 100
+        texts = ["x" * 60, "y" * 240, "z" * 300, "w" * 60]
+        embeddings = self.service.generate_embeddings(texts)
+        self.assertEqual(
+            sorted(EmbeddingsRequestHandler.requests_seen),
+            [texts[3:4], texts[0:1], texts[1:2], texts[2:3]],
+        )
+        self.assertEqual(embeddings[2], fake_embedding(texts[2]))
+
+    def test_update_card_embeddings_should_save_every_card(self):
+        cards = [
+            Card.objects.create(name=f"Card {i}", main_type="Instant", games=[])
+            for i in range(6)
+        ]
+        self.service.update_card_embeddings(cards)
+
+        self.assertEqual(len(EmbeddingsRequestHandler.requests_seen), 2)
+        for card in Card.objects.all():
+            expected = fake_embedding(self.service.generate_card_text(card))
+            self.assertEqual(list(card.embedding), expected)
+
+    def test_update_card_embeddings_should_write_cards_in_bulk(self):
+        def queries(count):
+            cards = [
+                Card.objects.create(
+                    name=f"Card {count}-{i}", main_type="Instant", games=[]
+                )
+                for i in range(count)
+            ]
+            with CaptureQueriesContext(connection) as context:
+                self.service.update_card_embeddings(cards)
+            return len(context.captured_queries)
+
+        self.assertEqual(queries(2), queries(12))
+        for card in Card.objects.all():
+            expected = fake_embedding(self.service.generate_card_text(card))
+            self.assertEqual(list(card.embedding), expected)
+
+    def test_generate_embeddings_should_keep_requests_in_flight(self):
+        EmbeddingsRequestHandler.delay = 0.2
+        texts = [f"card {i}" for i in range(24)]
+
+        start = time.monotonic()
+        embeddings = self.service.generate_embeddings(texts)
+        elapsed = time.monotonic() - start
+
+        self.assertEqual(embeddings, [fake_embedding(text) for text in texts])
+        self.assertEqual(EmbeddingsRequestHandler.max_in_flight, 3)
+        # 6 requests of 0.2s, 3 at a time
+        self.assertLess(elapsed, 0.2 * 6)
+        self.assertEqual(self.service.stats.requests, 6)
+        self.assertEqual(self.service.stats.texts, 24)
+        self.assertGreater(self.service.stats.requests_per_minute, 0)
+
+    def test_generate_embeddings_should_honour_retry_after(self):
+        EmbeddingsRequestHandler.rate_limited_remaining = 1
+
+        start = time.monotonic()
+        embeddings = self.service.generate_embeddings(["card"])
+        elapsed = time.monotonic() - start
+
+        self.assertEqual(embeddings, [fake_embedding("card")])
+        self.assertEqual(self.service.stats.retries, 1)
+        self.assertGreaterEqual(elapsed, 0.3)
+
+    def test_generate_embeddings_should_keep_the_requests_that_succeeded(self):
+        EmbeddingsRequestHandler.failing_input = "card 5"
+        texts = [f"card {i}" for i in range(10)]
+
+        with self.assertRaises(PartialEmbeddingError) as context:
+            self.service.generate_embeddings(texts)
+
+        # only the request of texts 4 to 7 failed
+        self.assertEqual(context.exception.failed, {4, 5, 6, 7})
+        self.assertEqual(
+            context.exception.embeddings,
+            {i: fake_embedding(texts[i]) for i in (0, 1, 2, 3, 8, 9)},
+        )
+
+    def test_update_card_embeddings_should_save_the_requests_that_succeeded(self):
+        EmbeddingsRequestHandler.failing_input = "Card 5"
+        cards = [
+            Card.objects.create(name=f"Card {i}", main_type="Instant", games=[])
+            for i in range(6)
+        ]
+
+        with self.assertRaises(PartialEmbeddingError):
+            self.service.update_card_embeddings(cards)
+
+        self.assertEqual(EmbeddingCache.objects.count(), 4)
+        self.assertEqual(
+            sorted(
+                Card.objects.filter(embedding__isnull=True).values_list(
+                    "name", flat=True
+                )
+            ),
+            ["Card 4", "Card 5"],
+        )
+
+    def test_update_card_embeddings_should_reuse_cached_embeddings(self):
+        cards = [
+            Card.objects.create(name=f"Card {i}", main_type="Instant", games=[])
+            for i in range(3)
+        ]
+        self.service.update_card_embeddings(cards)
+        self.assertEqual(EmbeddingCache.objects.count(), 3)
+
+        # a rebuild recreates the cards without their embeddings
+        Card.objects.all().delete()
+        cards = [
+            Card.objects.create(name=f"Card {i}", main_type="Instant", games=[])
+            for i in range(4)
+        ]
+        self.service.update_card_embeddings(cards)
+
+        self.assertEqual(len(EmbeddingsRequestHandler.requests_seen), 2)
+        self.assertEqual(
+            EmbeddingsRequestHandler.requests_seen[1],
+            [self.service.generate_card_text(cards[3])],
+        )
+        self.assertEqual(self.service.stats.cached, 3)
+        for card in Card.objects.all():
+            expected = fake_embedding(self.service.generate_card_text(card))
+            self.assertEqual(list(card.embedding), expected)
+
+    def test_update_card_embeddings_without_cache_should_overwrite_it(self):
+        card = Card.objects.create(name="Card", main_type="Instant", games=[])
+        self.service.update_card_embeddings([card])
+        EmbeddingCache.objects.update(embedding=[0.5] * DIMENSIONS)
+
+        self.service.with_cache(False)
+        self.service.update_card_embeddings([card])
+
+        expected = fake_embedding(self.service.generate_card_text(card))
+        self.assertEqual(len(EmbeddingsRequestHandler.requests_seen), 2)
+        self.assertEqual(self.service.stats.cached, 0)
+        self.assertEqual(list(EmbeddingCache.objects.get().embedding), expected)
+        self.assertEqual(list(Card.objects.get().embedding), expected)
+
+    def test_stale_cards_should_list_cards_whose_text_changed(self):
+        cards = [
+            Card.objects.create(name=f"Card {i}", main_type="Instant", games=[])
+            for i in range(4)
+        ]
+        self.service.update_card_embeddings(cards[:3])
+        Card.objects.filter(name="Card 1").update(oracle_text="Draw a card.")
+        # embedded before text hashes were recorded
+        Card.objects.filter(name="Card 2").update(embedding_text_hash=None)
+
+        stale = [card.name for card in self.service.stale_cards()]
+
+        self.assertEqual(stale, ["Card 3", "Card 1"])
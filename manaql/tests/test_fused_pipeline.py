@@ -0,0 +1,178 @@
+from database.models.card import Card
+from database.models.printing import Printing
+from database.models.scryfall_card import ScryfallCard
+from unittest.mock import patch
+
+from django.db import connection
+from django.test import TestCase
+from services.card_processor import CardProcessor
+from services.fused_pipeline import FusedPipeline
+from services.scryfall_exporter import ScryfallExporter
+
+from .test_sql_strategy import PRICES, _snapshot
+
+
+def _card(name, set_code, collector_number, **fields):
+    return {
+        "name": name,
+        "lang": "en",
+        "layout": "normal",
+        "games": ["paper"],
+        "set": set_code,
+        "set_name": set_code.upper(),
+        "collector_number": collector_number,
+        "type_line": "Instant",
+        "finishes": ["nonfoil"],
+        "image_uris": {"normal": f"https://cards.scryfall.io/{collector_number}.jpg"},
+        "prices": PRICES,
+        **fields,
+    }
+
+
+CARDS = [
+    _card("Forest", "blb", "280", type_line="Basic Land — Forest"),
+    _card("Opt", "xln", "65", oracle_text="Scry 1.", keywords=["Scry"]),
+    _card(
+        "Forest", "ddr", "35", type_line="Basic Land — Forest", games=["paper", "mtgo"]
+    ),
+    _card("Opt", "ja", "1", lang="ja"),
+    _card("Soldier", "tdom", "1", layout="token"),
+    _card(None, "tst", "1"),
+    _card(
+        "Delver of Secrets // Insectile Aberration",
+        "isd",
+        "51",
+        image_uris=None,
+        card_faces=[
+            {"image_uris": {"normal": "front.jpg"}},
+            {"image_uris": {"normal": "back.jpg"}},
+        ],
+    ),
+    # the first printing of a name makes its card, as when processing
+    _card("Opt", "dom", "60", oracle_text="Scry 1. Draw a card."),
+    _card("Forest", "one", "276", type_line="Basic Land — Forest"),
+]
+
+
+class TestFusedPipeline(TestCase):
+    def setUp(self):
+        self.pipeline = FusedPipeline(batch_size=2)
+        # tables with pending deferred foreign key checks can't be moved or dropped
+        with connection.cursor() as cursor:
+            cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+
+    def test_should_match_ingesting_then_processing(self):
+        exporter = ScryfallExporter()
+        exporter.with_sequential_strategy()
+        exporter.process_cards(iter(CARDS))
+        processor = CardProcessor()
+        processor.with_sequential_strategy()
+        expected_result = processor.process_cards()
+        expected = _snapshot()
+
+        Printing.objects.all().delete()
+        Card.objects.all().delete()
+        result = self.pipeline.process_cards(iter(CARDS))
+
+        self.assertEqual(_snapshot(), expected)
+        self.assertEqual(result.cards_created, expected_result.cards_created)
+        self.assertEqual(result.printings_created, expected_result.printings_created)
+        self.assertEqual(result.failed_cards, expected_result.failed_cards)
+        self.assertEqual(result.cards_created, 3)
+        self.assertEqual(result.printings_created, 6)
+        self.assertEqual(result.filtered_count, 2)
+        self.assertEqual(Card.objects.get(name="Opt").oracle_text, "Scry 1.")
+
+    def test_should_leave_scryfall_cards_alone_by_default(self):
+        ScryfallCard.objects.create(name="Previous")
+        result = self.pipeline.process_cards(iter(CARDS))
+        self.assertEqual(result.staged_count, 0)
+        self.assertEqual(
+            list(ScryfallCard.objects.values_list("name", flat=True)), ["Previous"]
+        )
+
+    def test_should_stage_scryfall_cards_with_staging(self):
+        ScryfallCard.objects.create(name="Stale")
+        self.pipeline.with_staging()
+        result = self.pipeline.process_cards(iter(CARDS))
+        self.assertEqual(result.staged_count, 7)
+        self.assertEqual(
+            sorted(ScryfallCard.objects.values_list("collector_number", flat=True)),
+            sorted(card["collector_number"] for card in CARDS[:3] + CARDS[5:]),
+        )
+
+    def test_should_replace_previous_cards(self):
+        self.pipeline.process_cards(iter(CARDS))
+        result = self.pipeline.process_cards(iter(CARDS[:2]))
+        self.assertEqual(result.cards_created, 2)
+        self.assertEqual(Card.objects.count(), 2)
+        self.assertEqual(Printing.objects.count(), 2)
+
+    def test_should_keep_live_tables_when_the_load_fails(self):
+        self.pipeline.process_cards(iter(CARDS))
+        expected = _snapshot()
+
+        def cards():
+            yield from CARDS[:3]
+            raise ConnectionError("download interrupted")
+
+        with self.assertRaises(ConnectionError):
+            FusedPipeline(batch_size=2).process_cards(cards())
+        self.assertEqual(_snapshot(), expected)
+
+    def test_should_skip_the_printings_of_cards_that_failed(self):
+        original = Card.from_scryfall_card
+
+        def from_scryfall_card(scryfall_card):
+            if scryfall_card.name == "Opt":
+                raise ValueError("bad card")
+            return original(scryfall_card)
+
+        with patch.object(
+            Card, "from_scryfall_card", side_effect=from_scryfall_card
+        ) as mock:
+            result = self.pipeline.process_cards(iter(CARDS))
+
+        # the card is only attempted once, and both printings count as failed
+        self.assertEqual(
+            [call.args[0].name for call in mock.call_args_list].count("Opt"), 1
+        )
+        self.assertEqual(result.failed_cards.count("Opt"), 2)
+        self.assertEqual(result.cards_created, 2)
+        self.assertEqual(result.printings_created, 4)
+
+    def test_merge_should_keep_ids_and_embeddings(self):
+        self.pipeline.with_merge()
+        self.pipeline.process_cards(iter(CARDS))
+        Card.objects.update(embedding=[0.5] * 1536, embedding_text_hash="0" * 32)
+        ids = dict(Card.objects.values_list("name", "id"))
+
+        result = self.pipeline.process_cards(
+            iter([CARDS[0], {**CARDS[1], "oracle_text": "Scry 2."}, CARDS[2]])
+        )
+
+        cards = {card.name: card for card in Card.objects.all()}
+        self.assertEqual(set(cards), {"Forest", "Opt"})
+        self.assertEqual(
+            {name: cards[name].id for name in cards},
+            {name: ids[name] for name in cards},
+        )
+        self.assertIsNotNone(cards["Forest"].embedding)
+        self.assertIsNone(cards["Opt"].embedding)
+        self.assertEqual(Printing.objects.count(), 3)
+        self.assertEqual(result.cards_created, 0)
+        self.assertEqual(result.cards_updated, 1)
+        self.assertEqual(result.cards_deleted, 1)
+        self.assertEqual(result.printings_deleted, 3)
+
+    def test_merge_should_keep_the_rows_of_cards_that_failed(self):
+        self.pipeline.with_merge()
+        self.pipeline.process_cards(iter(CARDS))
+        opt = Card.objects.get(name="Opt")
+
+        with patch.object(Card, "from_scryfall_card", side_effect=ValueError):
+            result = self.pipeline.process_cards(iter(CARDS[1:2]))
+
+        self.assertEqual(result.failed_cards, ["Opt"])
+        self.assertEqual(list(Card.objects.all()), [opt])
+        self.assertEqual(opt.printing_set.count(), 2)
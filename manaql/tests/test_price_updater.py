@@ -0,0 +1,91 @@
+from decimal import Decimal
+
+from database.models.card import Card
+from database.models.printing import Printing
+from database.models.scryfall_card import ScryfallCard
+from django.test import TestCase
+from services.card_processor import CardProcessor
+from services.price_updater import PRICE_CARD_FIELDS, PriceUpdater
+from services.scryfall_exporter import ScryfallExporter
+
+
+def _card(i: int, usd: str = "0.10") -> dict:
+    return {
+        "id": f"00000000-0000-0000-0000-00000000000{i}",
+        "name": f"Forest {i}",
+        "lang": "en",
+        "layout": "normal",
+        "games": ["paper"],
+        "type_line": "Basic Land — Forest",
+        "set": "blb",
+        "set_name": "Bloomburrow",
+        "collector_number": str(i),
+        "finishes": ["nonfoil", "foil"],
+        "image_uris": {"normal": f"https://cards.scryfall.io/normal/{i}.jpg"},
+        "prices": {
+            "usd": usd,
+            "usd_foil": "0.50",
+            "usd_etched": None,
+            "eur": "0.05",
+            "eur_foil": None,
+            "tix": None,
+        },
+    }
+
+
+class TestPriceUpdater(TestCase):
+    def setUp(self):
+        exporter = ScryfallExporter()
+        exporter.with_delta_strategy()
+        exporter.process_cards(iter([_card(i) for i in range(3)]))
+
+        processor = CardProcessor()
+        processor.with_sequential_strategy()
+        processor.process_cards()
+        Card.objects.update(embedding=[0.5] * 1536)
+        self.card_ids = set(Card.objects.values_list("id", flat=True))
+
+    def _price_only(self, card: dict) -> dict:
+        return {key: card[key] for key in PRICE_CARD_FIELDS if key in card}
+
+    def test_update_should_set_printing_prices(self):
+        cards = [_card(0, usd="1.25"), _card(1), _card(2, usd=None)]
+        result = PriceUpdater().update(iter(map(self._price_only, cards)))
+
+        self.assertTrue(result.applied)
+        self.assertEqual(result.printings_updated, 2)
+        self.assertEqual(result.scryfall_cards_updated, 2)
+
+        printing = Printing.objects.get(collector_number="0")
+        self.assertEqual(printing.price_usd, Decimal("1.25"))
+        self.assertEqual(printing.price_usd_foil, Decimal("0.50"))
+        self.assertEqual(printing.price_eur, Decimal("0.05"))
+        self.assertIsNone(Printing.objects.get(collector_number="2").price_usd)
+        self.assertEqual(
+            ScryfallCard.objects.get(name="Forest 0").prices["usd"], "1.25"
+        )
+
+    def test_update_should_leave_cards_untouched(self):
+        PriceUpdater().update(iter([self._price_only(_card(0, usd="1.25"))]))
+        self.assertEqual(set(Card.objects.values_list("id", flat=True)), self.card_ids)
+        self.assertFalse(Card.objects.filter(embedding__isnull=True).exists())
+
+    def test_check_content_should_apply_price_only_changes(self):
+        cards = [_card(0, usd="1.25"), _card(1), _card(2)]
+        result = PriceUpdater(check_content=True).update(iter(cards))
+        self.assertEqual(result.content_changes, 0)
+        self.assertTrue(result.applied)
+        self.assertEqual(
+            Printing.objects.get(collector_number="0").price_usd, Decimal("1.25")
+        )
+
+    def test_check_content_should_skip_content_changes(self):
+        changed = {**_card(0, usd="1.25"), "type_line": "Land"}
+        result = PriceUpdater(check_content=True).update(iter([changed, _card(3)]))
+
+        # one changed, one added and two removed
+        self.assertEqual(result.content_changes, 4)
+        self.assertFalse(result.applied)
+        self.assertEqual(
+            Printing.objects.get(collector_number="0").price_usd, Decimal("0.10")
+        )
@@ -0,0 +1,45 @@
+import asyncio
+import time
+
+from django.test import SimpleTestCase
+from services.rate_limiter import RateLimiter, TokenBucket
+
+
+class TestRateLimiter(SimpleTestCase):
+    def _acquire_all(self, limiter: RateLimiter, tokens: list) -> float:
+        async def acquire_all():
+            await asyncio.gather(*(limiter.acquire(t) for t in tokens))
+
+        start = time.monotonic()
+        asyncio.run(acquire_all())
+        return time.monotonic() - start
+
+    def test_acquire_should_pace_requests_per_minute(self):
+        limiter = RateLimiter(requests_per_minute=600, tokens_per_minute=10**9)
+        limiter.requests = TokenBucket(600, burst=1)
+        # the first request is free, the next 5 wait 0.1s each
+        elapsed = self._acquire_all(limiter, [1] * 6)
+        self.assertGreaterEqual(elapsed, 0.45)
+        self.assertLess(elapsed, 1.0)
+
+    def test_acquire_should_pace_tokens_per_minute(self):
+        limiter = RateLimiter(requests_per_minute=10**6, tokens_per_minute=60_000)
+        limiter.tokens = TokenBucket(60_000, burst=500)
+        # a request larger than the bucket waits for it to be full, then
+        # leaves it 500 tokens in debt, which takes 0.5s to repay
+        elapsed = self._acquire_all(limiter, [1000, 1])
+        self.assertGreaterEqual(elapsed, 0.45)
+        self.assertLess(elapsed, 1.0)
+
+    def test_pause_should_hold_every_request(self):
+        limiter = RateLimiter(requests_per_minute=10**6, tokens_per_minute=10**9)
+        limiter.pause(0.3)
+        elapsed = self._acquire_all(limiter, [1, 1, 1])
+        self.assertGreaterEqual(elapsed, 0.3)
+        self.assertLess(elapsed, 0.6)
+
+    def test_bucket_should_reject_rates_it_cannot_refill_at(self):
+        for rate, burst in ((0, None), (-60, None), (600, 600), (600, 1000)):
+            with self.subTest(rate=rate, burst=burst):
+                with self.assertRaises(ValueError):
+                    TokenBucket(rate, burst=burst)
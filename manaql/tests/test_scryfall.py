@@ -0,0 +1,75 @@
+import gzip
+import json
+import tempfile
+from pathlib import Path
+
+from django.test import TestCase
+from services.artifact_writer import ArtifactWriter
+from services.scryfall import ScryfallService
+
+
+class TestScryfallServiceFileIterator(TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.client = ScryfallService("manaql-ingest-test", "0.1.0")
+        self.cards = [
+            {
+                "name": f"Forest {i}",
+                "lang": "en",
+                "layout": "normal",
+                "games": ["paper"],
+                "related_uris": {"edhrec": "https://edhrec.com/route/?cc=Forest"},
+            }
+            for i in range(100)
+        ]
+        self.cards.append({**self.cards[0], "lang": "ja"})
+
+    def _path(self, file_name: str) -> Path:
+        return Path(self.temp_dir.name) / file_name
+
+    def _json_array(self) -> bytes:
+        return json.dumps(self.cards, indent=2).encode()
+
+    def _ndjson(self) -> bytes:
+        return "".join(json.dumps(card) + "\n" for card in self.cards).encode()
+
+    def _assert_cards(self, file_path: Path) -> None:
+        with self.client.stream_all_cards(file_path=file_path) as cards:
+            names = [card["name"] for card in cards]
+        self.assertEqual(names, [f"Forest {i}" for i in range(100)])
+
+    def test_json_array(self):
+        file_path = self._path("cards.json")
+        file_path.write_bytes(self._json_array())
+        self._assert_cards(file_path)
+
+    def test_gzipped_json_array(self):
+        file_path = self._path("cards.json.gz")
+        file_path.write_bytes(gzip.compress(self._json_array()))
+        self._assert_cards(file_path)
+
+    def test_ndjson(self):
+        file_path = self._path("cards.ndjson")
+        file_path.write_bytes(b"\n" + self._ndjson())
+        self._assert_cards(file_path)
+
+    def test_gzipped_ndjson(self):
+        file_path = self._path("cards.ndjson.gz")
+        file_path.write_bytes(gzip.compress(self._ndjson()))
+        self._assert_cards(file_path)
+
+    def test_artifact(self):
+        file_path = self._path("scryfall_data.json.gz")
+        with ArtifactWriter(file_path, "gzip") as writer:
+            writer.write(self._json_array())
+        self._assert_cards(file_path)
+
+    def test_artifact_not_matching_manifest(self):
+        file_path = self._path("scryfall_data.json.gz")
+        with ArtifactWriter(file_path, "gzip") as writer:
+            writer.write(self._json_array())
+        file_path.write_bytes(gzip.compress(self._json_array()[:-1] + b", {}]"))
+        with self.assertRaises(ValueError):
+            with self.client.stream_all_cards(file_path=file_path) as cards:
+                list(cards)
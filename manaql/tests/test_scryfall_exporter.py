@@ -1,6 +1,20 @@
+import json
+import tempfile
+import threading
+import time
+from pathlib import Path
+from unittest.mock import patch
+
 from database.models.scryfall_card import ScryfallCard
-from django.test import TestCase
-from services.scryfall_exporter import ScryfallExporter, filterCard
+from django.db import DataError, OperationalError
+from django.test import TestCase, TransactionTestCase
+from services.scryfall_exporter import (
+    DeltaStrategy,
+    ParallelStrategy,
+    ScryfallExporter,
+    filterCard,
+)
+from services.quarantine import insert_bisecting
 
 
 class TestCardProcessor(TestCase):
@@ -246,3 +260,305 @@ class TestCardProcessor(TestCase):
         ]
         self.exporter.process_cards(cards_data)
         self.assertEqual(ScryfallCard.objects.count(), 1)
+
+
+class TestParallelStrategy(TransactionTestCase):
+    def setUp(self):
+        self.strategy = ParallelStrategy(batch_size=50, max_workers=3, queue_size=2)
+
+    def _cards(self, count: int):
+        for i in range(count):
+            yield {
+                "name": f"Forest {i}",
+                "lang": "en" if i % 10 else "ja",
+                "layout": "normal",
+                "games": ["paper"],
+            }
+
+    def test_process_streams_cards_into_database(self):
+        result = self.strategy.process(self._cards(1000))
+        self.assertEqual(result.success_count, 900)
+        self.assertEqual(result.filtered_count, 100)
+        self.assertEqual(result.failed_cards, [])
+        self.assertEqual(ScryfallCard.objects.count(), 900)
+
+    def test_process_applies_backpressure(self):
+        lock = threading.Lock()
+        counts = {"read": 0, "processed": 0, "max_ahead": 0}
+        process_batch = ParallelStrategy._process_batch
+
+        def cards():
+            for card in self._cards(1000):
+                with lock:
+                    counts["read"] += 1
+                    ahead = counts["read"] - counts["processed"]
+                    counts["max_ahead"] = max(counts["max_ahead"], ahead)
+                yield card
+
+        def slow_process_batch(batch):
+            time.sleep(0.01)
+            outcome = process_batch(batch)
+            with lock:
+                counts["processed"] += len(batch)
+            return outcome
+
+        self.strategy._process_batch = slow_process_batch
+        self.strategy.process(cards())
+
+        # queued batches + one per worker + the batch being read
+        bound = (self.strategy.queue_size + self.strategy.max_workers + 1) * 50
+        self.assertLessEqual(counts["max_ahead"], bound)
+        self.assertEqual(counts["processed"], 1000)
+
+    def test_process_isolates_failed_cards(self):
+        cards = list(self._cards(100))
+        cards[5]["set"] = "x" * 100  # too long for set_code
+        result = self.strategy.process(iter(cards))
+        self.assertEqual(result.failed_cards, [cards[5]])
+        self.assertEqual(result.success_count, 89)
+        self.assertEqual(ScryfallCard.objects.count(), 89)
+
+
+class TestQuarantine(TestCase):
+    def setUp(self):
+        self.cards = [
+            {
+                "name": f"Forest {i}",
+                "lang": "en",
+                "layout": "normal",
+                "games": ["paper"],
+            }
+            for i in range(20)
+        ]
+        self.cards[3]["set"] = "x" * 100  # too long for set_code
+        self.cards[17]["collector_number"] = "x" * 100
+        self.tmp = tempfile.TemporaryDirectory()
+        self.quarantine_path = Path(self.tmp.name) / "quarantine.ndjson"
+        self.exporter = ScryfallExporter()
+        self.exporter.with_quarantine(self.quarantine_path)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _quarantined(self):
+        with open(self.quarantine_path) as f:
+            return [json.loads(line) for line in f]
+
+    def _assert_isolated(self, result):
+        self.assertEqual(result.success_count, 18)
+        self.assertEqual(result.failed_cards, [self.cards[3], self.cards[17]])
+        self.assertEqual(
+            set(ScryfallCard.objects.values_list("name", flat=True)),
+            {card["name"] for card in self.cards} - {"Forest 3", "Forest 17"},
+        )
+        quarantined = self._quarantined()
+        self.assertEqual(
+            [line["record"] for line in quarantined], [self.cards[3], self.cards[17]]
+        )
+        self.assertIn("value too long", quarantined[0]["error"])
+
+    def test_sequential_strategy_should_quarantine_bad_cards(self):
+        self.exporter.with_sequential_strategy()
+        self._assert_isolated(self.exporter.process_cards(iter(self.cards)))
+
+    def test_copy_strategy_should_quarantine_bad_cards(self):
+        self.exporter.with_copy_strategy()
+        self._assert_isolated(self.exporter.process_cards(iter(self.cards)))
+
+    def test_unconvertible_values_should_be_quarantined(self):
+        self.exporter.with_sequential_strategy()
+        self.cards[3] = {**self.cards[3], "set": "tst", "cmc": "not a number"}
+        result = self.exporter.process_cards(iter(self.cards))
+        self.assertEqual(len(result.failed_cards), 2)
+        self.assertEqual(self._quarantined()[0]["record"], self.cards[3])
+
+    def test_no_failures_should_not_create_a_quarantine_file(self):
+        self.exporter.with_sequential_strategy()
+        result = self.exporter.process_cards(iter(self.cards[:3]))
+        self.assertEqual(result.success_count, 3)
+        self.assertFalse(self.quarantine_path.exists())
+
+    def test_insert_bisecting_should_take_logarithmic_inserts(self):
+        inserts = []
+
+        def insert(rows):
+            inserts.append(len(rows))
+            if 300 in rows:
+                raise DataError("bad row")
+
+        rows = list(range(512))
+        inserted, failed = insert_bisecting(
+            [{"row": row} for row in rows], rows, insert
+        )
+
+        self.assertEqual(inserted, 511)
+        self.assertEqual(
+            [(record, str(e)) for record, e in failed], [({"row": 300}, "bad row")]
+        )
+        # the whole batch, then both halves at each of the 9 levels
+        self.assertEqual(len(inserts), 1 + 2 * 9)
+
+    def test_insert_bisecting_should_raise_when_every_row_fails(self):
+        def insert(rows):
+            raise DataError("relation is missing a column")
+
+        rows = list(range(8))
+        with self.assertRaisesMessage(DataError, "relation is missing a column"):
+            insert_bisecting([{"row": row} for row in rows], rows, insert)
+
+    def test_insert_bisecting_should_not_bisect_other_errors(self):
+        inserts = []
+
+        def insert(rows):
+            inserts.append(len(rows))
+            raise TypeError("encoder bug")
+
+        rows = list(range(8))
+        with self.assertRaises(TypeError):
+            insert_bisecting([{"row": row} for row in rows], rows, insert)
+        self.assertEqual(inserts, [8])
+
+    def test_unencodable_values_should_be_quarantined_before_copying(self):
+        self.exporter.with_copy_strategy(copy_format="binary")
+        self.cards[5] = {**self.cards[5], "cmc": "not a number"}
+        result = self.exporter.process_cards(iter(self.cards))
+        self.assertEqual(result.success_count, 17)
+        self.assertEqual(result.failed_cards[0], self.cards[5])
+        self.assertIn("not a float", self._quarantined()[0]["error"])
+
+    def test_insert_bisecting_should_raise_connection_errors(self):
+        def insert(rows):
+            raise OperationalError("server closed the connection unexpectedly")
+
+        rows = list(range(8))
+        with self.assertRaises(OperationalError):
+            insert_bisecting([{"row": row} for row in rows], rows, insert)
+
+    def test_parallel_strategy_should_raise_connection_errors(self):
+        strategy = ParallelStrategy(batch_size=5, max_workers=2)
+        strategy.quarantine = self.exporter.quarantine
+        error = OperationalError("server closed the connection unexpectedly")
+        with (
+            patch("services.scryfall_exporter._bulk_create", side_effect=error),
+            self.assertRaises(OperationalError),
+        ):
+            strategy.process(iter(self.cards))
+        self.assertFalse(self.quarantine_path.exists())
+
+
+class TestDeltaStrategy(TestCase):
+    def setUp(self):
+        self.exporter = ScryfallExporter()
+        self.exporter.with_delta_strategy()
+        self.cards = [
+            {
+                "id": f"00000000-0000-0000-0000-00000000000{i}",
+                "oracle_id": f"10000000-0000-0000-0000-00000000000{i}",
+                "name": f"Forest {i}",
+                "lang": "en",
+                "layout": "normal",
+                "games": ["paper"],
+                "prices": {"usd": "0.10"},
+            }
+            for i in range(4)
+        ]
+
+    def test_first_run_should_insert_every_card(self):
+        result = self.exporter.process_cards(iter(self.cards))
+        self.assertEqual(result.inserted_count, 4)
+        self.assertEqual(ScryfallCard.objects.count(), 4)
+        self.assertIsNone(result.changed_names)
+
+    def test_process_cards_should_apply_only_the_delta(self):
+        self.exporter.process_cards(iter(self.cards))
+        ids = dict(ScryfallCard.objects.values_list("name", "id"))
+
+        changed = {**self.cards[1], "name": "Renamed", "prices": {"usd": "0.20"}}
+        added = {**self.cards[0], "id": "00000000-0000-0000-0000-000000000009"}
+        cards = [self.cards[0], changed, self.cards[2], added]
+        result = self.exporter.process_cards(iter(cards))
+
+        self.assertEqual(result.inserted_count, 1)
+        self.assertEqual(result.updated_count, 1)
+        self.assertEqual(result.deleted_count, 1)
+        self.assertEqual(result.unchanged_count, 2)
+        self.assertEqual(
+            result.changed_names, {"Forest 0", "Forest 1", "Forest 3", "Renamed"}
+        )
+
+        renamed = ScryfallCard.objects.get(name="Renamed")
+        self.assertEqual(renamed.id, ids["Forest 1"])  # updated in place
+        self.assertEqual(renamed.prices, {"usd": "0.20"})
+        self.assertFalse(ScryfallCard.objects.filter(name="Forest 3").exists())
+        self.assertEqual(ScryfallCard.objects.filter(name="Forest 0").count(), 2)
+
+    def test_bad_cards_should_be_quarantined_without_failing_the_delta(self):
+        self.exporter.process_cards(iter(self.cards))
+        with tempfile.TemporaryDirectory() as tmp:
+            quarantine_path = Path(tmp) / "quarantine.ndjson"
+            self.exporter.with_quarantine(quarantine_path)
+
+            bad_update = {**self.cards[1], "name": "Renamed", "set": "x" * 100}
+            bad_insert = {
+                **self.cards[0],
+                "id": "00000000-0000-0000-0000-000000000009",
+                "collector_number": "x" * 100,
+            }
+            changed = {**self.cards[2], "name": "Renamed 2"}
+            cards = [self.cards[0], bad_update, changed, self.cards[3], bad_insert]
+            result = self.exporter.process_cards(iter(cards))
+
+            with open(quarantine_path) as f:
+                quarantined = [json.loads(line)["record"] for line in f]
+
+        self.assertEqual(quarantined, [bad_update, bad_insert])
+        self.assertEqual(result.failed_cards, [bad_update, bad_insert])
+        self.assertEqual(result.updated_count, 1)
+        self.assertEqual(result.inserted_count, 0)
+        self.assertEqual(result.deleted_count, 0)
+        # the bad update keeps its stored version
+        self.assertEqual(
+            sorted(ScryfallCard.objects.values_list("name", flat=True)),
+            ["Forest 0", "Forest 1", "Forest 3", "Renamed 2"],
+        )
+
+    def test_price_changes_should_only_reprice(self):
+        self.exporter.process_cards(iter(self.cards))
+        repriced = {**self.cards[2], "prices": {"usd": "0.30"}}
+        result = self.exporter.process_cards(
+            iter([*self.cards[:2], repriced, self.cards[3]])
+        )
+
+        self.assertEqual(result.repriced_count, 1)
+        self.assertEqual(result.updated_count, 0)
+        self.assertEqual(result.changed_names, set())
+        self.assertEqual(
+            ScryfallCard.objects.get(name="Forest 2").prices, {"usd": "0.30"}
+        )
+
+    def test_unchanged_snapshot_should_write_nothing(self):
+        self.exporter.process_cards(iter(self.cards))
+        result = self.exporter.process_cards(iter(reversed(self.cards)))
+        self.assertEqual(result.unchanged_count, 4)
+        self.assertEqual(result.success_count, 0)
+        self.assertEqual(result.changed_names, set())
+
+    def test_process_cards_should_replace_unkeyed_cards(self):
+        self.exporter.process_cards(iter(self.cards[:2]))
+        ScryfallCard.objects.create(name="Island")
+        result = self.exporter.process_cards(iter(self.cards[:2]))
+        self.assertEqual(result.changed_names, {"Island"})
+        self.assertEqual(ScryfallCard.objects.count(), 2)
+
+    def test_process_cards_should_fail_cards_without_id(self):
+        result = DeltaStrategy().process(iter([{**self.cards[0], "id": None}]))
+        self.assertEqual(len(result.failed_cards), 1)
+        self.assertEqual(ScryfallCard.objects.count(), 0)
+
+    def test_content_hash_should_ignore_key_order(self):
+        card = self.cards[0]
+        reordered = dict(reversed(list(card.items())))
+        self.assertEqual(
+            ScryfallCard.values_from_scryfall_card(card)["content_hash"],
+            ScryfallCard.values_from_scryfall_card(reordered)["content_hash"],
+        )
@@ -0,0 +1,157 @@
+from database.models.card import Card
+from database.models.printing import Printing
+from database.models.scryfall_card import ScryfallCard
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from services.card_processor import CardProcessor
+from services.scryfall_exporter import ParallelStrategy, ScryfallExporter
+from services.shadow_table import STAGING_SCHEMA, ShadowLoad
+
+
+def _cards(count: int):
+    for i in range(count):
+        yield {
+            "name": f"Forest {i}",
+            "lang": "en",
+            "layout": "normal",
+            "games": ["paper"],
+            "set": "blb",
+            "set_name": "Bloomburrow",
+            "collector_number": str(i),
+            "finishes": ["nonfoil"],
+            "prices": {
+                "usd": "0.10",
+                "usd_foil": None,
+                "usd_etched": None,
+                "eur": None,
+                "eur_foil": None,
+                "tix": None,
+            },
+            "image_uris": {"normal": f"https://cards.scryfall.io/normal/{i}.jpg"},
+        }
+
+
+def _indexes(table: str) -> list:
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT indexname FROM pg_indexes WHERE schemaname = current_schema() "
+            "AND tablename = %s ORDER BY indexname",
+            [table],
+        )
+        return [name for (name,) in cursor.fetchall()]
+
+
+def _constraints(table: str) -> list:
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+            "WHERE conrelid = %s::regclass ORDER BY conname",
+            [table],
+        )
+        return cursor.fetchall()
+
+
+def _persistence(table: str) -> str:
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT relpersistence FROM pg_class WHERE oid = %s::regclass", [table]
+        )
+        return cursor.fetchone()[0]
+
+
+def _staging_exists() -> bool:
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT EXISTS (SELECT 1 FROM pg_namespace WHERE nspname = %s)",
+            [STAGING_SCHEMA],
+        )
+        return cursor.fetchone()[0]
+
+
+class TestShadowLoad(TestCase):
+    def setUp(self):
+        self.exporter = ScryfallExporter()
+        self.exporter.with_sequential_strategy()
+        self.exporter.with_shadow_load()
+        self.old_card = ScryfallCard.objects.create(name="Island")
+
+    def test_process_cards_should_replace_table(self):
+        indexes = _indexes("scryfall_card")
+        constraints = _constraints("scryfall_card")
+
+        result = self.exporter.process_cards(_cards(10))
+
+        self.assertEqual(result.success_count, 10)
+        self.assertEqual(ScryfallCard.objects.count(), 10)
+        self.assertFalse(ScryfallCard.objects.filter(name="Island").exists())
+        self.assertEqual(_indexes("scryfall_card"), indexes)
+        self.assertEqual(_constraints("scryfall_card"), constraints)
+        self.assertEqual(_persistence("scryfall_card"), "p")
+        self.assertFalse(_staging_exists())
+
+    def test_process_cards_should_continue_ids(self):
+        self.exporter.process_cards(_cards(3))
+        for card in ScryfallCard.objects.all():
+            self.assertGreater(card.id, self.old_card.id)
+
+    def test_failed_load_should_keep_live_table(self):
+        with self.assertRaises(ValueError):
+            with ShadowLoad([ScryfallCard]):
+                ScryfallCard.objects.create(name="Forest")
+                self.assertEqual(ScryfallCard.objects.count(), 1)
+                raise ValueError("load failed")
+
+        self.assertEqual(
+            list(ScryfallCard.objects.values_list("name", flat=True)), ["Island"]
+        )
+        self.assertFalse(_staging_exists())
+
+    def test_unkept_load_should_be_dropped(self):
+        with ShadowLoad([ScryfallCard], keep=False):
+            for name in ("Forest", "Plains", "Swamp"):
+                ScryfallCard.objects.create(name=name)
+            self.assertEqual(ScryfallCard.objects.count(), 3)
+
+        self.assertEqual(
+            list(ScryfallCard.objects.values_list("name", flat=True)), ["Island"]
+        )
+        self.assertFalse(_staging_exists())
+
+    def test_process_cards_should_replace_cards_and_printings(self):
+        self.exporter.process_cards(_cards(5))
+        old = Card.objects.create(name="Island")
+        Printing.objects.create(
+            card=old, set_code="blb", set_name="Bloomburrow", finishes=["nonfoil"]
+        )
+        # tables with pending deferred foreign key checks can't be moved or dropped
+        with connection.cursor() as cursor:
+            cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+        constraints = _constraints("printing")
+
+        processor = CardProcessor()
+        processor.with_sequential_strategy()
+        processor.with_shadow_load()
+        result = processor.process_cards()
+
+        self.assertEqual(result.cards_created, 5)
+        self.assertEqual(Card.objects.count(), 5)
+        self.assertEqual(Printing.objects.count(), 5)
+        self.assertFalse(Card.objects.filter(name="Island").exists())
+        self.assertEqual(_constraints("printing"), constraints)
+        for printing in Printing.objects.select_related("card"):
+            self.assertEqual(printing.card.name, f"Forest {printing.collector_number}")
+
+
+class TestShadowLoadParallel(TransactionTestCase):
+    def test_worker_connections_should_load_into_shadow_table(self):
+        ScryfallCard.objects.create(name="Island")
+        exporter = ScryfallExporter()
+        exporter.strategy = ParallelStrategy(batch_size=50, max_workers=3)
+        exporter.with_shadow_load()
+
+        result = exporter.process_cards(_cards(500))
+
+        self.assertEqual(result.success_count, 500)
+        self.assertEqual(ScryfallCard.objects.count(), 500)
+        self.assertFalse(ScryfallCard.objects.filter(name="Island").exists())
+        self.assertFalse(_staging_exists())
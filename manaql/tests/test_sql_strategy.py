@@ -0,0 +1,192 @@
+from database.models.card import Card
+from database.models.printing import Printing
+from database.models.scryfall_card import ScryfallCard
+from django.test import TestCase
+from services.card_processor import CardProcessor
+
+PRICES = {
+    "usd": "0.21",
+    "usd_foil": "0.47",
+    "usd_etched": None,
+    "eur": None,
+    "eur_foil": "1.05",
+    "tix": "0.02",
+}
+
+# one card per edge case of the derivations, in the order they are created
+SCRYFALL_CARDS = [
+    dict(
+        name="Forest",
+        type_line="Basic Land — Forest",
+        set_code="blb",
+        collector_number="280",
+        games=["paper", "mtgo", "arena"],
+        legalities={"standard": "legal", "vintage": "legal", "unknown": "legal"},
+        finishes=["nonfoil", "foil"],
+        image_uris={"normal": "https://cards.scryfall.io/forest.jpg"},
+    ),
+    dict(
+        name="Forest",
+        type_line="Basic Land — Forest",
+        set_code="ddr",
+        collector_number="35",
+        games=["paper"],
+        legalities={"standard": "legal", "vintage": "legal", "unknown": "legal"},
+        finishes=["nonfoil"],
+        image_uris={"normal": "https://cards.scryfall.io/forest-ddr.jpg"},
+    ),
+    dict(
+        name="Delver of Secrets // Insectile Aberration",
+        type_line="Creature — Human Wizard // Creature — Human Insect",
+        oracle_text="At the beginning of your upkeep, look at the top card...",
+        keywords=["Transform", "Flying", "Not A Keyword"],
+        colors=["U"],
+        color_identity=["U"],
+        mana_cost="{U}",
+        cmc=1.0,
+        power="1",
+        toughness="1",
+        legalities={"modern": "legal", "pauper": "legal", "legacy": "banned"},
+        finishes=["nonfoil", "foil"],
+        image_uris=None,
+        card_faces=[
+            {"name": "Delver of Secrets", "image_uris": {"normal": "front.jpg"}},
+            {"name": "Insectile Aberration", "image_uris": {"normal": "back.jpg"}},
+        ],
+    ),
+    dict(
+        name="Valakut Awakening // Valakut Stoneforge",
+        type_line="Instant // Land",
+        colors=["R"],
+        legalities={"vintage": "restricted", "commander": "not_legal"},
+        image_uris=None,
+        card_faces=[{"name": "Valakut Awakening", "image_uris": {"small": "x"}}, {}],
+    ),
+    dict(
+        name="Animate Dead",
+        type_line="Enchant Creature",
+        colors=["B", "X", None],
+        color_identity=["B"],
+        games=["paper", "sega"],
+        reserved=True,
+        legalities={"vintage": "legal", "oldschool": "mystery"},
+        promo_types=["serialized", "boosterfun"],
+        finishes=["Etched"],
+        image_uris={"large": "https://cards.scryfall.io/large.jpg"},
+        prices={**PRICES, "usd": "1234.5"},
+    ),
+    dict(
+        name="Grizzly Bears",
+        type_line="Artifact Creature — Bear",
+        keywords=[],
+        game_changer=True,
+        legalities=None,
+        card_faces=[{"image_uris": None}],
+    ),
+    dict(name="Unknown Card", type_line=None, promo_types=[]),
+    dict(name="Jace, the Mind Sculptor", type_line="Legendary Planeswalker — Jace"),
+    dict(name=None, type_line="Instant"),
+]
+
+
+def _create_scryfall_cards():
+    for i, fields in enumerate(SCRYFALL_CARDS):
+        ScryfallCard.objects.create(
+            **{
+                "set_code": "tst",
+                "set_name": "Test Set",
+                "collector_number": str(i),
+                "image_uris": {"normal": f"https://cards.scryfall.io/{i}.jpg"},
+                "prices": PRICES,
+                **fields,
+            }
+        )
+
+
+def _snapshot():
+    """Cards and printings, keyed on their natural keys and without ids."""
+    cards = {
+        card["name"]: card
+        for card in Card.objects.values(
+            *(f.attname for f in Card._meta.concrete_fields if f.name != "id")
+        )
+    }
+    printings = {
+        (printing.pop("set_code"), printing.pop("collector_number")): printing
+        for printing in Printing.objects.values(
+            "card__name",
+            *(
+                f.attname
+                for f in Printing._meta.concrete_fields
+                if f.name not in ("id", "card")
+            ),
+        )
+    }
+    return cards, printings
+
+
+class TestSqlStrategy(TestCase):
+    def setUp(self):
+        _create_scryfall_cards()
+        self.processor = CardProcessor()
+
+    def _process(self, strategy: str, **kwargs):
+        getattr(self.processor, f"with_{strategy}_strategy")()
+        result = self.processor.process_cards(**kwargs)
+        return result, _snapshot()
+
+    def _clear(self):
+        Printing.objects.all().delete()
+        Card.objects.all().delete()
+
+    def test_should_match_sequential_strategy(self):
+        expected_result, expected = self._process("sequential")
+        self._clear()
+        result, actual = self._process("sql")
+
+        self.assertEqual(actual[0], expected[0])
+        self.assertEqual(actual[1], expected[1])
+        self.assertEqual(len(actual[1]), len(SCRYFALL_CARDS) - 1)
+        self.assertEqual(result.cards_created, expected_result.cards_created)
+        self.assertEqual(result.printings_created, expected_result.printings_created)
+        self.assertEqual(result.failed_cards, expected_result.failed_cards)
+        self.assertEqual(result.failed_printings, expected_result.failed_printings)
+
+    def test_should_match_sequential_strategy_for_changed_names(self):
+        names = {"Forest", "Animate Dead"}
+        _, expected = self._process("sequential", changed_names=names)
+        self._clear()
+        result, actual = self._process("sql", changed_names=names)
+
+        self.assertEqual(set(actual[0]), names)
+        self.assertEqual(actual, expected)
+        self.assertEqual(result.printings_created, 3)
+
+    def test_should_match_sequential_strategy_when_merging(self):
+        self.processor.with_merge()
+        self._process("sequential")
+        Card.objects.update(embedding=[0.5] * 1536)
+        ScryfallCard.objects.filter(name="Grizzly Bears").update(oracle_text="Bear.")
+        ScryfallCard.objects.filter(name="Forest", set_code="ddr").update(
+            prices={**PRICES, "usd": "0.99"}
+        )
+        ScryfallCard.objects.filter(name="Jace, the Mind Sculptor").delete()
+        ids = dict(Card.objects.values_list("name", "id"))
+
+        result, actual = self._process("sql")
+
+        self.assertEqual(result.cards_created, 0)
+        self.assertEqual(result.cards_updated, 1)
+        self.assertEqual(result.cards_deleted, 1)
+        self.assertEqual(result.printings_updated, 1)
+        self.assertEqual(result.printings_deleted, 1)
+        self.assertIsNone(actual[0]["Grizzly Bears"]["embedding"])
+        self.assertIsNotNone(actual[0]["Forest"]["embedding"])
+        self.assertEqual(str(actual[1][("ddr", "35")]["price_usd"]), "0.99")
+        for name, id in Card.objects.values_list("name", "id"):
+            self.assertEqual(id, ids[name])
+
+        # merging again with the python derivation finds nothing to change
+        result = self._process("sequential")[0]
+        self.assertEqual(result.cards_created + result.cards_updated, 0)
+        self.assertEqual(result.printings_created + result.printings_updated, 0)
@@ -0,0 +1,60 @@
+import gzip
+import io
+import json
+
+import ijson
+from django.test import TestCase
+from services.streaming import PrefetchReader
+
+
+class FailingSource(io.BytesIO):
+    def read(self, size=-1):
+        chunk = super().read(size)
+        if not chunk:
+            raise ConnectionResetError("connection reset by peer")
+        return chunk
+
+
+class TestPrefetchReader(TestCase):
+    def setUp(self):
+        self.cards = [{"name": f"Forest {i}", "lang": "en"} for i in range(500)]
+        self.body = json.dumps(self.cards).encode()
+
+    def test_parses_cards_from_stream(self):
+        reader = PrefetchReader(io.BytesIO(self.body), read_size=1024, max_chunks=2)
+        try:
+            self.assertEqual(list(ijson.items(reader, "item")), self.cards)
+        finally:
+            reader.close()
+
+    def test_parses_gzipped_stream(self):
+        reader = PrefetchReader(io.BytesIO(gzip.compress(self.body)), read_size=1024)
+        try:
+            cards = list(ijson.items(gzip.GzipFile(fileobj=reader), "item"))
+            self.assertEqual(cards, self.cards)
+        finally:
+            reader.close()
+
+    def test_tees_stream(self):
+        tee = io.BytesIO()
+        reader = PrefetchReader(io.BytesIO(self.body), read_size=1024, tee=tee)
+        try:
+            while reader.read(4096):
+                pass
+        finally:
+            reader.close()
+        self.assertEqual(tee.getvalue(), self.body)
+
+    def test_raises_source_errors(self):
+        reader = PrefetchReader(FailingSource(self.body), read_size=1024)
+        try:
+            with self.assertRaises(ConnectionResetError):
+                list(ijson.items(reader, "item"))
+        finally:
+            reader.close()
+
+    def test_close_before_end_of_stream(self):
+        reader = PrefetchReader(io.BytesIO(self.body * 100), read_size=16, max_chunks=1)
+        reader.read(16)
+        reader.close()
+        self.assertTrue(reader.closed)